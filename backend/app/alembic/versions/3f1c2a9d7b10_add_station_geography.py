@@ -0,0 +1,65 @@
+"""add station geography column
+
+Revision ID: 3f1c2a9d7b10
+Revises: 8b2e4d61c5f3
+Create Date: 2026-10-17 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = '8b2e4d61c5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # On a fresh database the tables only appear when the API starts and runs
+    # create_all; app.database.spatial.ensure_station_geography adds the column then
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not sa.inspect(bind).has_table("stations"):
+        return
+    # Plain Postgres keeps the bounding-box search and its lat/lon index
+    if bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")).first() is None:
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    op.execute("ALTER TABLE stations ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)")
+
+    # Backfill existing rows from latitude/longitude
+    op.execute("""
+        UPDATE stations
+        SET geog = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+        WHERE geog IS NULL
+    """)
+
+    # Keep the column in sync for rows written through the ORM, which does not map it
+    op.execute("""
+        CREATE OR REPLACE FUNCTION stations_set_geog() RETURNS trigger AS $$
+        BEGIN
+            NEW.geog := ST_SetSRID(ST_MakePoint(NEW.longitude, NEW.latitude), 4326)::geography;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS stations_set_geog ON stations")
+    op.execute("""
+        CREATE TRIGGER stations_set_geog
+        BEFORE INSERT OR UPDATE OF latitude, longitude ON stations
+        FOR EACH ROW EXECUTE FUNCTION stations_set_geog()
+    """)
+
+    op.execute("CREATE INDEX IF NOT EXISTS idx_stations_geog ON stations USING GIST (geog)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("DROP INDEX IF EXISTS idx_stations_geog")
+    op.execute("DROP TRIGGER IF EXISTS stations_set_geog ON stations")
+    op.execute("DROP FUNCTION IF EXISTS stations_set_geog()")
+    op.execute("ALTER TABLE stations DROP COLUMN IF EXISTS geog")
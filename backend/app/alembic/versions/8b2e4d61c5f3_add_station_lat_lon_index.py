@@ -0,0 +1,28 @@
+"""add station latitude/longitude index
+
+Revision ID: 8b2e4d61c5f3
+Revises: 
+Create Date: 2026-10-17 11:40:02.551873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d61c5f3'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # On a fresh database create_all makes the table along with this index
+    if not sa.inspect(op.get_bind()).has_table("stations"):
+        return
+
+    op.execute("CREATE INDEX IF NOT EXISTS idx_stations_lat_lon ON stations (latitude, longitude)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_stations_lat_lon")
@@ -1,16 +1,29 @@
+import json
+import asyncio
 import traceback
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 from app.core.config import Settings,settings
 from app.database.session import get_db
 from app.models.stations import Station
 from app.models.chargingCosts import ChargingConfig
-from app.schemas.stations import ChargingConfigResponse, RouteOptimizationRequest, RouteResponse, StationResponse
+from app.schemas.stations import ChargingConfigResponse, RouteBatchRequest, RouteOptimizationRequest, RouteResponse, StationResponse
 from app.services.route_optimizer import OSRMRouteOptimizer
+from app.services.async_route_optimizer import AsyncOSRMRouteOptimizer
+from app.services.station_index import station_index
+from app.services.station_graph import station_graph_store
+from app.services.route_cache import route_result_cache
+from app.services.circuit_breaker import get_circuit_breaker
+from app.services.distance_cache import road_distance_cache
+from app.services.osrm_metrics import osrm_metrics
+from app.services.single_flight import single_flight
+from app.utils.polyline import geojson_to_polyline
 from app.auth.dependencies import get_current_user
 from sqlalchemy.orm import joinedload
+from starlette.concurrency import run_in_threadpool
 
 
 from fastapi import APIRouter
@@ -18,110 +31,230 @@ from fastapi import APIRouter
 router = APIRouter()
 
 
+def _route_cache_key(route_request: RouteOptimizationRequest) -> Optional[str]:
+    """Result cache key of a route request, or None when the catalog version is unknown"""
+    catalog_version = station_index.catalog_version()
+    if catalog_version is None:
+        return None
+    return route_result_cache.key(
+        route_request.start_latitude,
+        route_request.start_longitude,
+        route_request.end_latitude,
+        route_request.end_longitude,
+        battery_range=settings.MAX_SEARCH_RADIUS,
+        algorithm=route_request.algorithm,
+        catalog_version=catalog_version,
+        variant=_response_variant(route_request)
+    )
+
+
+def _cached_route(route_request: RouteOptimizationRequest):
+    """(cache key, cached route body for this request or None) of a route request; does blocking Redis I/O"""
+    cache_key = _route_cache_key(route_request)
+    cached = route_result_cache.get(cache_key) if cache_key is not None else None
+    if cached is None:
+        return cache_key, None
+    return cache_key, _for_request(json.loads(cached), route_request)
+
+
+def _store_route(cache_key: str, route: RouteResponse):
+    """
+    Cache a route without the fields that belong to the request that searched
+    it: its exact endpoints and its search statistics. Requests that snap to
+    the same cells get their own back from _for_request.
+    """
+    body = route.model_dump(mode="json")
+    body["search_stats"] = None
+    for segment in body["route_segments"]:
+        segment.pop("from_point", None)
+        segment.pop("to_point", None)
+    route_result_cache.set(cache_key, json.dumps(body).encode("utf-8"))
+
+
+def _for_request(body: dict, route_request: RouteOptimizationRequest) -> dict:
+    """Fill a cached route body in with the endpoints of the request it is served to"""
+    segments = body["route_segments"]
+    segments[0]["from_point"] = {
+        "latitude": route_request.start_latitude,
+        "longitude": route_request.start_longitude
+    }
+    segments[-1]["to_point"] = {
+        "latitude": route_request.end_latitude,
+        "longitude": route_request.end_longitude
+    }
+    # Nothing was searched for this request
+    body["search_stats"] = {"cached": True}
+    return body
+
+
+def _response_variant(route_request: RouteOptimizationRequest) -> str:
+    """The response options that change the body of an otherwise identical route"""
+    variant = route_request.geometry_format
+    if route_request.geometry_format == "polyline":
+        variant += f"{route_request.polyline_precision}z{route_request.zoom}"
+    return variant + (":steps" if route_request.include_steps else "")
+
+
+async def _plan_route(route_request: RouteOptimizationRequest, snapshot, station_graph) -> RouteResponse:
+    """Search and summarize one route over an already borrowed snapshot and graph"""
+    # Use OSRM-based optimizer with concurrent OSRM calls
+    route_optimizer = AsyncOSRMRouteOptimizer.from_snapshot(
+        snapshot,
+        battery_range=settings.MAX_SEARCH_RADIUS,
+        osrm_server=settings.OSRM_SERVER_URL,
+        station_graph=station_graph,
+        include_steps=route_request.include_steps
+    )
+
+    # Get optimized route using Dijkstra's algorithm with OSRM distances, with
+    # every leg and its geometry loaded
+    plan = await route_optimizer.plan_route(
+        start_coords=(route_request.start_latitude, route_request.start_longitude),
+        end_coords=(route_request.end_latitude, route_request.end_longitude),
+        algorithm=route_request.algorithm
+    )
+
+    if not plan.stops:
+        raise HTTPException(status_code=404, detail="No optimized route found")
+
+    # Summarize the plan; only the direct route is still looked up
+    route_summary = await route_optimizer.get_route_summary(
+        plan,
+        start_coords=(route_request.start_latitude, route_request.start_longitude),
+        end_coords=(route_request.end_latitude, route_request.end_longitude)
+    )
+    return _route_response(route_request, plan.route, route_summary, route_optimizer.search_stats)
+
+
+def _plan_route_blocking(route_request: RouteOptimizationRequest, snapshot, station_graph) -> RouteResponse:
+    """_plan_route on the blocking optimizer, for worker threads"""
+    route_optimizer = OSRMRouteOptimizer.from_snapshot(
+        snapshot,
+        battery_range=settings.MAX_SEARCH_RADIUS,
+        osrm_server=settings.OSRM_SERVER_URL,
+        station_graph=station_graph,
+        include_steps=route_request.include_steps
+    )
+
+    plan = route_optimizer.plan_route(
+        start_coords=(route_request.start_latitude, route_request.start_longitude),
+        end_coords=(route_request.end_latitude, route_request.end_longitude),
+        algorithm=route_request.algorithm
+    )
+
+    if not plan.stops:
+        raise HTTPException(status_code=404, detail="No optimized route found")
+
+    route_summary = route_optimizer.get_route_summary(
+        plan,
+        start_coords=(route_request.start_latitude, route_request.start_longitude),
+        end_coords=(route_request.end_latitude, route_request.end_longitude)
+    )
+    return _route_response(route_request, plan.route, route_summary, route_optimizer.search_stats)
+
+
+def _route_response(route_request: RouteOptimizationRequest, optimized_route, route_summary: dict,
+                    search_stats: dict) -> RouteResponse:
+    """Turn a searched route and its summary into the response body"""
+    #station_responses = [StationResponse.from_orm(station) for station in optimized_route]
+    station_responses = []
+    segments = route_summary['route_segments']
+
+    if route_request.geometry_format == "polyline":
+        for segment in segments:
+            segment['route_geometry'] = geojson_to_polyline(
+                segment['route_geometry'],
+                precision=route_request.polyline_precision,
+                zoom=route_request.zoom
+            )
+
+    for i, station in enumerate(optimized_route):
+        station= station[0]  # Get the Station object from the tuple
+        charging_configs = [
+            ChargingConfigResponse(
+                charging_type=config.charging_type,
+                connector_type=config.connector_type,
+                power_output=config.power_output,
+                cost_per_kwh=config.cost_per_kwh
+            )
+            for config in station.charging_configs
+        ]
+        station_response = StationResponse (
+            id=station.id,
+            name=station.name,
+            latitude=station.latitude,
+            longitude=station.longitude,
+            charging_configs=charging_configs,
+            is_available=station.is_available,
+            distance_to_next=None
+        )
+
+        # Find the corresponding segment and set distance
+        if i == 0:
+            # First station - use distance from start_to_station segment
+            station_response.distance_from_start = segments[0]['distance']
+
+            # Distance to next charging station
+            if len(segments) > 1:
+                station_response.distance_to_next = segments[1]['distance']
+
+        elif i == len(optimized_route) - 1:
+            # Last station - use distance to destination from last segment
+            station_response.distance_to_destination = segments[-1]['distance']
+            station_response.distance_to_next = None
+
+        else:
+            # Middle stations - use distance from previous segment
+            segment_index = i  # Since segment[0] is start_to_station
+            station_response.distance_from_previous = segments[segment_index]['distance']
+
+            # Assign distance to next station
+            if segment_index + 1 < len(segments):
+                station_response.distance_to_next = segments[segment_index + 1]['distance']
+
+        station_responses.append(station_response)
+
+    return RouteResponse(
+        charging_stations=station_responses,
+        total_distance=route_summary['total_distance'],
+        total_duration=route_summary['total_duration_minutes'],
+        number_of_stops=route_summary['number_of_stops'],
+        estimated_charging_time=route_summary['estimated_charging_time_minutes'],
+        total_trip_time=route_summary['total_trip_time_minutes'],
+        route_segments=route_summary['route_segments'],
+        search_stats=search_stats,
+        geometry_format=route_request.geometry_format
+    )
+
+
 @router.post("/optimize", response_model=RouteResponse)
-def optimize_route(
+async def optimize_route(
     route_request: RouteOptimizationRequest,
-    db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Optimize a route between two points with charging stations using OSRM
     """
-    # Fetch all available stations
-    stations = db.query(Station).\
-    options(joinedload(Station.charging_configs)).\
-    filter(Station.is_available == True).\
-    all()
+    # Repeat trips are served straight from the route cache as stored JSON
+    cache_key, cached = await run_in_threadpool(_cached_route, route_request)
+    if cached is not None:
+        return Response(content=json.dumps(cached), media_type="application/json")
+
+    # Borrow the worker's shared station snapshot (the first load hits the database)
+    snapshot = await run_in_threadpool(station_index.get_snapshot)
+    station_graph = await run_in_threadpool(station_graph_store.get)
     
-    if not stations:
+    if not snapshot.stations:
         raise HTTPException(
             status_code=404,
             detail="No available charging stations found"
         )
     
     try:
-        # Use OSRM-based optimizer
-        route_optimizer = OSRMRouteOptimizer(
-            stations=stations,
-            battery_range=settings.MAX_SEARCH_RADIUS,
-            osrm_server=settings.OSRM_SERVER_URL
-        )
-        
-        # Get optimized route using Dijkstra's algorithm with OSRM distances
-        optimized_route = route_optimizer.dijkstra_route(
-            start_coords=(route_request.start_latitude, route_request.start_longitude),
-            end_coords=(route_request.end_latitude, route_request.end_longitude)
-        )
-        
-        if not optimized_route:
-            raise HTTPException(status_code=404, detail="No optimized route found")
-        
-        # Get detailed route summary with geometry
-        route_summary = route_optimizer.get_route_summary(
-            optimized_route,
-            start_coords=(route_request.start_latitude, route_request.start_longitude),
-            end_coords=(route_request.end_latitude, route_request.end_longitude)
-        )
-        
-        #station_responses = [StationResponse.from_orm(station) for station in optimized_route]
-        station_responses = []
-        segments = route_summary['route_segments']
-
-        for i, station in enumerate(optimized_route):
-            station= station[0]  # Get the Station object from the tuple
-            charging_configs = [
-                ChargingConfigResponse(
-                    charging_type=config.charging_type,
-                    connector_type=config.connector_type,
-                    power_output=config.power_output,
-                    cost_per_kwh=config.cost_per_kwh
-                )
-                for config in station.charging_configs
-            ]
-            station_response = StationResponse (
-                id=station.id,
-                name=station.name,
-                latitude=station.latitude,
-                longitude=station.longitude,
-                charging_configs=charging_configs,
-                is_available=station.is_available,
-                distance_to_next=None
-            )
-            
-            # Find the corresponding segment and set distance
-            if i == 0:
-                # First station - use distance from start_to_station segment
-                station_response.distance_from_start = segments[0]['distance']
-                
-                # Distance to next charging station
-                if len(segments) > 1:
-                    station_response.distance_to_next = segments[1]['distance']
-            
-            elif i == len(optimized_route) - 1:
-                # Last station - use distance to destination from last segment
-                station_response.distance_to_destination = segments[-1]['distance']
-                station_response.distance_to_next = None
-            
-            else:
-                # Middle stations - use distance from previous segment
-                segment_index = i  # Since segment[0] is start_to_station
-                station_response.distance_from_previous = segments[segment_index]['distance']
-                
-                # Assign distance to next station
-                if segment_index + 1 < len(segments):
-                    station_response.distance_to_next = segments[segment_index + 1]['distance']
-            
-            station_responses.append(station_response)
-
-        return RouteResponse(
-            charging_stations=station_responses,
-            total_distance=route_summary['total_distance'],
-            total_duration=route_summary['total_duration_minutes'],
-            number_of_stops=route_summary['number_of_stops'],
-            estimated_charging_time=route_summary['estimated_charging_time_minutes'],
-            total_trip_time=route_summary['total_trip_time_minutes'],
-            route_segments=route_summary['route_segments']
-        )
+        route = await _plan_route(route_request, snapshot, station_graph)
+        if cache_key is not None:
+            await run_in_threadpool(_store_route, cache_key, route)
+        return route
         
     except Exception as e:
         # Error handling (same as existing)
@@ -133,6 +266,87 @@ def optimize_route(
         print(error_details)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@router.post("/optimize/batch")
+async def optimize_route_batch(
+    batch_request: RouteBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Optimize many routes in one request, streamed back as NDJSON.
+
+    Every route shares the same station snapshot, station graph and road
+    distance cache. Routes are searched by the blocking optimizer in worker
+    threads, so their CPU work stays off the event loop, and up to
+    ROUTE_BATCH_CONCURRENCY of them run at once. Each line is {"index", "status", "route" | "detail"} and lines are
+    written as routes finish, so they are not in request order.
+    """
+    routes = batch_request.routes
+    if len(routes) > settings.ROUTE_BATCH_MAX_ROUTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch can hold at most {settings.ROUTE_BATCH_MAX_ROUTES} routes"
+        )
+
+    # Borrow the snapshot and graph once for the whole batch
+    snapshot = await run_in_threadpool(station_index.get_snapshot)
+    station_graph = await run_in_threadpool(station_graph_store.get)
+
+    if not snapshot.stations:
+        raise HTTPException(
+            status_code=404,
+            detail="No available charging stations found"
+        )
+
+    # Bounds the searches in flight; each one runs in a worker thread
+    semaphore = asyncio.Semaphore(settings.ROUTE_BATCH_CONCURRENCY)
+
+    def search(route_request: RouteOptimizationRequest) -> dict:
+        cache_key, cached = _cached_route(route_request)
+        if cached is not None:
+            return cached
+
+        route = _plan_route_blocking(route_request, snapshot, station_graph)
+        if cache_key is not None:
+            _store_route(cache_key, route)
+        return route.model_dump(mode="json")
+
+    async def plan(index: int, route_request: RouteOptimizationRequest) -> dict:
+        async with semaphore:
+            try:
+                return {"index": index, "status": "ok", "route": await run_in_threadpool(search, route_request)}
+            except HTTPException as e:
+                return {"index": index, "status": "error", "detail": e.detail}
+            except Exception as e:
+                return {"index": index, "status": "error", "detail": str(e)}
+
+    async def stream():
+        tasks = [asyncio.ensure_future(plan(i, route_request)) for i, route_request in enumerate(routes)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            # Stop the remaining searches if the client goes away
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/metrics")
+def route_metrics(current_user: dict = Depends(get_current_user)):
+    """
+    OSRM usage of this worker: call counts and latency histograms by service,
+    cache hit ratio, fallbacks and search effort, per-endpoint latency and
+    the slowest recent requests, plus the state of the caches and the OSRM
+    circuit breaker
+    """
+    return {
+        "osrm": osrm_metrics.snapshot(),
+        "circuit_breaker": get_circuit_breaker(settings.OSRM_SERVER_URL.rstrip("/")).stats(),
+        "single_flight": {"coalesced": single_flight.coalesced},
+        "road_distance_cache": road_distance_cache.stats(),
+        "route_cache": route_result_cache.stats()
+    }
+
 @router.get("/nearest-station", response_model=StationResponse)
 def find_nearest_station(
     latitude: float,
@@ -145,19 +359,17 @@ def find_nearest_station(
     """
     Find the nearest charging station to the given coordinates.
     """
-    # Fetch all available stations with their charging configs
-    stations = db.query(Station).options(
-        joinedload(Station.charging_configs)
-    ).filter(Station.is_available == True).all()
+    # Borrow the worker's shared station snapshot
+    snapshot = station_index.get_snapshot()
 
-    if not stations:
+    if not snapshot.stations:
         raise HTTPException(
             status_code=404,
             detail="No matching charging stations found"
         )
 
-    optimizer = OSRMRouteOptimizer(
-        stations=stations,
+    optimizer = OSRMRouteOptimizer.from_snapshot(
+        snapshot,
         battery_range=settings.MAX_SEARCH_RADIUS,
         osrm_server=settings.OSRM_SERVER_URL
     )
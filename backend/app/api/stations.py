@@ -1,19 +1,81 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
+from typing import List, Literal, Optional
 from app.database.session import get_db
 from app.models.stations import Station
 from app.models.bookings import Booking
-from app.schemas.stations import ChargingConfigResponse, StationCreate, StationCreateResponse, StationResponse, StationSearchRequest, BookingInfo
+from app.schemas.stations import ChargingConfigResponse, CorridorSearchRequest, StationCreate, StationCreateResponse, StationResponse, StationSearchRequest, BookingInfo
 from app.models.admin import Admin
 from app.auth.dependencies import get_current_admin, get_current_user, require_super_admin
 from app.services.route_optimizer import OSRMRouteOptimizer
+from app.services.async_route_optimizer import AsyncOSRMRouteOptimizer
+from app.services.station_index import StationSnapshot, station_index
+from app.services.station_graph import station_graph_store
+from app.repositories.station_repository import StationRepository, postgis_status
 from app.core.config import Settings, settings
 from app.models.chargingCosts import ChargingConfig
 from datetime import datetime
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 
+
+def _database_candidates(db: Session, latitude: float, longitude: float, radius: float):
+    """
+    Great-circle candidates from the database, nearest first, as (station, distance).
+
+    The PostGIS search needs the stations.geog column and the extension; on
+    databases without them (such as one built by create_all only) it falls
+    back to the bounding-box search, which works anywhere.
+    """
+    repository = StationRepository(db)
+    limit = settings.STATION_SEARCH_MAX_CANDIDATES
+
+    if settings.STATION_SEARCH_BACKEND == "postgis" and postgis_status.usable():
+        try:
+            candidates = repository.within_radius(latitude, longitude, radius, limit=limit)
+            postgis_status.succeeded()
+            return candidates
+        except (ProgrammingError, OperationalError) as e:
+            # The failed statement aborts the transaction
+            db.rollback()
+            postgis_status.failed(e)
+
+    return repository.within_bounding_box(latitude, longitude, radius, limit=limit)
+
+
+def _radius_search(db: Session, latitude: float, longitude: float, radius: float):
+    """
+    Stations within a road-distance radius, nearest first, as (station, distance, route_info).
+
+    With STATION_SEARCH_BACKEND="postgis" (or "bbox" on databases without
+    PostGIS) the great-circle prefilter runs in the database and only its
+    candidate rows are loaded and measured, without the worker's station
+    snapshot; otherwise the shared snapshot's in-memory index is used.
+    """
+    if settings.STATION_SEARCH_BACKEND in ("postgis", "bbox"):
+        candidates = [station for station, _ in _database_candidates(db, latitude, longitude, radius)]
+        # Only the candidates' arrays are needed to measure them, not trees
+        optimizer = OSRMRouteOptimizer.from_snapshot(
+            StationSnapshot(candidates, indexed=False),
+            battery_range=settings.MAX_SEARCH_RADIUS,
+            osrm_server=settings.OSRM_SERVER_URL
+        )
+        return optimizer.find_nearby_among(latitude, longitude, candidates, radius)
+
+    # Borrow the worker's shared station snapshot
+    snapshot = station_index.get_snapshot()
+    if not snapshot.stations:
+        raise HTTPException(status_code=404, detail="No available stations found")
+
+    optimizer = OSRMRouteOptimizer.from_snapshot(
+        snapshot,
+        battery_range=settings.MAX_SEARCH_RADIUS,
+        osrm_server=settings.OSRM_SERVER_URL
+    )
+    return optimizer.find_nearby_stations(latitude, longitude, radius)
+
 @router.post("/search", response_model=List[StationResponse])
 def get_nearby_stations(
     search_request: StationSearchRequest = Body(...),
@@ -27,20 +89,8 @@ def get_nearby_stations(
     longitude = search_request.longitude
     radius = search_request.radius
 
-    # Fetch all available stations
-    stations = db.query(Station).options(joinedload(Station.charging_configs)).filter(Station.is_available == True).all()
-
-    if not stations:
-        raise HTTPException(status_code=404, detail="No available stations found")
-
     try:
-        optimizer = OSRMRouteOptimizer(
-            stations=stations,
-            battery_range=settings.MAX_SEARCH_RADIUS,
-            osrm_server=settings.OSRM_SERVER_URL
-        )
-
-        results = optimizer.find_nearby_stations(latitude, longitude, radius)
+        results = _radius_search(db, latitude, longitude, radius)
 
         if not results:
             return []
@@ -71,6 +121,8 @@ def get_nearby_stations(
 
         return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -82,11 +134,11 @@ class RouteRequest(BaseModel):
     start_longitude: float
     end_latitude: float
     end_longitude: float
+    algorithm: Literal["dijkstra", "astar", "bidirectional"] = "dijkstra"
 
 @router.post("/route", response_model=List[StationResponse])
-def get_stations_along_route(
+async def get_stations_along_route(
     route_request: RouteRequest = Body(...),
-    db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -95,26 +147,29 @@ def get_stations_along_route(
     start_coords = (route_request.start_latitude, route_request.start_longitude)
     end_coords = (route_request.end_latitude, route_request.end_longitude)
 
-    # Fetch all available stations
-    stations = db.query(Station).options(joinedload(Station.charging_configs)).filter(Station.is_available == True).all()
+    # Borrow the worker's shared station snapshot (the first load hits the database)
+    snapshot = await run_in_threadpool(station_index.get_snapshot)
+    station_graph = await run_in_threadpool(station_graph_store.get)
 
-    if not stations:
+    if not snapshot.stations:
         raise HTTPException(status_code=404, detail="No available stations found")
 
     try:
-        optimizer = OSRMRouteOptimizer(
-            stations=stations,
+        optimizer = AsyncOSRMRouteOptimizer.from_snapshot(
+            snapshot,
             battery_range=settings.MAX_SEARCH_RADIUS,
-            osrm_server=settings.OSRM_SERVER_URL
+            osrm_server=settings.OSRM_SERVER_URL,
+            station_graph=station_graph
         )
 
-        route = optimizer.dijkstra_route(start_coords, end_coords)
+        # The search measures legs without geometry; the plan loads it for the chosen ones
+        plan = await optimizer.plan_route(start_coords, end_coords, algorithm=route_request.algorithm)
 
-        if not route:
+        if not plan.stops:
             return []
 
         response = []
-        for station, route_info in route:
+        for station, route_info in plan.route:
             charging_configs = [
                 ChargingConfigResponse(
                     charging_type=config.charging_type,
@@ -142,6 +197,81 @@ def get_stations_along_route(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/corridor", response_model=List[StationResponse])
+async def get_stations_along_corridor(
+    corridor_request: CorridorSearchRequest = Body(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Find every available station within a radius of the direct driving route, in driving order
+    """
+    snapshot = await run_in_threadpool(station_index.get_snapshot)
+
+    try:
+        optimizer = AsyncOSRMRouteOptimizer.from_snapshot(
+            snapshot,
+            battery_range=settings.MAX_SEARCH_RADIUS,
+            osrm_server=settings.OSRM_SERVER_URL
+        )
+        total_distance, route_info = await optimizer.get_road_distance(
+            corridor_request.start_latitude, corridor_request.start_longitude,
+            corridor_request.end_latitude, corridor_request.end_longitude
+        )
+
+        # Without a road geometry the corridor follows the straight line, and
+        # positions along it are stretched to the estimated road distance
+        geometry = route_info.get("geometry") or {}
+        stretch = 1.0
+        if geometry.get("coordinates"):
+            line = [(lat, lon) for lon, lat in geometry["coordinates"]]
+        else:
+            line = [
+                (corridor_request.start_latitude, corridor_request.start_longitude),
+                (corridor_request.end_latitude, corridor_request.end_longitude)
+            ]
+            straight = optimizer.haversine_distance(*line[0], *line[1])
+            if straight > 0:
+                stretch = total_distance / straight
+
+        results = snapshot.query_corridor(
+            line,
+            corridor_request.radius,
+            charging_type=corridor_request.charging_type,
+            min_power=corridor_request.power_output
+        )
+
+        response = []
+        for station, along, off_route in results:
+            along *= stretch
+            charging_configs = [
+                ChargingConfigResponse(
+                    charging_type=config.charging_type,
+                    connector_type=config.connector_type,
+                    power_output=config.power_output,
+                    cost_per_kwh=config.cost_per_kwh
+                )
+                for config in station.charging_configs
+            ]
+
+            response.append(
+                StationResponse(
+                    id=station.id,
+                    name=station.name,
+                    latitude=station.latitude,
+                    longitude=station.longitude,
+                    is_available=station.is_available,
+                    charging_configs=charging_configs,
+                    distance_from_start=round(along, 2),
+                    distance_to_destination=round(max(total_distance - along, 0.0), 2),
+                    distance_from_route=round(off_route, 2)
+                )
+            )
+
+        return response
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/search-with-bookings", response_model=List[StationResponse])
 def search_stations_with_bookings(
     name: Optional[str] = Query(None, description="Station name to search for"),
@@ -284,21 +414,8 @@ def get_stations_by_coordinates(
     This supports clients like Flutter that use GET /stations/nearby?lat=...&lng=...
     """
     # Reuse the logic from the /search POST endpoint
-    stations = db.query(Station).options(joinedload(Station.charging_configs)).filter(
-        Station.is_available == True
-    ).all()
-
-    if not stations:
-        raise HTTPException(status_code=404, detail="No available stations found")
-
     try:
-        optimizer = OSRMRouteOptimizer(
-            stations=stations,
-            battery_range=settings.MAX_SEARCH_RADIUS,
-            osrm_server=settings.OSRM_SERVER_URL
-        )
-
-        results = optimizer.find_nearby_stations(lat, lng, max_range)
+        results = _radius_search(db, lat, lng, max_range)
 
         response = []
         for station, distance, route_info in results:
@@ -325,6 +442,8 @@ def get_stations_by_coordinates(
             )
 
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -365,7 +484,7 @@ def create_station(
 
             db.commit()
 
-        return StationCreateResponse(
+        response = StationCreateResponse(
             id=db_station.id,
             name=db_station.name,
             latitude=db_station.latitude,
@@ -379,6 +498,10 @@ def create_station(
             status_code=500,
             detail="Failed to create charging station"
         )
+
+    # The station is committed, so a failed index update must not fail the request
+    station_index.station_changed(response.id)
+    return response
     
 @router.delete("/super-admin/delete-station/{station_id}", response_model=StationCreateResponse)
 def delete_station(
@@ -411,7 +534,7 @@ def delete_station(
         db.commit()
 
         # Return a success response
-        return StationCreateResponse(
+        response = StationCreateResponse(
             id=db_station.id,
             name=db_station.name,
             latitude=db_station.latitude,
@@ -424,4 +547,8 @@ def delete_station(
         raise HTTPException(
             status_code=500,
             detail="Failed to delete charging station"
-        )
\ No newline at end of file
+        )
+
+    # The deletion is committed, so a failed index update must not fail the request
+    station_index.station_removed(station_id)
+    return response
\ No newline at end of file
@@ -6,7 +6,7 @@ celery_app = Celery(
     "app",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=["app.services.payment_tasks"]
+    include=["app.services.payment_tasks", "app.services.station_graph_tasks", "app.services.road_estimator_tasks"]
 )
 
 # Configure Celery
@@ -26,4 +26,12 @@ celery_app.conf.beat_schedule = {
         'task': 'app.services.payment_tasks.check_pending_payments',
         'schedule': 300.0,  # 5 minutes
     },
+    'rebuild-station-graph': {
+        'task': 'app.services.station_graph_tasks.build_station_graph',
+        'schedule': float(settings.STATION_GRAPH_REBUILD_SECONDS),
+    },
+    'calibrate-road-estimator': {
+        'task': 'app.services.road_estimator_tasks.calibrate_road_estimator',
+        'schedule': float(settings.ROAD_ESTIMATOR_CALIBRATE_SECONDS),
+    },
 }
\ No newline at end of file
@@ -24,9 +24,61 @@ class Settings(BaseSettings):
     ALGORITHM: str 
     ACCESS_TOKEN_EXPIRE_MINUTES:int
     OSRM_SERVER_URL: str = "http://router.project-osrm.org"
+    OSRM_POOL_SIZE: int = 20  # keep-alive connections per OSRM host
+    OSRM_MAX_RETRIES: int = 2  # failed connections retried within a call's timeout; responses are never retried
+    OSRM_BACKOFF_FACTOR: float = 0.2  # seconds, doubled on every retry
+    OSRM_TIMEOUT_SECONDS: float = 5.0
+    OSRM_REQUEST_BUDGET_SECONDS: float = 10.0  # OSRM time one route request may spend before estimating the rest (0 = unlimited)
+    OSRM_BREAKER_WINDOW: int = 20  # recent OSRM calls the circuit breaker judges the error rate on
+    OSRM_BREAKER_MIN_CALLS: int = 10
+    OSRM_BREAKER_FAILURE_RATE: float = 0.5  # share of failed or slow calls that opens the circuit
+    OSRM_BREAKER_SLOW_CALL_SECONDS: float = 2.0  # calls slower than this count as failures
+    OSRM_BREAKER_OPEN_SECONDS: float = 30.0  # how long an open circuit refuses calls before probing
+    OSRM_BREAKER_HALF_OPEN_PROBES: int = 1
+    OSRM_SINGLE_FLIGHT_ACROSS_WORKERS: bool = False  # also coalesce across workers through Redis; costs Redis round trips on every OSRM call
+    OSRM_SINGLE_FLIGHT_LOCK_SECONDS: float = 10.0  # expiry of the lock held by the worker making the call
+    OSRM_SINGLE_FLIGHT_RESULT_SECONDS: float = 5.0  # how long the shared response stays readable
+    OSRM_SINGLE_FLIGHT_POLL_SECONDS: float = 0.02
+    OSRM_METRICS_HEADER: bool = False  # add an X-OSRM-Metrics debug header to responses that used OSRM
+    OSRM_SLOW_REQUEST_SECONDS: float = 2.0  # requests slower than this are logged with their OSRM usage
+    OSRM_SLOW_REQUESTS_KEPT: int = 20  # slowest recent requests listed by /routes/metrics
+    OSRM_MAX_CONCURRENCY: int = 8  # in-flight OSRM calls per async route request
+    ROUTE_FRONTIER_BATCH_SIZE: int = 4  # frontier stations measured per many-to-many Table call
+    ROUTE_BATCH_MAX_ROUTES: int = 500  # origin/destination pairs accepted by /routes/optimize/batch
+    ROUTE_BATCH_CONCURRENCY: int = 8  # routes of one batch searched at the same time
     MAX_SEARCH_RADIUS: float = 20  # in kilometers
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     PAYMENT_TIMEOUT_MINUTES: int = 15
+    STATION_INDEX_TTL_SECONDS: int = 300  # rebuild the per-worker station index after this
+    STATION_INDEX_COMPACT_SECONDS: int = 30  # fold station deltas into fresh trees this often
+    STATION_INDEX_MAX_DELTA: int = 256  # compact immediately once this many changes pile up
+    STATION_SEARCH_BACKEND: str = "postgis"  # "postgis", "bbox" (radius queries in the database) or "memory" (per-worker index)
+    STATION_SEARCH_MAX_CANDIDATES: int = 200  # nearest rows a database radius search returns
+    STATION_SEARCH_POSTGIS_RETRY_SECONDS: int = 300  # bounding-box searches after a PostGIS failure before PostGIS is retried
+    OSRM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    OSRM_CACHE_GRID_METERS: float = 10.0  # coordinates are snapped to this grid for cache keys
+    OSRM_CACHE_GEOMETRY_TTL_SECONDS: int = 24 * 3600
+    OSRM_CACHE_SCALAR_BUDGET_BYTES: int = 16 * 1024 * 1024  # per-worker budget for distance/duration pairs
+    OSRM_CACHE_GEOMETRY_BUDGET_BYTES: int = 64 * 1024 * 1024  # per-worker budget for route geometries
+    OSRM_CACHE_SCALAR_LOCAL_TTL_SECONDS: int = 24 * 3600
+    OSRM_CACHE_GEOMETRY_LOCAL_TTL_SECONDS: int = 15 * 60
+    ROUTE_CACHE_TTL_SECONDS: int = 6 * 3600  # finished routes; station changes invalidate them sooner
+    ROUTE_CACHE_GRID_METERS: float = 100.0  # trip endpoints are snapped to this grid for cache keys
+    ROUTE_CACHE_BUDGET_BYTES: int = 32 * 1024 * 1024  # per-worker budget for cached route responses
+    ROAD_ESTIMATOR_REGION_DEGREES: float = 1.0  # detour factors are calibrated per cell of this many degrees
+    ROAD_ESTIMATOR_MIN_SAMPLES: int = 30  # measured legs a region/distance band needs before it is trusted
+    ROAD_ESTIMATOR_LOSSY_PRUNING: bool = False  # drop stations by a calibrated detour factor quantile; can drop in-range ones
+    ROAD_ESTIMATOR_PRUNE_QUANTILE: float = 0.02  # detour factor quantile used by lossy pruning
+    ROAD_ESTIMATOR_MAX_SAMPLES: int = 200000  # cached legs read per calibration run
+    ROAD_ESTIMATOR_REFRESH_SECONDS: int = 300  # how often workers reload the calibration
+    ROAD_ESTIMATOR_CALIBRATE_SECONDS: int = 6 * 3600
+    STATION_GRAPH_REFRESH_SECONDS: int = 30  # how often workers look for a newer station graph
+    STATION_GRAPH_REBUILD_SECONDS: int = 24 * 3600  # full rebuild cadence; station changes update it in between
+    STATION_GRAPH_SOURCES_PER_CALL: int = 10  # nearby stations measured together in one Table call during a rebuild
+    STATION_GRAPH_LOCK_SECONDS: int = 600  # expiry of the lock serializing graph writes; renewed while a rebuild runs
+    STATION_GRAPH_BACKOFF_SECONDS: float = 5.0  # first pause of a rebuild after OSRM fails or the breaker opens
+    STATION_GRAPH_MAX_BACKOFF_SECONDS: float = 300.0
+    STATION_GRAPH_MAX_RETRIES: int = 8  # consecutive failed attempts on one batch before a rebuild gives up
 
 
 
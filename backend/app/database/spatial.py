@@ -0,0 +1,64 @@
+import logging
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock serializing the DDL between workers that start together
+STATION_GEOGRAPHY_LOCK_KEY = 3167295
+# Same statements as the add_station_geography migration, all idempotent
+STATION_GEOGRAPHY_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    "ALTER TABLE stations ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)",
+    """
+    UPDATE stations
+    SET geog = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+    WHERE geog IS NULL
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stations_set_geog() RETURNS trigger AS $$
+    BEGIN
+        NEW.geog := ST_SetSRID(ST_MakePoint(NEW.longitude, NEW.latitude), 4326)::geography;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS stations_set_geog ON stations",
+    """
+    CREATE TRIGGER stations_set_geog
+    BEFORE INSERT OR UPDATE OF latitude, longitude ON stations
+    FOR EACH ROW EXECUTE FUNCTION stations_set_geog()
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_stations_geog ON stations USING GIST (geog)",
+)
+
+
+def ensure_station_geography(engine: Engine) -> bool:
+    """
+    Add the stations.geog column with its trigger and GiST index if PostGIS is available.
+
+    Run at startup after create_all: the add_station_geography migration
+    skips databases whose tables do not exist yet, so this is where those
+    get the column. Returns whether the column is in place; without it,
+    station searches fall back to the bounding-box query.
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+
+    try:
+        with engine.begin() as connection:
+            available = connection.execute(
+                text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")
+            ).first()
+            if available is None:
+                logger.warning("PostGIS is not available, stations.geog is not created")
+                return False
+
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": STATION_GEOGRAPHY_LOCK_KEY})
+            for statement in STATION_GEOGRAPHY_DDL:
+                connection.exec_driver_sql(statement)
+        return True
+    except DBAPIError as e:
+        logger.warning(f"Could not create stations.geog: {e}")
+        return False
@@ -38,6 +38,8 @@
 # def health_check():
 #     return {"status": "healthy"}
 
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import Dict, Any, Union
 
@@ -45,11 +47,15 @@ from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.openapi.utils import get_openapi
+from starlette.datastructures import MutableHeaders
 from sqlalchemy.orm import Session
 from app.api import stations, bookings, payments, routes, admin
 from app.core.config import settings
 from app.database.session import engine, get_db
 from app.database import base
+from app.database.spatial import ensure_station_geography
+from app.services.osrm_client import close_async_osrm_clients
+from app.services.osrm_metrics import osrm_metrics
 from app.models.admin import Admin
 from app.models.user import User
 from app.schemas.auth import Token  # Import the actual Token schema
@@ -65,8 +71,17 @@ from app.schemas.user import UserCreate, UserResponse, UserWithRoleResponse
 
 # Create database tables
 base.Base.metadata.create_all(bind=engine)
+# stations.geog is not mapped, so create_all leaves it to this
+ensure_station_geography(engine)
 
-app = FastAPI(title=settings.PROJECT_NAME,debug=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close this worker's pooled async OSRM connections
+    await close_async_osrm_clients()
+
+
+app = FastAPI(title=settings.PROJECT_NAME,debug=True, lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -77,6 +92,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class OSRMUsageMiddleware:
+    """
+    Collect the OSRM usage of each request for /routes/metrics and the
+    optional debug header.
+
+    A plain ASGI middleware, so a request is only finished once the last
+    chunk of its body is sent and streamed responses such as
+    /routes/optimize/batch are counted in full. Their header can only
+    carry the usage up to the moment the headers are sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage, token = osrm_metrics.start_request()
+        started = time.monotonic()
+        finished = None
+        status_code = None
+
+        async def send_with_usage(message):
+            nonlocal finished, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.OSRM_METRICS_HEADER and usage.active:
+                    MutableHeaders(scope=message).append("X-OSRM-Metrics", usage.header_value())
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = time.monotonic()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_usage)
+        finally:
+            # Group by route template so path parameters do not split the statistics
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+            elapsed = (finished if finished is not None else time.monotonic()) - started
+            osrm_metrics.finish_request(token, usage, endpoint, elapsed, status_code)
+
+
+app.add_middleware(OSRMUsageMiddleware)
+
 # Include API routers
 app.include_router(stations.router, prefix="/stations", tags=["stations"])
 app.include_router(bookings.router, prefix="/bookings", tags=["bookings"])
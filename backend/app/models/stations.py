@@ -1,5 +1,5 @@
 # app/models/stations.py
-from sqlalchemy import Column, Integer, String, Float, Boolean
+from sqlalchemy import Column, Integer, String, Float, Boolean, Index
 from sqlalchemy.orm import relationship
 from app.database.base import Base
 from app.models.bookings import Booking  # Import the Booking model
@@ -7,6 +7,10 @@ from app.models.admin import admin_stations  # Import the Booking model
 
 class Station(Base):
     __tablename__ = "stations"
+    __table_args__ = (
+        # Bounding-box prefilter for StationRepository.within_bounding_box
+        Index("idx_stations_lat_lon", "latitude", "longitude"),
+    )
     
     id = Column(Integer, primary_key=True, index=True,autoincrement=True)
     name = Column(String, index=True)
@@ -15,6 +19,8 @@ class Station(Base):
     longitude = Column(Float, nullable=False)
     is_available = Column(Boolean, default=True)
     is_maintenance = Column(Boolean, default=False)
+    # stations.geog (PostGIS geography) is maintained by a database trigger
+    # and queried through StationRepository; it is deliberately not mapped here
     
     # Add relationship with admins
     admins = relationship("Admin", secondary=admin_stations, back_populates="stations")
@@ -0,0 +1,133 @@
+import time
+import logging
+import threading
+from typing import List, Tuple
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session, selectinload
+from app.core.config import settings
+from app.models.stations import Station
+from app.utils.distance_calculator import calculate_box_bounds, haversine_distance
+
+logger = logging.getLogger(__name__)
+
+# stations.geog is created by the add_station_geography migration and is not mapped on Station
+_GEOG = literal_column("stations.geog")
+
+
+def _point(latitude: float, longitude: float):
+    """A WGS84 point as a PostGIS geography"""
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326))
+
+
+class StationRepository:
+    """
+    Spatial station queries that run inside the database.
+
+    within_radius needs PostGIS and uses the stations.geog column with its
+    GiST index; within_bounding_box only needs the (latitude, longitude)
+    B-tree index and works on any database. Either way only candidate rows
+    and their charging configs are loaded instead of the whole catalog.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: int = None
+    ) -> List[Tuple[Station, float]]:
+        """
+        Available stations within radius_km (great-circle) of a point,
+        nearest first, with their distance in km
+        """
+        point = _point(latitude, longitude)
+
+        query = (
+            self.db.query(Station, func.ST_Distance(_GEOG, point).label("distance_m"))
+            # A separate IN query for the configs keeps LIMIT on plain station rows
+            .options(selectinload(Station.charging_configs))
+            .filter(Station.is_available == True)
+            .filter(func.ST_DWithin(_GEOG, point, radius_km * 1000))
+            # Index-assisted KNN ordering
+            .order_by(_GEOG.op("<->")(point))
+        )
+        if limit is not None:
+            query = query.limit(limit)
+
+        return [(station, distance_m / 1000) for station, distance_m in query.all()]
+
+    def within_bounding_box(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: int = None
+    ) -> List[Tuple[Station, float]]:
+        """
+        Same contract as within_radius without PostGIS: the bounding box is
+        applied in SQL, the exact great-circle check on the few rows inside it
+        """
+        min_lat, max_lat, min_lon, max_lon = calculate_box_bounds(latitude, longitude, radius_km)
+
+        stations = (
+            self.db.query(Station)
+            .options(selectinload(Station.charging_configs))
+            .filter(Station.is_available == True)
+            .filter(Station.latitude.between(min_lat, max_lat))
+            .filter(Station.longitude.between(min_lon, max_lon))
+            .all()
+        )
+
+        candidates = sorted(
+            (
+                (station, haversine_distance(latitude, longitude, station.latitude, station.longitude))
+                for station in stations
+            ),
+            key=lambda x: x[1]
+        )
+        candidates = [(station, distance) for station, distance in candidates if distance <= radius_km]
+        return candidates[:limit] if limit is not None else candidates
+
+
+class PostgisStatus:
+    """
+    Whether this worker should try the PostGIS station search.
+
+    After a failed PostGIS query, such as on a database without the geog
+    column or the extension, callers use the bounding-box search for
+    STATION_SEARCH_POSTGIS_RETRY_SECONDS and then try PostGIS again. An
+    outage is logged once when it starts and once when it ends.
+    """
+
+    def __init__(self, retry_seconds: float = None):
+        self.retry_seconds = (
+            retry_seconds if retry_seconds is not None else settings.STATION_SEARCH_POSTGIS_RETRY_SECONDS
+        )
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self._failing = False
+
+    def usable(self) -> bool:
+        with self._lock:
+            return time.monotonic() >= self._retry_at
+
+    def failed(self, error: Exception):
+        with self._lock:
+            self._retry_at = time.monotonic() + self.retry_seconds
+            if self._failing:
+                return
+            self._failing = True
+        logger.warning(f"PostGIS station search failed, using the bounding-box search instead: {error}")
+
+    def succeeded(self):
+        with self._lock:
+            if not self._failing:
+                return
+            self._failing = False
+        logger.info("PostGIS station search is available again")
+
+
+postgis_status = PostgisStatus()
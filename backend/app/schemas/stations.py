@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 class StationBase(BaseModel):
     name: str
@@ -48,6 +48,7 @@ class StationResponse(BaseModel):
     distance_from_previous: Optional[float] = None
     distance_from_start: Optional[float] = None
     distance_to_destination: Optional[float] = None
+    distance_from_route: Optional[float] = None
     charging_configs: List[ChargingConfigResponse]
     route_geometry: Optional[dict] = None
     bookings: Optional[List[BookingInfo]] = Field(default_factory=list)
@@ -67,11 +68,30 @@ class StationSearchRequest(BaseModel):
     charging_type: Optional[str] = None
     power_output: Optional[float] = None
 
+class CorridorSearchRequest(BaseModel):
+    start_latitude: float = Field(..., ge=-90, le=90)
+    start_longitude: float = Field(..., ge=-180, le=180)
+    end_latitude: float = Field(..., ge=-90, le=90)
+    end_longitude: float = Field(..., ge=-180, le=180)
+    radius: float = Field(2.0, gt=0, le=50)  # km either side of the driving route
+    charging_type: Optional[str] = None
+    power_output: Optional[float] = None
+
 class RouteOptimizationRequest(BaseModel):
     start_latitude: float = Field(..., ge=-90, le=90)
     start_longitude: float = Field(..., ge=-180, le=180)
     end_latitude: float = Field(..., ge=-90, le=90)
     end_longitude: float = Field(..., ge=-180, le=180)
+    algorithm: Literal["dijkstra", "astar", "bidirectional"] = "dijkstra"
+    # "polyline" returns each segment's route_geometry as a Google encoded polyline
+    geometry_format: Literal["geojson", "polyline"] = "geojson"
+    polyline_precision: int = Field(5, ge=1, le=7)
+    # Simplify polylines to one map pixel at this zoom level
+    zoom: Optional[int] = Field(None, ge=0, le=22)
+    include_steps: bool = False
+
+class RouteBatchRequest(BaseModel):
+    routes: List[RouteOptimizationRequest] = Field(..., min_length=1)
 
 class RouteResponse(BaseModel):
     charging_stations: List[StationResponse]
@@ -81,6 +101,8 @@ class RouteResponse(BaseModel):
     estimated_charging_time: float
     total_trip_time: float
     route_segments: List[Dict[str, Any]] 
+    search_stats: Optional[Dict[str, Any]] = None
+    geometry_format: str = "geojson"
 
     class Config:
         schema_extra = {
@@ -9,6 +9,7 @@ from app.models.stations import Station
 from app.schemas.admin import AdminCreate, AdminUpdate, StationAssignment
 from app.auth.dependencies import get_password_hash
 from app.models.bookings import Booking
+from app.services.station_index import station_index
 
 
 class AdminService:
@@ -155,6 +156,7 @@ class AdminService:
             station.is_maintenance = is_maintenance
             self.db.commit()
             self.db.refresh(station)
+            station_index.station_changed(station_id)
             print(f"Backend: Station {station_id} maintenance status updated to {is_maintenance}")
             return {"message": f"Station {station_id} maintenance status updated to {is_maintenance}"}
         
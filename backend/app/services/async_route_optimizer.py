@@ -0,0 +1,389 @@
+import asyncio
+import numpy as np
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.models.stations import Station
+from app.services.osrm_client import AsyncOSRMClient, get_async_osrm_client
+from app.services.osrm_metrics import osrm_metrics
+from app.services.route_optimizer import OSRMRouteOptimizer
+from app.services.route_plan import Leg, RoutePlan
+
+
+class AsyncOSRMRouteOptimizer:
+    """
+    Asyncio driver of OSRMRouteOptimizer.
+
+    It wraps a synchronous optimizer, which holds the snapshot, the budget
+    and the counters and supplies every I/O-free step of the search and
+    summary, and answers the OSRM and Redis lookups itself with an async
+    client, issuing independent legs and table calls concurrently, bounded
+    by a per-request semaphore of OSRM_MAX_CONCURRENCY. It does not
+    subclass the optimizer, so no synchronous code path can end up calling
+    one of its coroutines without awaiting it.
+    """
+
+    def __init__(
+        self,
+        *args,
+        async_client: AsyncOSRMClient = None,
+        max_concurrency: int = None,
+        **kwargs
+    ):
+        self.core = OSRMRouteOptimizer(*args, **kwargs)
+        self.async_client = async_client
+        self._semaphore = asyncio.Semaphore(
+            max_concurrency if max_concurrency is not None else settings.OSRM_MAX_CONCURRENCY
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot, battery_range: float, osrm_server: str = None, **kwargs) -> "AsyncOSRMRouteOptimizer":
+        """Create an async optimizer over a shared StationSnapshot without rebuilding any index"""
+        return cls(
+            stations=snapshot.stations,
+            battery_range=battery_range,
+            osrm_server=osrm_server,
+            snapshot=snapshot,
+            **kwargs
+        )
+
+    @property
+    def snapshot(self):
+        return self.core.snapshot
+
+    @property
+    def include_steps(self) -> bool:
+        return self.core.include_steps
+
+    @property
+    def search_stats(self) -> Dict[str, Any]:
+        return self.core.search_stats
+
+    @property
+    def osrm_calls(self) -> int:
+        return self.core.osrm_calls
+
+    @property
+    def estimated_legs(self) -> int:
+        return self.core.estimated_legs
+
+    def haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        return self.core.haversine_distance(lat1, lon1, lat2, lon2)
+
+    def _client(self) -> AsyncOSRMClient:
+        if self.async_client is None:
+            self.async_client = get_async_osrm_client(self.core.osrm_server)
+        return self.async_client
+
+    async def get_road_distance(self, start_lat: float, start_lon: float,
+                                end_lat: float, end_lon: float,
+                                need_geometry: bool = True) -> Tuple[float, Dict[str, Any]]:
+        """Async version of OSRMRouteOptimizer.get_road_distance"""
+        cached = await self._cached_leg(start_lat, start_lon, end_lat, end_lon, need_geometry)
+        if cached is not None:
+            return self.core._mark_leg(cached, start_lat, start_lon, end_lat, end_lon)
+
+        if not self.core._osrm_available():
+            return self.core._fallback_distance(start_lat, start_lon, end_lat, end_lon)
+
+        try:
+            async with self._semaphore:
+                data = await self._client().route(
+                    [(start_lat, start_lon), (end_lat, end_lon)],
+                    timeout=self.core._osrm_timeout(),
+                    **self.core._route_params(need_geometry)
+                )
+            leg = self.core._route_leg(data)
+            if leg is None:
+                return self.core._fallback_distance(start_lat, start_lon, end_lat, end_lon)
+            await self._store_legs([(start_lat, start_lon, end_lat, end_lon, *leg)])
+            return self.core._mark_leg(leg, start_lat, start_lon, end_lat, end_lon)
+
+        except Exception as e:
+            print(f"OSRM API error: {e}. Falling back to estimated road distance.")
+            return self.core._fallback_distance(start_lat, start_lon, end_lat, end_lon)
+
+    async def _cached_leg(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                          need_geometry: bool = True) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Async version of OSRMRouteOptimizer._cached_leg; Redis is only read from a worker thread"""
+        cached, pending = self.core.distance_cache.get_local(start_lat, start_lon, end_lat, end_lon, need_geometry)
+        if pending is not None:
+            cached = await run_in_threadpool(self.core.distance_cache.read_through, pending)
+        return self.core._usable_leg(cached, need_geometry)
+
+    async def _store_legs(self, writes: List[tuple]):
+        """Async version of OSRMRouteOptimizer._store_legs; the Redis pipeline runs in a worker thread"""
+        entries = self.core.distance_cache.set_local(writes)
+        if entries:
+            await run_in_threadpool(self.core.distance_cache.write_shared, entries)
+
+    async def load_geometry(self, route_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of OSRMRouteOptimizer.load_geometry"""
+        if route_info is None or route_info.get("geometry") is not None or "from" not in route_info:
+            return route_info
+
+        _, full_info = await self.get_road_distance(*route_info["from"], *route_info["to"])
+        route_info["geometry"] = full_info.get("geometry")
+        route_info["steps"] = full_info.get("steps")
+        return route_info
+
+    async def load_route_geometry(self, route: List[Tuple[Station, Dict]]) -> List[Tuple[Station, Dict]]:
+        """Load the geometry of every leg in a route concurrently"""
+        await asyncio.gather(*(self.load_geometry(route_info) for _, route_info in route))
+        return route
+
+    async def find_nearby_stations(
+        self,
+        current_lat: float,
+        current_lon: float,
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[Station, float, Dict]]:
+        """Async version of OSRMRouteOptimizer.find_nearby_stations"""
+        return self.core._as_stations(await self._find_nearby(current_lat, current_lon, max_range, reverse))
+
+    async def _find_nearby(
+        self,
+        current_lat: float,
+        current_lon: float,
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[int, float, Dict]]:
+        """Async version of OSRMRouteOptimizer._find_nearby"""
+        candidates = self.core._nearby_candidates(current_lat, current_lon, max_range)
+
+        if not len(candidates):
+            return []
+
+        if len(candidates) <= 5:
+            return await self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+        return await self._table_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+    async def find_nearby_stations_batch(
+        self,
+        points: List[Tuple[float, float]],
+        max_range: float,
+        reverse: bool = False
+    ) -> List[List[Tuple[Station, float, Dict]]]:
+        """Async version of OSRMRouteOptimizer.find_nearby_stations_batch"""
+        return [self.core._as_stations(rows) for rows in await self._find_nearby_batch(points, max_range, reverse)]
+
+    async def _find_nearby_batch(
+        self,
+        points: List[Tuple[float, float]],
+        max_range: float,
+        reverse: bool = False
+    ) -> List[List[Tuple[int, float, Dict]]]:
+        """Async version of OSRMRouteOptimizer._find_nearby_batch"""
+        if len(points) == 1:
+            return [await self._find_nearby(*points[0], max_range, reverse)]
+
+        candidates = [self.core._nearby_candidates(lat, lon, max_range) for lat, lon in points]
+        distinct = self.core._distinct(candidates)
+        if not len(distinct):
+            return [[] for _ in points]
+        if not self.core._osrm_available():
+            return list(await asyncio.gather(*(
+                self._find_nearby(lat, lon, max_range, reverse) for lat, lon in points
+            )))
+
+        async def fetch(request, chunk):
+            async with self._semaphore:
+                return await self._client().table(**request, timeout=self.core._osrm_timeout()), chunk
+
+        try:
+            responses = await asyncio.gather(*(
+                fetch(request, chunk) for request, chunk in self.core._matrix_requests(points, distinct, reverse)
+            ))
+            writes = []
+            rows = self.core._matrix_rows(list(responses), points, candidates, max_range, reverse, writes)
+            await self._store_legs(writes)
+            return rows
+
+        except Exception as e:
+            print(f"OSRM Table API error: {e}. Falling back to one request per position.")
+            osrm_metrics.record_fallback("table_error")
+            return list(await asyncio.gather(*(
+                self._find_nearby(lat, lon, max_range, reverse) for lat, lon in points
+            )))
+
+    async def _direct_distance_calculation(
+        self,
+        current_lat: float,
+        current_lon: float,
+        candidates: np.ndarray,
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[int, float, Dict]]:
+        """Fetch every candidate leg concurrently"""
+        legs = await asyncio.gather(*(
+            self.get_road_distance(*self.core._orient(current_lat, current_lon, point, reverse), need_geometry=False)
+            for point in self.core._points(candidates)
+        ))
+        return self.core._within_range(candidates, legs, max_range)
+
+    async def _table_distance_calculation(
+        self,
+        current_lat: float,
+        current_lon: float,
+        candidates: np.ndarray,
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[int, float, Dict]]:
+        """Async version of OSRMRouteOptimizer._table_distance_calculation"""
+        if not self.core._osrm_available():
+            return await self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+        async def fetch(request, chunk):
+            async with self._semaphore:
+                return await self._client().table(**request, timeout=self.core._osrm_timeout()), chunk
+
+        try:
+            responses = await asyncio.gather(*(
+                fetch(request, chunk)
+                for request, chunk in self.core._matrix_requests([(current_lat, current_lon)], candidates, reverse)
+            ))
+
+            if any(data["code"] != "Ok" for data, _ in responses):
+                return await self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+            writes = []
+            rows = [
+                row
+                for data, chunk in responses
+                for row in self.core._table_rows(data, current_lat, current_lon, chunk, max_range, reverse, writes=writes)
+            ]
+            await self._store_legs(writes)
+            return sorted(rows, key=lambda x: x[1])
+
+        except Exception as e:
+            print(f"OSRM Table API error: {e}. Falling back to direct calculation.")
+            osrm_metrics.record_fallback("table_error")
+            return await self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+    async def find_nearest_station(
+        self,
+        lat: float,
+        lon: float,
+        filter_charging_type: str = None,
+        filter_min_power: float = None,
+        need_geometry: bool = True
+    ) -> Tuple[Station, float, Dict]:
+        """Async version of OSRMRouteOptimizer.find_nearest_station"""
+        position, road_distance, route_info = await self._find_nearest(
+            lat, lon, filter_charging_type, filter_min_power, need_geometry
+        )
+        return self.core.snapshot.station(position), road_distance, route_info
+
+    async def _find_nearest(
+        self,
+        lat: float,
+        lon: float,
+        filter_charging_type: str = None,
+        filter_min_power: float = None,
+        need_geometry: bool = True
+    ) -> Tuple[int, float, Dict]:
+        """Async version of OSRMRouteOptimizer._find_nearest"""
+        top_candidates = self.core._nearest_candidates(lat, lon, filter_charging_type, filter_min_power)
+
+        legs = await asyncio.gather(*(
+            self.get_road_distance(lat, lon, *self.core._point(position), need_geometry=False)
+            for position, _ in top_candidates
+        ))
+        result = [
+            (position, road_distance, route_info)
+            for (position, _), (road_distance, route_info) in zip(top_candidates, legs)
+        ]
+
+        position, road_distance, route_info = min(result, key=lambda x: x[1])
+        if need_geometry:
+            await self.load_geometry(route_info)
+        return position, road_distance, route_info
+
+    async def dijkstra_route(
+        self,
+        start_coords: Tuple[float, float],
+        end_coords: Tuple[float, float],
+        algorithm: str = "dijkstra"
+    ) -> List[Tuple[Station, Dict]]:
+        """Async version of OSRMRouteOptimizer.dijkstra_route"""
+        return self.core._as_stations(await self._drive(self.core._route_search(start_coords, end_coords, algorithm)))
+
+
+    async def plan_route(
+        self,
+        start_coords: Tuple[float, float],
+        end_coords: Tuple[float, float],
+        algorithm: str = "dijkstra"
+    ) -> RoutePlan:
+        """Async version of OSRMRouteOptimizer.plan_route"""
+        route = await self.dijkstra_route(start_coords, end_coords, algorithm)
+        plan = RoutePlan.from_route(route, start_coords, end_coords)
+        return await self.load_plan(plan) if plan.stops else plan
+
+    async def load_plan(self, plan: RoutePlan) -> RoutePlan:
+        """Async version of OSRMRouteOptimizer.load_plan; leftover legs are fetched concurrently"""
+        missing = await self._uncached_plan_legs(plan)
+        if missing and len(plan.legs) > 1 and self.core._osrm_available():
+            try:
+                async with self._semaphore:
+                    data = await self._client().route(plan.points, timeout=self.core._osrm_timeout(), **self.core._route_params())
+                await self._store_legs(self.core._apply_plan_route(plan, data))
+            except Exception as e:
+                print(f"OSRM API error: {e}. Loading the route legs one at a time.")
+                osrm_metrics.record_fallback("plan_route_error")
+
+        legs = plan.incomplete_legs(self.core.include_steps)
+        measured = await asyncio.gather(*(self.get_road_distance(*leg.start, *leg.end) for leg in legs))
+        for leg, result in zip(legs, measured):
+            self.core._fill_leg(leg, result)
+        return plan
+
+    async def _uncached_plan_legs(self, plan: RoutePlan) -> List[Leg]:
+        """Async version of OSRMRouteOptimizer._uncached_plan_legs; the cache lookups run concurrently"""
+        legs = plan.incomplete_legs(self.core.include_steps)
+        cached = await asyncio.gather(*(self._cached_leg(*leg.start, *leg.end) for leg in legs))
+        for leg, hit in zip(legs, cached):
+            if hit is not None:
+                leg.fill(*hit)
+        return plan.incomplete_legs(self.core.include_steps)
+
+    async def _drive(self, search: Generator):
+        """Run a search generator to completion, answering its lookups concurrently"""
+        osrm_calls, estimated_legs = self.core.osrm_calls, self.core.estimated_legs
+        try:
+            request = next(search)
+            while True:
+                request = search.send(await self._resolve(request))
+        except StopIteration as done:
+            return done.value
+        finally:
+            self.core.search_stats["osrm_calls"] = self.core.osrm_calls - osrm_calls
+            self.core.search_stats["estimated_legs"] = self.core.estimated_legs - estimated_legs
+            osrm_metrics.record_search(self.core.search_stats.get("nodes_expanded", 0))
+
+    async def _resolve(self, request: tuple) -> list:
+        kind, points, *args = request
+        if kind == "nearest":
+            return list(await asyncio.gather(*(
+                self._find_nearest(lat, lon, need_geometry=False) for lat, lon in points
+            )))
+        if kind == "nearby":
+            return await self._find_nearby_batch(points, args[0])
+        if kind == "reaching":
+            return await self._find_nearby_batch(points, args[0], reverse=True)
+        raise ValueError(f"Unknown search request: {kind}")
+
+    async def get_route_summary(
+        self,
+        route: Union[RoutePlan, List[Tuple[Station, Dict]]],
+        start_coords: Tuple[float, float],
+        end_coords: Tuple[float, float]
+    ) -> dict:
+        """Async version of OSRMRouteOptimizer.get_route_summary"""
+        plan = route if isinstance(route, RoutePlan) else await self.load_plan(
+            RoutePlan.from_route(route, start_coords, end_coords)
+        )
+        direct = await self.get_road_distance(*start_coords, *end_coords, need_geometry=False)
+        return self.core._assemble_summary(plan.route, start_coords, end_coords, self.core._summary_legs(plan, direct))
@@ -0,0 +1,141 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Error-rate and latency circuit breaker for one upstream service.
+
+    Outcomes of the last `window` calls are kept; a call fails if it raised
+    or took longer than `slow_call_seconds`. Once at least `min_calls` are
+    recorded and the failure share reaches `failure_rate`, the circuit opens
+    and every call is refused with CircuitOpenError for `open_seconds`.
+    After that it is half-open: up to `half_open_probes` calls go through at
+    a time, and the first probe outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: int = None,
+        min_calls: int = None,
+        failure_rate: float = None,
+        slow_call_seconds: float = None,
+        open_seconds: float = None,
+        half_open_probes: int = None
+    ):
+        self.name = name
+        self.window = window if window is not None else settings.OSRM_BREAKER_WINDOW
+        self.min_calls = min_calls if min_calls is not None else settings.OSRM_BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate if failure_rate is not None else settings.OSRM_BREAKER_FAILURE_RATE
+        self.slow_call_seconds = (
+            slow_call_seconds if slow_call_seconds is not None else settings.OSRM_BREAKER_SLOW_CALL_SECONDS
+        )
+        self.open_seconds = open_seconds if open_seconds is not None else settings.OSRM_BREAKER_OPEN_SECONDS
+        self.half_open_probes = (
+            half_open_probes if half_open_probes is not None else settings.OSRM_BREAKER_HALF_OPEN_PROBES
+        )
+
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=self.window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def before_call(self):
+        """Admit a call, or raise CircuitOpenError if the circuit is refusing them"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self.state = self.HALF_OPEN
+                self._probes = 0
+
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is half-open and already probing")
+                self._probes += 1
+
+    def allows_calls(self) -> bool:
+        """Whether before_call would currently admit a call, without changing any state"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self._opened_at >= self.open_seconds
+            if self.state == self.HALF_OPEN:
+                return self._probes < self.half_open_probes
+            return True
+
+    def cancel(self):
+        """Forget an admitted call that was abandoned before it completed"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def record(self, ok: bool, elapsed: float):
+        """Record the outcome of an admitted call"""
+        failed = not ok or elapsed > self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._open()
+                else:
+                    logger.info(f"{self.name} circuit closed")
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                return
+
+            if self.state == self.OPEN:
+                # A call admitted before the circuit opened
+                return
+
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": sum(self._outcomes),
+                "rejected": self.rejected
+            }
+
+    def _open(self):
+        logger.warning(f"{self.name} circuit opened for {self.open_seconds}s")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker for a service, shared by its sync and async clients"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
@@ -0,0 +1,258 @@
+import json
+import time
+import zlib
+import struct
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.utils.lru_cache import BoundedLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Roughly how many meters one degree of latitude spans
+METERS_PER_DEGREE = 111320.0
+
+# distance_km, duration_minutes as little-endian float32
+SCALAR_FORMAT = struct.Struct("<ff")
+
+
+def encode_scalars(distance: float, duration: float) -> bytes:
+    return SCALAR_FORMAT.pack(distance, duration)
+
+
+def decode_scalars(value: bytes) -> Tuple[float, float]:
+    return SCALAR_FORMAT.unpack(value)
+
+
+def encode_geometry(route_info: Dict[str, Any]) -> bytes:
+    payload = {"geometry": route_info.get("geometry"), "steps": route_info.get("steps")}
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_geometry(value: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(value).decode("utf-8"))
+
+
+def estimate_geometry_size(payload: Dict[str, Any]) -> int:
+    """Rough in-memory footprint of a geometry/steps payload in bytes"""
+    geometry = payload.get("geometry") or {}
+    coordinates = geometry.get("coordinates") or []
+    steps = payload.get("steps") or []
+    # A [lon, lat] list of two floats costs ~120 bytes, a parsed OSRM step ~1 KB
+    return 256 + 120 * len(coordinates) + 1024 * len(steps)
+
+
+class RoadDistanceCache:
+    """
+    Two-tier cache of OSRM road distances shared by every optimizer.
+
+    An in-process LRU sits in front of Redis so repeated legs inside a worker
+    never leave the process, while legs computed by any API or Celery worker
+    are reused by all the others. Coordinates are snapped to a grid of
+    OSRM_CACHE_GRID_METERS so nearby floats share an entry. Redis holds the
+    distance/duration pair as 8 packed bytes and the geometry separately as
+    zlib-compressed JSON, both with a TTL.
+
+    Locally the small distance/duration scalars and the much larger geometry
+    payloads live in separate byte-bounded LRUs, so scalars can stay cached
+    long after their geometry has been evicted.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = None,
+        ttl_seconds: int = None,
+        grid_meters: float = None,
+        scalar_budget_bytes: int = None,
+        geometry_budget_bytes: int = None
+    ):
+        self.redis_url = redis_url if redis_url is not None else settings.REDIS_URL
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.OSRM_CACHE_TTL_SECONDS
+        self.geometry_ttl_seconds = min(self.ttl_seconds, settings.OSRM_CACHE_GEOMETRY_TTL_SECONDS)
+        self.grid_degrees = (grid_meters if grid_meters is not None else settings.OSRM_CACHE_GRID_METERS) / METERS_PER_DEGREE
+
+        self.scalars = BoundedLRUCache(
+            max_bytes=scalar_budget_bytes if scalar_budget_bytes is not None else settings.OSRM_CACHE_SCALAR_BUDGET_BYTES,
+            ttl_seconds=settings.OSRM_CACHE_SCALAR_LOCAL_TTL_SECONDS,
+            # key string + tuple of two floats
+            sizeof=lambda value: 160
+        )
+        self.geometries = BoundedLRUCache(
+            max_bytes=geometry_budget_bytes if geometry_budget_bytes is not None else settings.OSRM_CACHE_GEOMETRY_BUDGET_BYTES,
+            ttl_seconds=settings.OSRM_CACHE_GEOMETRY_LOCAL_TTL_SECONDS,
+            sizeof=estimate_geometry_size
+        )
+        self._redis = None
+        self._redis_retry_at = 0.0
+
+    def key(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> str:
+        """Quantize a leg to grid cells so nearly identical coordinates share an entry"""
+        cells = (
+            round(coord / self.grid_degrees)
+            for coord in (start_lat, start_lon, end_lat, end_lon)
+        )
+        return "osrm:route:" + ":".join(str(c) for c in cells)
+
+    def get(
+        self,
+        start_lat: float,
+        start_lon: float,
+        end_lat: float,
+        end_lon: float,
+        need_geometry: bool = True
+    ) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """
+        Return (distance_km, route_info) for a leg, or None on a miss.
+
+        With need_geometry=False only the scalars are looked up and route_info
+        carries geometry=None.
+        """
+        entry, pending = self.get_local(start_lat, start_lon, end_lat, end_lon, need_geometry)
+        return entry if pending is None else self.read_through(pending)
+
+    def get_local(
+        self,
+        start_lat: float,
+        start_lon: float,
+        end_lat: float,
+        end_lon: float,
+        need_geometry: bool = True
+    ) -> Tuple[Optional[Tuple[float, Dict[str, Any]]], Optional[tuple]]:
+        """
+        The in-process half of get, which never blocks: (entry, None) on a
+        hit or when Redis cannot be asked, otherwise (None, pending) where
+        pending is the lookup to finish with read_through, off the event loop
+        in async code
+        """
+        key = self.key(start_lat, start_lon, end_lat, end_lon)
+
+        scalars = self.scalars.get(key)
+        # Scalar-only lookups leave the geometry tier and its counters alone
+        geometry = self.geometries.get(key) if need_geometry else None
+        if scalars is not None and (geometry is not None or not need_geometry):
+            return self._entry(scalars, geometry), None
+        if not self.shared_tier_available():
+            return None, None
+        return None, (key, scalars, geometry, need_geometry)
+
+    def read_through(self, pending: tuple) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Finish a lookup get_local could not answer from Redis, filling the local tiers"""
+        key, scalars, geometry, need_geometry = pending
+        client = self._client()
+        if client is None:
+            return None
+
+        try:
+            if scalars is None and need_geometry:
+                raw_scalars, raw_geometry = client.mget(key + ":d", key + ":g")
+            elif scalars is None:
+                raw_scalars, raw_geometry = client.get(key + ":d"), None
+            else:
+                raw_scalars, raw_geometry = None, client.get(key + ":g")
+        except Exception as e:
+            self._disable_redis(e)
+            return None
+
+        if raw_scalars is not None:
+            scalars = decode_scalars(raw_scalars)
+            self.scalars.set(key, scalars)
+        if raw_geometry is not None:
+            geometry = decode_geometry(raw_geometry)
+            self.geometries.set(key, geometry)
+
+        if scalars is None or (geometry is None and need_geometry):
+            return None
+        return self._entry(scalars, geometry)
+
+    def set(
+        self,
+        start_lat: float,
+        start_lon: float,
+        end_lat: float,
+        end_lon: float,
+        distance: float,
+        route_info: Dict[str, Any]
+    ):
+        """Store a leg in both tiers"""
+        self.set_many([(start_lat, start_lon, end_lat, end_lon, distance, route_info)])
+
+    def set_many(self, legs: Iterable[Tuple[float, float, float, float, float, Dict[str, Any]]]):
+        """
+        Store (start_lat, start_lon, end_lat, end_lon, distance, route_info)
+        legs in both tiers, with a single Redis pipeline for all of them
+        """
+        self.write_shared(self.set_local(legs))
+
+    def set_local(self, legs: Iterable[Tuple[float, float, float, float, float, Dict[str, Any]]]) -> List[tuple]:
+        """
+        The in-process half of set_many; returns the entries still to be
+        written to Redis with write_shared, or none if Redis cannot be asked
+        """
+        entries = []
+        for start_lat, start_lon, end_lat, end_lon, distance, route_info in legs:
+            key = self.key(start_lat, start_lon, end_lat, end_lon)
+            self.scalars.set(key, (distance, route_info["duration"]))
+            if route_info.get("geometry") is not None:
+                self.geometries.set(key, {"geometry": route_info["geometry"], "steps": route_info.get("steps")})
+            entries.append((key, distance, route_info))
+        return entries if self.shared_tier_available() else []
+
+    def write_shared(self, entries: List[tuple]):
+        """Write entries returned by set_local to Redis in one pipeline"""
+        if not entries:
+            return
+        client = self._client()
+        if client is None:
+            return
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, distance, route_info in entries:
+                pipe.set(key + ":d", encode_scalars(distance, route_info["duration"]), ex=self.ttl_seconds)
+                if route_info.get("geometry") is not None:
+                    pipe.set(key + ":g", encode_geometry(route_info), ex=self.geometry_ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            self._disable_redis(e)
+
+    def shared_tier_available(self) -> bool:
+        """Whether Redis is configured and not backed off after a failure"""
+        return self._redis is not None or (bool(self.redis_url) and time.monotonic() >= self._redis_retry_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters of the in-process tiers"""
+        return {"scalars": self.scalars.stats(), "geometries": self.geometries.stats()}
+
+    @staticmethod
+    def _entry(scalars: Tuple[float, float], geometry: Optional[Dict[str, Any]]) -> Tuple[float, Dict[str, Any]]:
+        distance, duration = scalars
+        route_info = {"geometry": None, "duration": duration, "steps": None}
+        if geometry is not None:
+            route_info.update(geometry)
+        return distance, route_info
+
+    def clear_local(self):
+        self.scalars.clear()
+        self.geometries.clear()
+
+    def _client(self):
+        """Lazily connect to Redis, backing off for a while after a failure"""
+        if self._redis is not None:
+            return self._redis
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+
+        try:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        except Exception as e:
+            self._disable_redis(e)
+        return self._redis
+
+    def _disable_redis(self, error: Exception):
+        logger.warning(f"Road distance cache falling back to local tier: {error}")
+        self._redis = None
+        self._redis_retry_at = time.monotonic() + 30
+
+
+road_distance_cache = RoadDistanceCache()
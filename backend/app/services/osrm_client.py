@@ -0,0 +1,298 @@
+import time
+import asyncio
+import weakref
+import threading
+import httpx
+import requests
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from requests.adapters import HTTPAdapter
+from app.core.config import settings
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from app.services.osrm_metrics import osrm_metrics
+from app.services.single_flight import single_flight
+
+
+class OSRMClient:
+    """
+    Thin OSRM HTTP client over a pooled, keep-alive requests.Session.
+
+    Reusing connections avoids a TCP (and TLS) handshake per call, which
+    dominates latency when the route search issues dozens of small requests.
+    Failed connections are retried with exponential backoff within the
+    call's timeout, which bounds the whole call rather than each attempt.
+    Responses, 429/5xx included, are never retried: every call passes
+    through the server's circuit breaker, which refuses calls while OSRM is
+    failing, and the caller's latency budget decides what happens next.
+    Identical concurrent calls, in this process or in other workers, are
+    coalesced into one request.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = None,
+        max_retries: int = None,
+        backoff_factor: float = None,
+        timeout: float = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout if timeout is not None else settings.OSRM_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else settings.OSRM_MAX_RETRIES
+        self.backoff_factor = backoff_factor if backoff_factor is not None else settings.OSRM_BACKOFF_FACTOR
+        self.breaker = get_circuit_breaker(self.base_url)
+
+        # No transport retries: _send retries failed connections within the call's timeout
+        pool_size = pool_size if pool_size is not None else settings.OSRM_POOL_SIZE
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def format_coordinates(coordinates: Sequence[Tuple[float, float]]) -> str:
+        """Format (latitude, longitude) pairs as OSRM's lon,lat;lon,lat path segment"""
+        return ";".join(f"{lon},{lat}" for lat, lon in coordinates)
+
+    @staticmethod
+    def server_failed(status_code: int) -> bool:
+        """Whether a response status means the server, not the query, is at fault"""
+        return status_code >= 500 or status_code == 429
+
+    @staticmethod
+    def timed_out(breaker: CircuitBreaker, elapsed: float):
+        """
+        Tell the breaker about a call that hit its timeout. One cut short by
+        the caller's latency budget before it could count as slow says
+        nothing about the server, so it is forgotten rather than failed.
+        """
+        if elapsed < breaker.slow_call_seconds:
+            breaker.cancel()
+        else:
+            breaker.record(False, elapsed)
+
+    @staticmethod
+    def retry_pause(attempt: int, backoff_factor: float, deadline: float, max_retries: int) -> Optional[float]:
+        """Seconds to wait before retrying a failed connection, or None when the call should give up"""
+        pause = backoff_factor * (2 ** attempt)
+        if attempt >= max_retries or time.monotonic() + pause >= deadline:
+            return None
+        return pause
+
+    def route(self, coordinates: Sequence[Tuple[float, float]], timeout: float = None, **params) -> Dict[str, Any]:
+        """Call the OSRM Route service for (latitude, longitude) waypoints"""
+        return self._get("route", coordinates, params, timeout)
+
+    def table(
+        self,
+        coordinates: Sequence[Tuple[float, float]],
+        sources: List[int] = None,
+        destinations: List[int] = None,
+        annotations: str = "distance",
+        timeout: float = None
+    ) -> Dict[str, Any]:
+        """Call the OSRM Table service for (latitude, longitude) points"""
+        params = {"annotations": annotations}
+        if sources is not None:
+            params["sources"] = ";".join(str(i) for i in sources)
+        if destinations is not None:
+            params["destinations"] = ";".join(str(i) for i in destinations)
+        return self._get("table", coordinates, params, timeout)
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, service: str, coordinates: Sequence[Tuple[float, float]], params: Dict[str, Any],
+             timeout: float = None) -> Dict[str, Any]:
+        url = f"{self.base_url}/{service}/v1/driving/{self.format_coordinates(coordinates)}"
+        key = single_flight.key(f"{self.base_url}/{service}", coordinates, params)
+        return single_flight.do(
+            key,
+            lambda remaining: self._fetch(service, url, params, remaining),
+            timeout if timeout is not None else self.timeout
+        )
+
+    def _fetch(self, service: str, url: str, params: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            osrm_metrics.record_rejected()
+            raise
+        started = time.monotonic()
+        try:
+            response = self._send(url, params, started + (timeout if timeout is not None else self.timeout))
+        except requests.Timeout:
+            self.timed_out(self.breaker, time.monotonic() - started)
+            osrm_metrics.record_call(service, time.monotonic() - started, False)
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            osrm_metrics.record_call(service, time.monotonic() - started, False)
+            raise
+        ok = not self.server_failed(response.status_code)
+        self.breaker.record(ok, time.monotonic() - started)
+        osrm_metrics.record_call(service, time.monotonic() - started, ok)
+        response.raise_for_status()
+        return response.json()
+
+    def _send(self, url: str, params: Dict[str, Any], deadline: float) -> requests.Response:
+        """GET url, retrying connections that fail before the deadline; each attempt gets the time left"""
+        attempt = 0
+        while True:
+            try:
+                return self.session.get(url, params=params, timeout=deadline - time.monotonic())
+            except requests.ConnectionError:
+                pause = self.retry_pause(attempt, self.backoff_factor, deadline, self.max_retries)
+                if pause is None:
+                    raise
+                time.sleep(pause)
+                attempt += 1
+
+
+class AsyncOSRMClient:
+    """
+    Asyncio counterpart of OSRMClient built on a pooled httpx.AsyncClient.
+
+    Calls never block the event loop, so a worker can keep many OSRM requests
+    in flight at once instead of parking one thread per call. It shares the
+    server's circuit breaker, request coalescing and retry rules with
+    OSRMClient.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = None,
+        max_retries: int = None,
+        backoff_factor: float = None,
+        timeout: float = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout if timeout is not None else settings.OSRM_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else settings.OSRM_MAX_RETRIES
+        self.backoff_factor = backoff_factor if backoff_factor is not None else settings.OSRM_BACKOFF_FACTOR
+        self.breaker = get_circuit_breaker(self.base_url)
+        pool_size = pool_size if pool_size is not None else settings.OSRM_POOL_SIZE
+
+        # No transport retries: _send retries failed connections within the call's timeout
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=self.timeout
+        )
+
+    async def route(self, coordinates: Sequence[Tuple[float, float]], timeout: float = None, **params) -> Dict[str, Any]:
+        """Call the OSRM Route service for (latitude, longitude) waypoints"""
+        return await self._get("route", coordinates, params, timeout)
+
+    async def table(
+        self,
+        coordinates: Sequence[Tuple[float, float]],
+        sources: List[int] = None,
+        destinations: List[int] = None,
+        annotations: str = "distance",
+        timeout: float = None
+    ) -> Dict[str, Any]:
+        """Call the OSRM Table service for (latitude, longitude) points"""
+        params = {"annotations": annotations}
+        if sources is not None:
+            params["sources"] = ";".join(str(i) for i in sources)
+        if destinations is not None:
+            params["destinations"] = ";".join(str(i) for i in destinations)
+        return await self._get("table", coordinates, params, timeout)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _get(self, service: str, coordinates: Sequence[Tuple[float, float]], params: Dict[str, Any],
+                   timeout: float = None) -> Dict[str, Any]:
+        url = f"{self.base_url}/{service}/v1/driving/{OSRMClient.format_coordinates(coordinates)}"
+        key = single_flight.key(f"{self.base_url}/{service}", coordinates, params)
+        return await single_flight.do_async(
+            key,
+            lambda remaining: self._fetch(service, url, params, remaining),
+            timeout if timeout is not None else self.timeout
+        )
+
+    async def _fetch(self, service: str, url: str, params: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            osrm_metrics.record_rejected()
+            raise
+        started = time.monotonic()
+        try:
+            response = await self._send(url, params, started + (timeout if timeout is not None else self.timeout))
+        except asyncio.CancelledError:
+            # Says nothing about OSRM, but a half-open probe slot must be handed back
+            self.breaker.cancel()
+            raise
+        except httpx.TimeoutException:
+            OSRMClient.timed_out(self.breaker, time.monotonic() - started)
+            osrm_metrics.record_call(service, time.monotonic() - started, False)
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            osrm_metrics.record_call(service, time.monotonic() - started, False)
+            raise
+        ok = not OSRMClient.server_failed(response.status_code)
+        self.breaker.record(ok, time.monotonic() - started)
+        osrm_metrics.record_call(service, time.monotonic() - started, ok)
+        response.raise_for_status()
+        return response.json()
+
+    async def _send(self, url: str, params: Dict[str, Any], deadline: float) -> httpx.Response:
+        """GET url, retrying connections that fail before the deadline; each attempt gets the time left"""
+        attempt = 0
+        while True:
+            try:
+                return await self.client.get(url, params=params, timeout=deadline - time.monotonic())
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                pause = OSRMClient.retry_pause(attempt, self.backoff_factor, deadline, self.max_retries)
+                if pause is None:
+                    raise
+                await asyncio.sleep(pause)
+                attempt += 1
+
+
+_clients: Dict[str, OSRMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_osrm_client(base_url: str = None) -> OSRMClient:
+    """Return the process-wide pooled client for an OSRM server"""
+    base_url = base_url or settings.OSRM_SERVER_URL
+
+    client = _clients.get(base_url)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(base_url)
+            if client is None:
+                client = _clients[base_url] = OSRMClient(base_url)
+    return client
+
+
+# httpx connections belong to the loop that opened them, so clients are kept
+# per loop object; a closed loop's entry goes away with the loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncOSRMClient]]" = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+
+def get_async_osrm_client(base_url: str = None) -> AsyncOSRMClient:
+    """Return the pooled async client for an OSRM server on the running event loop"""
+    base_url = base_url or settings.OSRM_SERVER_URL
+    loop = asyncio.get_running_loop()
+
+    with _async_clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(base_url)
+        if client is None:
+            client = clients[base_url] = AsyncOSRMClient(base_url)
+    return client
+
+
+async def close_async_osrm_clients():
+    """Close the async clients of the running event loop, for application shutdown"""
+    with _async_clients_lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
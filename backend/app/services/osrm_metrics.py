@@ -0,0 +1,235 @@
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last one catches everything
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+OSRM_SERVICES = ("route", "table")
+
+
+class LatencyHistogram:
+    """Latency histogram in milliseconds, exported with cumulative buckets like Prometheus"""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, milliseconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+        self.count += 1
+        self.sum_ms += milliseconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets, total = {}, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            total += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = total
+        return {"count": self.count, "sum_ms": round(self.sum_ms, 3), "buckets": buckets}
+
+
+class OSRMUsage:
+    """
+    OSRM calls, their latency by service, road distance cache lookups,
+    fallbacks and search effort, either of one API request or of the
+    whole process
+    """
+
+    def __init__(self):
+        self.calls = {service: 0 for service in OSRM_SERVICES}
+        self.failures = {service: 0 for service in OSRM_SERVICES}
+        self.latency = {service: LatencyHistogram() for service in OSRM_SERVICES}
+        self.rejected = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.fallbacks: Dict[str, int] = {}
+        self.searches = 0
+        self.nodes_expanded = 0
+        self._lock = threading.Lock()
+
+    def record_call(self, service: str, elapsed: float, ok: bool):
+        with self._lock:
+            self.calls[service] = self.calls.get(service, 0) + 1
+            if not ok:
+                self.failures[service] = self.failures.get(service, 0) + 1
+            self.latency.setdefault(service, LatencyHistogram()).observe(elapsed * 1000)
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def record_cache(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_fallback(self, kind: str):
+        with self._lock:
+            self.fallbacks[kind] = self.fallbacks.get(kind, 0) + 1
+
+    def record_search(self, nodes_expanded: int):
+        with self._lock:
+            self.searches += 1
+            self.nodes_expanded += nodes_expanded
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else None
+
+    @property
+    def active(self) -> bool:
+        """Whether anything OSRM related happened at all"""
+        return bool(
+            sum(self.calls.values()) or self.rejected or self.coalesced or
+            self.cache_hits or self.cache_misses or self.fallbacks or self.searches
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            ratio = self.cache_hit_ratio
+            return {
+                "osrm_calls": dict(self.calls),
+                "osrm_failures": dict(self.failures),
+                "osrm_latency_ms": {service: histogram.to_dict() for service, histogram in self.latency.items()},
+                "circuit_rejections": self.rejected,
+                "coalesced": self.coalesced,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_hit_ratio": round(ratio, 4) if ratio is not None else None,
+                "fallbacks": dict(self.fallbacks),
+                "searches": self.searches,
+                "nodes_expanded": self.nodes_expanded
+            }
+
+    def header_value(self) -> str:
+        """Compact one-line summary for the X-OSRM-Metrics debug header"""
+        with self._lock:
+            parts = [
+                f"{service}={self.calls[service]};{service}_ms={self.latency[service].sum_ms:.1f}"
+                for service in OSRM_SERVICES
+            ]
+            ratio = self.cache_hit_ratio
+            parts.append(f"cache_hit_ratio={ratio:.2f}" if ratio is not None else "cache_hit_ratio=-")
+            parts.append(f"fallbacks={sum(self.fallbacks.values())}")
+            parts.append(f"coalesced={self.coalesced}")
+            parts.append(f"nodes_expanded={self.nodes_expanded}")
+            return ", ".join(parts)
+
+
+class OSRMMetrics:
+    """
+    Process-wide OSRM instrumentation.
+
+    The optimizer, the OSRM clients and request coalescing report through
+    the record_* methods. Every report goes into the process totals and,
+    while an API request is being served, into that request's own usage,
+    which is carried in a context variable so it follows the request into
+    worker threads and tasks. Finished requests that used OSRM are added to
+    per-endpoint latency histograms, and the slowest are kept with their
+    usage so slow routes can be explained.
+    """
+
+    def __init__(self, slow_request_seconds: float = None, slow_requests_kept: int = None):
+        self.slow_request_seconds = (
+            slow_request_seconds if slow_request_seconds is not None else settings.OSRM_SLOW_REQUEST_SECONDS
+        )
+        self.totals = OSRMUsage()
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self.slow_requests = deque(
+            maxlen=slow_requests_kept if slow_requests_kept is not None else settings.OSRM_SLOW_REQUESTS_KEPT
+        )
+        self._current: ContextVar[Optional[OSRMUsage]] = ContextVar("osrm_usage", default=None)
+        self._lock = threading.Lock()
+
+    def start_request(self) -> Tuple[OSRMUsage, Any]:
+        """Begin collecting the usage of the request being served; returns it and a reset token"""
+        usage = OSRMUsage()
+        return usage, self._current.set(usage)
+
+    def finish_request(self, token: Any, usage: OSRMUsage, endpoint: str, elapsed: float, status_code: int = None):
+        """Stop collecting for a request and fold it into the endpoint statistics"""
+        self._current.reset(token)
+        if not usage.active:
+            return
+
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {"requests": 0, "osrm_calls": 0, "latency": LatencyHistogram()}
+            stats["requests"] += 1
+            stats["osrm_calls"] += sum(usage.calls.values())
+            stats["latency"].observe(elapsed * 1000)
+
+        if elapsed >= self.slow_request_seconds:
+            details = usage.to_dict()
+            logger.warning(f"Slow request {endpoint} took {elapsed:.2f}s: {usage.header_value()}")
+            with self._lock:
+                self.slow_requests.append({
+                    "endpoint": endpoint,
+                    "status_code": status_code,
+                    "seconds": round(elapsed, 3),
+                    "finished_at": time.time(),
+                    "usage": details
+                })
+
+    def current(self) -> Optional[OSRMUsage]:
+        return self._current.get()
+
+    def _targets(self):
+        usage = self._current.get()
+        return (self.totals, usage) if usage is not None else (self.totals,)
+
+    def record_call(self, service: str, elapsed: float, ok: bool):
+        for usage in self._targets():
+            usage.record_call(service, elapsed, ok)
+
+    def record_rejected(self):
+        for usage in self._targets():
+            usage.record_rejected()
+
+    def record_coalesced(self):
+        for usage in self._targets():
+            usage.record_coalesced()
+
+    def record_cache(self, hit: bool):
+        for usage in self._targets():
+            usage.record_cache(hit)
+
+    def record_fallback(self, kind: str):
+        for usage in self._targets():
+            usage.record_fallback(kind)
+
+    def record_search(self, nodes_expanded: int):
+        for usage in self._targets():
+            usage.record_search(nodes_expanded)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    "requests": stats["requests"],
+                    "osrm_calls": stats["osrm_calls"],
+                    "latency_ms": stats["latency"].to_dict()
+                }
+                for endpoint, stats in self.endpoints.items()
+            }
+            slow_requests = list(self.slow_requests)
+        return {"totals": self.totals.to_dict(), "endpoints": endpoints, "slow_requests": slow_requests}
+
+
+osrm_metrics = OSRMMetrics()
@@ -0,0 +1,211 @@
+import json
+import math
+import time
+import bisect
+import logging
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Sequence, Tuple
+from app.core.config import settings
+from app.models.stations import Station
+from app.services.station_index import _haversine_km
+
+logger = logging.getLogger(__name__)
+
+ROAD_ESTIMATOR_KEY = "osrm:estimator"
+
+# Upper edges (km of great-circle distance) of the calibration distance bands;
+# a last open-ended band follows
+DISTANCE_BANDS_KM = (5, 20, 50, 150)
+
+# Used until a band has been calibrated with enough samples
+DEFAULT_DETOUR_FACTOR = 1.3
+DEFAULT_MINUTES_PER_KM = 1.2
+
+# (samples, median detour factor, pruning detour factor, median minutes per road km)
+Calibration = Tuple[int, float, float, float]
+
+
+def _band(distance_km: float) -> int:
+    return bisect.bisect_left(DISTANCE_BANDS_KM, distance_km)
+
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+def calibrate(
+    samples: Iterable[Tuple[float, float, float, float, float, float]],
+    region_degrees: float,
+    min_samples: int,
+    prune_quantile: float
+) -> Dict[str, Calibration]:
+    """
+    Detour-factor calibration from measured legs of
+    (start_lat, start_lon, end_lat, end_lon, road_km, minutes).
+
+    Buckets are keyed "lat_cell:lon_cell:band" by the region of the leg's
+    start and its great-circle distance band, plus "*:band" across all
+    regions. Buckets with fewer than min_samples legs are left out.
+    """
+    groups: Dict[str, List[Tuple[float, float]]] = {}
+    for start_lat, start_lon, end_lat, end_lon, road_km, minutes in samples:
+        direct_km = _haversine(start_lat, start_lon, end_lat, end_lon)
+        # Grid snapping makes very short legs too noisy to learn from
+        if direct_km < 0.5 or road_km <= 0:
+            continue
+
+        band = _band(direct_km)
+        region = f"{math.floor(start_lat / region_degrees)}:{math.floor(start_lon / region_degrees)}"
+        sample = (road_km / direct_km, minutes / road_km)
+        groups.setdefault(f"{region}:{band}", []).append(sample)
+        groups.setdefault(f"*:{band}", []).append(sample)
+
+    table = {}
+    for key, group in groups.items():
+        if len(group) < min_samples:
+            continue
+        ratios, paces = np.array(group).T
+        table[key] = (
+            len(group),
+            float(np.median(ratios)),
+            # Road distance is never shorter than great-circle distance
+            max(1.0, float(np.quantile(ratios, prune_quantile))),
+            float(np.median(paces))
+        )
+    return table
+
+
+class RoadDistanceEstimator:
+    """
+    Microsecond road distance and duration estimates from great-circle distance.
+
+    A detour factor (road km per great-circle km) and a pace (minutes per
+    road km) are calibrated per region and distance band from the legs OSRM
+    has already measured, by the calibrate_road_estimator Celery task, and
+    published in Redis. Each worker reloads the table in the background at
+    most every ROAD_ESTIMATOR_REFRESH_SECONDS and falls back to the all-region band, then
+    to fixed defaults, where a bucket has too few samples.
+
+    Estimates use the median detour factor. Pruning is lossless by default:
+    road distance is never shorter than great-circle distance, so only
+    stations whose great-circle distance already exceeds the range are
+    dropped. With lossy_pruning (ROAD_ESTIMATOR_LOSSY_PRUNING) a low
+    quantile of the detour factor is used instead, which drops more
+    stations but can drop some that are in range.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = None,
+        refresh_seconds: float = None,
+        region_degrees: float = None,
+        lossy_pruning: bool = None
+    ):
+        self.redis_url = redis_url if redis_url is not None else settings.REDIS_URL
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else settings.ROAD_ESTIMATOR_REFRESH_SECONDS
+        )
+        self.region_degrees = region_degrees if region_degrees is not None else settings.ROAD_ESTIMATOR_REGION_DEGREES
+        self.lossy_pruning = lossy_pruning if lossy_pruning is not None else settings.ROAD_ESTIMATOR_LOSSY_PRUNING
+        self._table: Dict[str, Calibration] = {}
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self._client = None
+
+    def estimate(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Tuple[float, float]:
+        """Estimated (road distance km, duration minutes) of a leg"""
+        direct_km = _haversine(start_lat, start_lon, end_lat, end_lon)
+        _, detour, _, pace = self._calibration(start_lat, start_lon, _band(direct_km))
+        distance = direct_km * detour
+        return distance, distance * pace
+
+    def reachable(
+        self,
+        lat: float,
+        lon: float,
+        stations: Sequence[Station],
+        max_range: float
+    ) -> List[Station]:
+        """Stations whose road distance from (lat, lon) can be within max_range"""
+        if not stations:
+            return []
+
+        coords = np.radians(np.array([[s.latitude, s.longitude] for s in stations]))
+        keep = self.reachable_mask(lat, lon, coords, max_range)
+        return [station for station, kept in zip(stations, keep) if kept]
+
+    def reachable_mask(self, lat: float, lon: float, coords: np.ndarray, max_range: float) -> np.ndarray:
+        """Which (lat, lon) radian points can be within max_range road km of (lat, lon)"""
+        if not len(coords):
+            return np.zeros(0, dtype=bool)
+
+        direct_km = _haversine_km(lat, lon, coords)
+        if not self.lossy_pruning:
+            return direct_km <= max_range
+
+        bands = np.searchsorted(DISTANCE_BANDS_KM, direct_km, side="left")
+        factors = np.array([
+            self._calibration(lat, lon, band)[2] for band in range(len(DISTANCE_BANDS_KM) + 1)
+        ])
+        return direct_km * factors[bands] <= max_range
+
+    def _calibration(self, lat: float, lon: float, band: int) -> Calibration:
+        table = self._current()
+        region = f"{math.floor(lat / self.region_degrees)}:{math.floor(lon / self.region_degrees)}"
+        return (
+            table.get(f"{region}:{band}")
+            or table.get(f"*:{band}")
+            or (0, DEFAULT_DETOUR_FACTOR, 1.0, DEFAULT_MINUTES_PER_KM)
+        )
+
+    def _current(self) -> Dict[str, Calibration]:
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self._table
+
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.refresh_seconds:
+                self._checked_at = time.monotonic()
+                # Lookups run on the request path, often on the event loop, so
+                # the table is reloaded in the background and the current one
+                # keeps answering meanwhile
+                threading.Thread(target=self._refresh, name="road-estimator-refresh", daemon=True).start()
+        return self._table
+
+    def save(self, table: Dict[str, Calibration]):
+        """Publish a calibration table for every worker"""
+        self._redis().set(ROAD_ESTIMATOR_KEY, json.dumps({
+            "region_degrees": self.region_degrees,
+            "buckets": table
+        }))
+
+    def use(self, table: Dict[str, Calibration]):
+        """Adopt a calibration table in this process"""
+        self._table = {key: tuple(value) for key, value in table.items()}
+
+    def _refresh(self):
+        if not self.redis_url:
+            return
+        try:
+            value = self._redis().get(ROAD_ESTIMATOR_KEY)
+            if value is None:
+                return
+            data = json.loads(value)
+            # A table calibrated on a different grid cannot be looked up
+            if data.get("region_degrees") == self.region_degrees:
+                self.use(data["buckets"])
+        except Exception as e:
+            logger.warning(f"Could not refresh the road distance estimator: {e}")
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.redis_url, socket_timeout=2, socket_connect_timeout=0.5)
+        return self._client
+
+
+road_distance_estimator = RoadDistanceEstimator()
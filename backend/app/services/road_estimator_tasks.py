@@ -0,0 +1,47 @@
+from app.celery_app import celery_app
+from app.services.distance_cache import decode_scalars, road_distance_cache
+from app.services.road_estimator import calibrate, road_distance_estimator
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _cached_legs(client, limit: int):
+    """
+    (start_lat, start_lon, end_lat, end_lon, road_km, minutes) of up to
+    limit legs in the Redis road distance cache
+    """
+    grid = road_distance_cache.grid_degrees
+    keys = []
+    for key in client.scan_iter(match="osrm:route:*:d", count=1000):
+        keys.append(key)
+        if len(keys) >= limit:
+            break
+
+    for i in range(0, len(keys), 1000):
+        chunk = keys[i:i + 1000]
+        for key, value in zip(chunk, client.mget(chunk)):
+            if value is None:
+                continue
+            # osrm:route:<start lat>:<start lon>:<end lat>:<end lon>:d in grid cells
+            cells = key.decode().split(":")[2:6]
+            distance, duration = decode_scalars(value)
+            yield (*(int(cell) * grid for cell in cells), distance, duration)
+
+
+@celery_app.task
+def calibrate_road_estimator():
+    """Recalibrate the road distance estimator from the legs OSRM has measured so far"""
+    client = road_distance_estimator._redis()
+    table = calibrate(
+        _cached_legs(client, settings.ROAD_ESTIMATOR_MAX_SAMPLES),
+        region_degrees=road_distance_estimator.region_degrees,
+        min_samples=settings.ROAD_ESTIMATOR_MIN_SAMPLES,
+        prune_quantile=settings.ROAD_ESTIMATOR_PRUNE_QUANTILE
+    )
+    road_distance_estimator.save(table)
+
+    samples = sum(count for key, (count, *_) in table.items() if key.startswith("*:"))
+    logger.info(f"Calibrated road distance estimator with {len(table)} buckets from {samples} legs")
+    return {"status": "success", "buckets": len(table), "samples": samples}
@@ -0,0 +1,123 @@
+import time
+import logging
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.services.distance_cache import METERS_PER_DEGREE
+from app.utils.lru_cache import BoundedLRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class RouteResultCache:
+    """
+    Two-tier cache of finished /routes/optimize responses.
+
+    Entries are the serialized RouteResponse JSON, less the endpoints and
+    search statistics of the request that searched it, keyed on the start
+    and end coordinates snapped to a grid of ROUTE_CACHE_GRID_METERS, the
+    battery range, the search algorithm, the response format options and
+    the station catalog version. Any station or availability change bumps
+    the catalog version, so stale routes are never looked up again and
+    simply age out of both tiers.
+
+    The in-process LRU answers repeat trips without touching Redis or
+    re-validating the payload against the response model; Redis shares the
+    routes between workers.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = None,
+        ttl_seconds: int = None,
+        grid_meters: float = None,
+        budget_bytes: int = None
+    ):
+        self.redis_url = redis_url if redis_url is not None else settings.REDIS_URL
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.ROUTE_CACHE_TTL_SECONDS
+        self.grid_degrees = (grid_meters if grid_meters is not None else settings.ROUTE_CACHE_GRID_METERS) / METERS_PER_DEGREE
+
+        self.routes = BoundedLRUCache(
+            max_bytes=budget_bytes if budget_bytes is not None else settings.ROUTE_CACHE_BUDGET_BYTES,
+            ttl_seconds=self.ttl_seconds,
+            sizeof=lambda value: 128 + len(value)
+        )
+        self._redis = None
+        self._redis_retry_at = 0.0
+
+    def key(
+        self,
+        start_lat: float,
+        start_lon: float,
+        end_lat: float,
+        end_lon: float,
+        battery_range: float,
+        algorithm: str,
+        catalog_version: int,
+        variant: str = ""
+    ) -> str:
+        cells = ":".join(
+            str(round(coord / self.grid_degrees))
+            for coord in (start_lat, start_lon, end_lat, end_lon)
+        )
+        return f"route:v{catalog_version}:{cells}:{battery_range:g}:{algorithm}:{variant}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached response body, or None on a miss"""
+        value = self.routes.get(key)
+        if value is not None:
+            return value
+
+        client = self._client()
+        if client is None:
+            return None
+
+        try:
+            value = client.get(key)
+        except Exception as e:
+            self._disable_redis(e)
+            return None
+
+        if value is not None:
+            self.routes.set(key, value)
+        return value
+
+    def set(self, key: str, value: bytes):
+        """Store a response body in both tiers"""
+        self.routes.set(key, value)
+
+        client = self._client()
+        if client is None:
+            return
+
+        try:
+            client.set(key, value, ex=self.ttl_seconds)
+        except Exception as e:
+            self._disable_redis(e)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.routes.stats()
+
+    def clear_local(self):
+        self.routes.clear()
+
+    def _client(self):
+        """Lazily connect to Redis, backing off for a while after a failure"""
+        if self._redis is not None:
+            return self._redis
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+
+        try:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        except Exception as e:
+            self._disable_redis(e)
+        return self._redis
+
+    def _disable_redis(self, error: Exception):
+        logger.warning(f"Route cache falling back to local tier: {error}")
+        self._redis = None
+        self._redis_retry_at = time.monotonic() + 30
+
+
+route_result_cache = RouteResultCache()
@@ -1,13 +1,55 @@
 import math
+import time
 import heapq
-import requests
+import itertools
 import numpy as np
-from typing import List, Tuple, Dict, Any
-from sklearn.neighbors import BallTree
+from typing import Generator, List, Optional, Tuple, Dict, Any, Sequence, Union
+from app.core.config import settings
 from app.models.stations import Station
+from app.services.station_index import StationSnapshot
+from app.services.distance_cache import RoadDistanceCache, road_distance_cache
+from app.services.osrm_client import OSRMClient, get_osrm_client
+from app.services.circuit_breaker import get_circuit_breaker
+from app.services.osrm_metrics import osrm_metrics
+from app.services.road_estimator import RoadDistanceEstimator, road_distance_estimator
+from app.services.station_graph import TABLE_MAX_COORDINATES, StationGraph
+from app.services.route_plan import Leg, RoutePlan
 
 class OSRMRouteOptimizer:
-    def __init__(self, stations: List[Station], battery_range: float, osrm_server: str = None):
+    # Route search strategies accepted by dijkstra_route
+    SEARCH_ALGORITHMS = ("dijkstra", "astar", "bidirectional")
+
+    # Query parameters for OSRM Route calls that need the full leg geometry
+    ROUTE_PARAMS = {
+        "overview": "full",
+        "geometries": "geojson",
+        "steps": "false"
+    }
+    # Query parameters for OSRM Route calls that need turn-by-turn steps as well
+    STEP_ROUTE_PARAMS = {
+        "overview": "full",
+        "geometries": "geojson",
+        "steps": "true"
+    }
+    # Query parameters for OSRM Route calls that only need distance and duration
+    SCALAR_ROUTE_PARAMS = {
+        "overview": "false",
+        "steps": "false"
+    }
+
+    def __init__(
+        self,
+        stations: List[Station],
+        battery_range: float,
+        osrm_server: str = None,
+        snapshot: StationSnapshot = None,
+        distance_cache: RoadDistanceCache = None,
+        osrm_client: OSRMClient = None,
+        station_graph: StationGraph = None,
+        road_estimator: RoadDistanceEstimator = None,
+        include_steps: bool = False,
+        latency_budget: float = None
+    ):
         """
         Initialize the route optimizer using OSRM for real-world routing
         
@@ -15,46 +57,96 @@ class OSRMRouteOptimizer:
             stations: List of SQLAlchemy Station models
             battery_range: Maximum vehicle range in kilometers
             osrm_server: OSRM API endpoint (defaults to public server)
+            snapshot: Prebuilt StationSnapshot to borrow instead of indexing stations
+            distance_cache: Road distance cache (defaults to the shared Redis-backed cache)
+            osrm_client: OSRM client (defaults to the shared pooled client for osrm_server)
+            station_graph: Precomputed station-to-station road graph; when it covers
+                battery_range, station expansions are answered from it instead of OSRM
+            road_estimator: Calibrated road distance estimator used to prune
+                candidates and to estimate legs OSRM cannot answer
+            include_steps: Fetch turn-by-turn steps along with leg geometries
+            latency_budget: Seconds this optimizer may spend on OSRM calls
+                (defaults to OSRM_REQUEST_BUDGET_SECONDS, 0 for no limit);
+                once spent, remaining legs are estimated instead
         """
-        self.stations = stations
         self.battery_range = battery_range
         self.osrm_server = osrm_server or "http://router.project-osrm.org"
+        self.osrm_client = osrm_client if osrm_client is not None else get_osrm_client(self.osrm_server)
         
-        # Create a dictionary of station coordinates for quick lookup
-        self.station_coords = {
-            station: (station.latitude, station.longitude) 
-            for station in stations
-        }
+        # Road distances are shared across requests and workers to avoid repeated API calls
+        self.distance_cache = distance_cache if distance_cache is not None else road_distance_cache
+        self.station_graph = station_graph
+        self.include_steps = include_steps
+        self.road_estimator = road_estimator if road_estimator is not None else road_distance_estimator
         
-        # Pre-compute distances between nearby stations to avoid repeated API calls
-        self.distance_cache = {}
+        # OSRM is skipped while its circuit breaker is open or once this
+        # optimizer's latency budget is spent
+        self.osrm_breaker = get_circuit_breaker(self.osrm_server.rstrip("/"))
+        budget = latency_budget if latency_budget is not None else settings.OSRM_REQUEST_BUDGET_SECONDS
+        self.deadline = time.monotonic() + budget if budget else None
         
-        # Build spatial index for quick lookup
-        self._build_spatial_index()
+        # Number of OSRM requests issued and of legs estimated instead, and
+        # counters of the last route search
+        self.osrm_calls = 0
+        self.estimated_legs = 0
+        self.search_stats: Dict[str, Any] = {}
+        
+        # Frontier stations whose neighbours are measured together in one Table call
+        self.frontier_batch_size = settings.ROUTE_FRONTIER_BATCH_SIZE
+        
+        if snapshot is not None:
+            # Borrow the shared, already indexed snapshot
+            self._use_snapshot(snapshot)
+        else:
+            self.stations = stations
+            self._build_spatial_index()
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: StationSnapshot,
+        battery_range: float,
+        osrm_server: str = None,
+        distance_cache: RoadDistanceCache = None,
+        osrm_client: OSRMClient = None,
+        station_graph: StationGraph = None,
+        road_estimator: RoadDistanceEstimator = None,
+        include_steps: bool = False,
+        latency_budget: float = None
+    ) -> "OSRMRouteOptimizer":
+        """Create an optimizer over a shared StationSnapshot without rebuilding any index"""
+        return cls(
+            stations=snapshot.stations,
+            battery_range=battery_range,
+            osrm_server=osrm_server,
+            snapshot=snapshot,
+            distance_cache=distance_cache,
+            osrm_client=osrm_client,
+            station_graph=station_graph,
+            road_estimator=road_estimator,
+            include_steps=include_steps,
+            latency_budget=latency_budget
+        )
+
+    def _use_snapshot(self, snapshot: StationSnapshot):
+        """Point the optimizer at the stations and indexes of a snapshot"""
+        self.snapshot = snapshot
+        self.stations = snapshot.stations
+        self.available_stations = snapshot.available_stations
+        self.station_coords_array = snapshot.station_coords_array
+        self.spatial_index = snapshot.spatial_index
     
     def _build_spatial_index(self):
         """Build a spatial index for quick station lookups"""
-        self.available_stations = [s for s in self.stations if s.is_available]
-        
-        if not self.available_stations:
-            self.station_coords_array = np.array([])
-            self.spatial_index = None
-            return
-            
-        # Store coordinates in radians for the BallTree
-        self.station_coords_array = np.radians(
-            np.array([[s.latitude, s.longitude] for s in self.available_stations])
-        )
-        
-        # Create a BallTree for efficient nearest neighbor queries
-        self.spatial_index = BallTree(self.station_coords_array, metric='haversine')
+        self._use_snapshot(StationSnapshot(self.stations))
         
     def refresh_spatial_index(self):
         """Refresh the spatial index if stations have changed"""
         self._build_spatial_index()
     
     def get_road_distance(self, start_lat: float, start_lon: float, 
-                          end_lat: float, end_lon: float) -> Tuple[float, Dict[str, Any]]:
+                          end_lat: float, end_lon: float,
+                          need_geometry: bool = True) -> Tuple[float, Dict[str, Any]]:
         """
         Calculate the real road distance between two points using OSRM API
         
@@ -63,58 +155,142 @@ class OSRMRouteOptimizer:
             start_lon: Starting point longitude
             end_lat: Ending point latitude
             end_lon: Ending point longitude
+            need_geometry: Fetch the leg geometry too; otherwise it can be loaded
+                later with load_geometry
             
         Returns:
             Tuple containing distance in kilometers and route details
         """
         # Check cache first
-        cache_key = (start_lat, start_lon, end_lat, end_lon)
-        if cache_key in self.distance_cache:
-            return self.distance_cache[cache_key]
+        cached = self._cached_leg(start_lat, start_lon, end_lat, end_lon, need_geometry)
+        if cached is not None:
+            return self._mark_leg(cached, start_lat, start_lon, end_lat, end_lon)
 
-        # If OSRM server is disabled or not set, fallback immediately
-        if not self.osrm_server or self.osrm_server.strip() == "":
-            distance = self.haversine_distance(start_lat, start_lon, end_lat, end_lon)
-            route_info = {"geometry": None, "duration": distance * 1.5}  # Rough estimate
-            return distance, route_info
-        
-        # Format the API request URL
-        url = f"{self.osrm_server}/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}"
-        params = {
-            "overview": "full", 
-            "geometries": "geojson",
-            "steps": "true"
-        }
+        # If OSRM is disabled, failing or out of budget, fallback immediately
+        if not self._osrm_available():
+            return self._fallback_distance(start_lat, start_lon, end_lat, end_lon)
         
         try:
-            response = requests.get(url, params=params, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get("code") != "Ok":
-                # Fallback to haversine if OSRM fails
-                distance = self.haversine_distance(start_lat, start_lon, end_lat, end_lon)
-                route_info = {"geometry": None, "duration": distance * 1.5}  # Rough estimate
-                return distance, route_info
-            
-            # Distance is returned in meters, convert to kilometers
-            distance = data["routes"][0]["distance"] / 1000
-            route_info = {
-                "geometry": data["routes"][0]["geometry"],
-                "duration": data["routes"][0]["duration"] / 60,  # Convert to minutes
-                "steps": data["routes"][0]["legs"][0]["steps"]
-            }
-            
-            # Cache the result to avoid repeated API calls
-            self.distance_cache[cache_key] = (distance, route_info)
-            return distance, route_info
+            data = self.osrm_client.route(
+                [(start_lat, start_lon), (end_lat, end_lon)],
+                timeout=self._osrm_timeout(),
+                **self._route_params(need_geometry)
+            )
+            return self._handle_route_response(data, start_lat, start_lon, end_lat, end_lon)
             
         except Exception as e:
-            # Fallback to haversine if API call fails
-            print(f"OSRM API error: {e}. Falling back to haversine distance.")
-            distance = self.haversine_distance(start_lat, start_lon, end_lat, end_lon)
-            route_info = {"geometry": None, "duration": distance * 1.5}  # Rough estimate
-            return distance, route_info
+            # Fall back to the estimator if the API call fails
+            print(f"OSRM API error: {e}. Falling back to estimated road distance.")
+            return self._fallback_distance(start_lat, start_lon, end_lat, end_lon)
+
+    def _osrm_available(self) -> bool:
+        """Whether OSRM is configured, within this optimizer's latency budget and not short-circuited"""
+        if not self.osrm_server or self.osrm_server.strip() == "":
+            return False
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return False
+        return self.osrm_breaker.allows_calls()
+
+    def _osrm_timeout(self) -> Optional[float]:
+        """
+        Count an OSRM call and cap its timeout at what is left of the latency
+        budget. The clients do not hold a cut-off shorter than the breaker's
+        slow-call threshold against the server.
+        """
+        if self.deadline is None:
+            self.osrm_calls += 1
+            return None
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("OSRM latency budget spent")
+        self.osrm_calls += 1
+        return min(remaining, settings.OSRM_TIMEOUT_SECONDS)
+
+    def _route_params(self, need_geometry: bool = True) -> Dict[str, str]:
+        if not need_geometry:
+            return self.SCALAR_ROUTE_PARAMS
+        return self.STEP_ROUTE_PARAMS if self.include_steps else self.ROUTE_PARAMS
+
+    def _cached_leg(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                    need_geometry: bool = True) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """A cached leg, unless it lacks the steps this optimizer was asked for"""
+        cached = self.distance_cache.get(start_lat, start_lon, end_lat, end_lon, need_geometry=need_geometry)
+        return self._usable_leg(cached, need_geometry)
+
+    def _usable_leg(self, cached: Optional[Tuple[float, Dict[str, Any]]],
+                    need_geometry: bool = True) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Drop a cached leg that lacks the steps this optimizer was asked for, and count the lookup"""
+        if cached is not None and need_geometry and self.include_steps and cached[1].get("steps") is None:
+            cached = None
+        osrm_metrics.record_cache(cached is not None)
+        return cached
+
+    def _store_legs(self, writes: List[tuple]):
+        """Cache (start_lat, start_lon, end_lat, end_lon, distance, route_info) legs in one go"""
+        self.distance_cache.set_many(writes)
+
+    @staticmethod
+    def _mark_leg(leg: Tuple[float, Dict[str, Any]], start_lat: float, start_lon: float,
+                  end_lat: float, end_lon: float) -> Tuple[float, Dict[str, Any]]:
+        """Remember a leg's endpoints and distance in its route_info so it can be reused later"""
+        distance, route_info = leg
+        route_info["from"] = (start_lat, start_lon)
+        route_info["to"] = (end_lat, end_lon)
+        route_info["distance"] = distance
+        return distance, route_info
+
+    def _fallback_distance(self, start_lat: float, start_lon: float,
+                           end_lat: float, end_lon: float) -> Tuple[float, Dict[str, Any]]:
+        """Estimate a leg with the calibrated road distance estimator when OSRM cannot answer"""
+        self.estimated_legs += 1
+        osrm_metrics.record_fallback("estimated_leg")
+        distance, duration = self.road_estimator.estimate(start_lat, start_lon, end_lat, end_lon)
+        route_info = {"geometry": None, "duration": duration, "steps": None, "distance": distance, "estimated": True}
+        return distance, route_info
+
+    def _handle_route_response(self, data: Dict[str, Any], start_lat: float, start_lon: float,
+                               end_lat: float, end_lon: float) -> Tuple[float, Dict[str, Any]]:
+        """Turn an OSRM Route response into (distance, route_info) and cache it"""
+        leg = self._route_leg(data)
+        if leg is None:
+            # Fall back to the estimator if OSRM fails
+            return self._fallback_distance(start_lat, start_lon, end_lat, end_lon)
+        
+        # Cache the result to avoid repeated API calls
+        self._store_legs([(start_lat, start_lon, end_lat, end_lon, *leg)])
+        return self._mark_leg(leg, start_lat, start_lon, end_lat, end_lon)
+
+    @staticmethod
+    def _route_leg(data: Dict[str, Any]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """(distance, route_info) of a single-leg OSRM Route response, or None if OSRM failed"""
+        if data.get("code") != "Ok":
+            return None
+
+        # Distance is returned in meters, convert to kilometers
+        route = data["routes"][0]
+        distance = route["distance"] / 1000
+        route_info = {
+            "geometry": route.get("geometry"),
+            "duration": route["duration"] / 60,  # Convert to minutes
+            "steps": route["legs"][0].get("steps") or None
+        }
+        return distance, route_info
+
+    def load_geometry(self, route_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill in the geometry of a leg that was measured without it"""
+        if route_info is None or route_info.get("geometry") is not None or "from" not in route_info:
+            return route_info
+
+        _, full_info = self.get_road_distance(*route_info["from"], *route_info["to"])
+        route_info["geometry"] = full_info.get("geometry")
+        route_info["steps"] = full_info.get("steps")
+        return route_info
+
+    def load_route_geometry(self, route: List[Tuple[Station, Dict]]) -> List[Tuple[Station, Dict]]:
+        """Load the geometry of every leg in a route returned by dijkstra_route"""
+        for _, route_info in route:
+            self.load_geometry(route_info)
+        return route
 
     def haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate the great circle distance between two points in kilometers"""
@@ -135,7 +311,8 @@ class OSRMRouteOptimizer:
         self, 
         current_lat: float, 
         current_lon: float, 
-        max_range: float
+        max_range: float,
+        reverse: bool = False
     ) -> List[Tuple[Station, float, Dict]]:
         """
         Find all charging stations within the specified range using spatial indexing and OSRM Table API
@@ -144,118 +321,332 @@ class OSRMRouteOptimizer:
             current_lat: Current position latitude
             current_lon: Current position longitude
             max_range: Maximum range in kilometers
+            reverse: Measure the legs from each station to the current position
+                instead, i.e. find the stations that can reach it
             
         Returns:
             List of tuples containing (station, distance, route_info)
         """
-        if not self.available_stations:
-            return []
-            
-        if self.spatial_index is None:
-            self.refresh_spatial_index()
-            if self.spatial_index is None:  # Still None after refresh
-                return []
-        
+        return self._as_stations(self._find_nearby(current_lat, current_lon, max_range, reverse))
+
+    def _find_nearby(
+        self,
+        current_lat: float,
+        current_lon: float,
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[int, float, Dict]]:
+        """find_nearby_stations with stations as positions in the snapshot arrays"""
         # Step 1: Use spatial index to pre-filter stations
-        # Convert km to radians for BallTree query (Earth radius = 6371 km)
-        search_radius_rad = max_range / 6371.0
-        
-        # Query the BallTree for stations within radius
-        current_point = np.radians([[current_lat, current_lon]])
-        indices = self.spatial_index.query_radius(current_point, search_radius_rad)[0]
+        candidates = self._nearby_candidates(current_lat, current_lon, max_range)
         
         # No stations found within range
-        if len(indices) == 0:
+        if not len(candidates):
             return []
-            
-        # Get the candidate stations from the indices
-        candidate_stations = [self.available_stations[i] for i in indices]
         
         # If only a few stations, use the direct approach
-        if len(candidate_stations) <= 5:
-            return self._direct_distance_calculation(current_lat, current_lon, candidate_stations, max_range)
+        if len(candidates) <= 5:
+            return self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
         
         # Step 2: Use OSRM Table API for batch distance calculation
-        return self._table_distance_calculation(current_lat, current_lon, candidate_stations, max_range)
+        return self._table_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+    def find_nearby_among(
+        self,
+        current_lat: float,
+        current_lon: float,
+        stations: Sequence[Station],
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[Station, float, Dict]]:
+        """
+        find_nearby_stations over candidates prefiltered elsewhere, such as a
+        database radius query, instead of the spatial index. The candidates
+        are measured through the snapshot's arrays and returned as the given
+        rows; the few the snapshot does not hold yet are measured one by one.
+        An unindexed StationSnapshot of the candidates themselves is enough.
+        """
+        positions = self.snapshot.positions_of([station.id for station in stations])
+        known = positions[positions >= 0]
+        coords = self.snapshot.arrays.coordinates(known)
+        candidates = known[self.road_estimator.reachable_mask(current_lat, current_lon, coords, max_range)]
+
+        if not len(candidates):
+            rows = []
+        elif len(candidates) <= 5:
+            rows = self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+        else:
+            rows = self._table_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+        by_id = {station.id: station for station in stations}
+        ids = self.snapshot.arrays.ids
+        nearby = [(by_id[int(ids[position])], distance, route_info) for position, distance, route_info in rows]
+
+        for station, position in zip(stations, positions.tolist()):
+            if position < 0:
+                road_distance, route_info = self.get_road_distance(
+                    *self._orient(current_lat, current_lon, (station.latitude, station.longitude), reverse),
+                    need_geometry=False
+                )
+                if road_distance <= max_range:
+                    nearby.append((station, road_distance, route_info))
+
+        return sorted(nearby, key=lambda x: x[1])
+
+    def _as_stations(self, rows: List[tuple]) -> List[tuple]:
+        """Swap the snapshot position leading each row for its Station, for callers outside the search"""
+        return [(self.snapshot.station(position), *rest) for position, *rest in rows]
+
+    def _point(self, position: int) -> Tuple[float, float]:
+        return self.snapshot.arrays.point(position)
+
+    def _points(self, positions: np.ndarray) -> List[Tuple[float, float]]:
+        arrays = self.snapshot.arrays
+        return list(zip(arrays.latitudes[positions].tolist(), arrays.longitudes[positions].tolist()))
+
+    def _nearby_candidates(self, current_lat: float, current_lon: float, max_range: float) -> np.ndarray:
+        """
+        Positions of stations whose great-circle distance is within range (road
+        distance can only be longer), less those the road distance estimator rules out
+        """
+        if not self.available_stations:
+            return np.array([], dtype=np.int64)
+        positions = self.snapshot.radius_positions(current_lat, current_lon, max_range)
+        coords = self.snapshot.arrays.coordinates(positions)
+        return positions[self.road_estimator.reachable_mask(current_lat, current_lon, coords, max_range)]
     
     def _direct_distance_calculation(
         self,
         current_lat: float,
         current_lon: float,
-        candidate_stations: List[Station],
-        max_range: float
-    ) -> List[Tuple[Station, float, Dict]]:
+        candidates: np.ndarray,
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[int, float, Dict]]:
         """Calculate distances directly for a small number of stations"""
-        nearby = []
-        
-        for station in candidate_stations:
-            road_distance, route_info = self.get_road_distance(
-                current_lat, current_lon,
-                station.latitude, station.longitude
+        legs = [
+            self.get_road_distance(
+                *self._orient(current_lat, current_lon, point, reverse),
+                need_geometry=False
             )
+            for point in self._points(candidates)
+        ]
+        return self._within_range(candidates, legs, max_range)
+
+    @staticmethod
+    def _within_range(
+        candidates: np.ndarray,
+        legs: List[Tuple[float, Dict]],
+        max_range: float
+    ) -> List[Tuple[int, float, Dict]]:
+        """Keep the (position, distance, route_info) rows that are reachable, nearest first"""
+        nearby = [
+            (position, road_distance, route_info)
+            for position, (road_distance, route_info) in zip(np.asarray(candidates).tolist(), legs)
+            if road_distance <= max_range
+        ]
+        return sorted(nearby, key=lambda x: x[1])
+
+    @staticmethod
+    def _orient(
+        current_lat: float,
+        current_lon: float,
+        point: Tuple[float, float],
+        reverse: bool = False
+    ) -> Tuple[float, float, float, float]:
+        """Leg coordinates from the current position to a station's point, or back when reversed"""
+        if reverse:
+            return point[0], point[1], current_lat, current_lon
+        return current_lat, current_lon, point[0], point[1]
+
+    def _table_rows(
+        self,
+        data: Dict[str, Any],
+        current_lat: float,
+        current_lon: float,
+        candidates: np.ndarray,
+        max_range: float,
+        reverse: bool = False,
+        index: int = 0,
+        writes: list = None
+    ) -> List[Tuple[int, float, Dict]]:
+        """
+        Turn a one-to-many Table response into (position, distance, route_info) rows in range.
+
+        For a many-to-many response, index selects the current position's row
+        (or column when reversed).
+
+        The route_info carries only the duration; geometry is loaded later and
+        only for legs that end up in a response. Every measured leg is added
+        to writes for the caller to cache in one go with _store_legs.
+        """
+        if reverse:
+            # One row per candidate, one column per position
+            distances = [row[index] for row in data["distances"]]
+            durations = [row[index] for row in data["durations"]]
+        else:
+            distances = data["distances"][index]  # Road distances in meters
+            durations = data["durations"][index]  # Travel times in seconds
+        
+        nearby = []
+        points = self._points(candidates)
+        for i, position in enumerate(np.asarray(candidates).tolist()):
+            if distances[i] is None or durations[i] is None:
+                continue
+            distance_km = distances[i] / 1000  # Convert meters to kilometers
+            route_info = {"geometry": None, "duration": durations[i] / 60, "steps": None}
+            
+            leg = self._orient(current_lat, current_lon, points[i], reverse)
             
-            if road_distance <= max_range:
-                nearby.append((station, road_distance, route_info))
+            # Share the measured leg with every later lookup that only needs scalars
+            if writes is not None:
+                writes.append((*leg, distance_km, route_info))
+            
+            if distance_km <= max_range:
+                _, route_info = self._mark_leg((distance_km, route_info), *leg)
+                nearby.append((position, distance_km, route_info))
         
         return sorted(nearby, key=lambda x: x[1])
     
+    def _matrix_requests(
+        self,
+        points: List[Tuple[float, float]],
+        candidates: np.ndarray,
+        reverse: bool = False
+    ) -> Generator[Tuple[Dict[str, Any], np.ndarray], None, None]:
+        """
+        Arguments for many-to-many OSRM Table calls between positions and stations,
+        split so no call exceeds OSRM's table size limit
+        """
+        chunk_size = TABLE_MAX_COORDINATES - len(points)
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates[start:start + chunk_size]
+            # The positions come first, the stations follow them
+            coordinates = list(points) + self._points(chunk)
+            positions = list(range(len(points)))
+            destinations = list(range(len(points), len(coordinates)))
+            yield {
+                "coordinates": coordinates,
+                "sources": destinations if reverse else positions,
+                "destinations": positions if reverse else destinations,
+                "annotations": "distance,duration"
+            }, chunk
+
+    def _matrix_rows(
+        self,
+        responses: List[Tuple[Dict[str, Any], np.ndarray]],
+        points: List[Tuple[float, float]],
+        candidates: List[np.ndarray],
+        max_range: float,
+        reverse: bool = False,
+        writes: list = None
+    ) -> List[List[Tuple[int, float, Dict]]]:
+        """Split many-to-many Table responses into per-position nearby rows, collecting legs into writes"""
+        rows = [[] for _ in points]
+        for data, chunk in responses:
+            if data["code"] != "Ok":
+                raise ValueError(f"OSRM Table API returned {data['code']}")
+            for i, (lat, lon) in enumerate(points):
+                rows[i].extend(self._table_rows(data, lat, lon, chunk, max_range, reverse, index=i, writes=writes))
+
+        # Keep each position to its own great-circle candidates, like find_nearby_stations
+        nearby = []
+        for position_rows, position_candidates in zip(rows, candidates):
+            own = set(position_candidates.tolist())
+            nearby.append(sorted((row for row in position_rows if row[0] in own), key=lambda x: x[1]))
+        return nearby
+
+    @staticmethod
+    def _distinct(candidates: List[np.ndarray]) -> np.ndarray:
+        """Every position in the candidate groups once, in the order first seen"""
+        if not candidates:
+            return np.array([], dtype=np.int64)
+        joined = np.concatenate(candidates)
+        _, first = np.unique(joined, return_index=True)
+        return joined[np.sort(first)]
+
+    def find_nearby_stations_batch(
+        self,
+        points: List[Tuple[float, float]],
+        max_range: float,
+        reverse: bool = False
+    ) -> List[List[Tuple[Station, float, Dict]]]:
+        """
+        find_nearby_stations for several positions at once, measured with
+        many-to-many OSRM Table calls instead of one call per position
+        """
+        return [self._as_stations(rows) for rows in self._find_nearby_batch(points, max_range, reverse)]
+
+    def _find_nearby_batch(
+        self,
+        points: List[Tuple[float, float]],
+        max_range: float,
+        reverse: bool = False
+    ) -> List[List[Tuple[int, float, Dict]]]:
+        """find_nearby_stations_batch with stations as positions in the snapshot arrays"""
+        if len(points) == 1:
+            return [self._find_nearby(*points[0], max_range, reverse)]
+
+        candidates = [self._nearby_candidates(lat, lon, max_range) for lat, lon in points]
+        distinct = self._distinct(candidates)
+        if not len(distinct):
+            return [[] for _ in points]
+        if not self._osrm_available():
+            return [self._find_nearby(lat, lon, max_range, reverse) for lat, lon in points]
+
+        try:
+            responses = []
+            for request, chunk in self._matrix_requests(points, distinct, reverse):
+                responses.append((self.osrm_client.table(**request, timeout=self._osrm_timeout()), chunk))
+            writes = []
+            rows = self._matrix_rows(responses, points, candidates, max_range, reverse, writes)
+            self._store_legs(writes)
+            return rows
+
+        except Exception as e:
+            print(f"OSRM Table API error: {e}. Falling back to one request per position.")
+            osrm_metrics.record_fallback("table_error")
+            return [self._find_nearby(lat, lon, max_range, reverse) for lat, lon in points]
+
     def _table_distance_calculation(
         self,
         current_lat: float,
         current_lon: float,
-        candidate_stations: List[Station],
-        max_range: float
-    ) -> List[Tuple[Station, float, Dict]]:
+        candidates: np.ndarray,
+        max_range: float,
+        reverse: bool = False
+    ) -> List[Tuple[int, float, Dict]]:
         """Use OSRM Table API for batch distance calculation"""
-        # Build coordinates string for the Table API
-        # Format: lon1,lat1;lon2,lat2;...
-        source_coords = f"{current_lon},{current_lat}"
-        destination_coords = ";".join([
-            f"{station.longitude},{station.latitude}" 
-            for station in candidate_stations
-        ])
-        
-        url = f"{self.osrm_server}/table/v1/driving/{source_coords};{destination_coords}"
-        params = {
-            "sources": "0",  # Index of source point (current location)
-            "destinations": ";".join([str(i+1) for i in range(len(candidate_stations))]),
-            "annotations": "distance"
-        }
-        
+        if not self._osrm_available():
+            return self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
         try:
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            if data["code"] != "Ok":
-                # Fallback to direct calculation if API fails
-                return self._direct_distance_calculation(current_lat, current_lon, candidate_stations, max_range)
-            
-            nearby = []
-            distances = data["distances"][0]  # Road distances in meters
-            
-            for i, station in enumerate(candidate_stations):
-                distance_km = distances[i] / 1000  # Convert meters to kilometers
-                
-                if distance_km <= max_range:
-                    # We only have distance from the Table API, get detailed route info separately
-                    _, route_info = self.get_road_distance(
-                        current_lat, current_lon,
-                        station.latitude, station.longitude
-                    )
-                    nearby.append((station, distance_km, route_info))
-            
-            return sorted(nearby, key=lambda x: x[1])
+            rows, writes = [], []
+            for request, chunk in self._matrix_requests([(current_lat, current_lon)], candidates, reverse):
+                data = self.osrm_client.table(**request, timeout=self._osrm_timeout())
+
+                if data["code"] != "Ok":
+                    # Fallback to direct calculation if API fails
+                    self._store_legs(writes)
+                    return self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
+
+                rows.extend(self._table_rows(data, current_lat, current_lon, chunk, max_range, reverse, writes=writes))
+
+            self._store_legs(writes)
+            return sorted(rows, key=lambda x: x[1])
             
         except Exception as e:
             print(f"OSRM Table API error: {e}. Falling back to direct calculation.")
-            return self._direct_distance_calculation(current_lat, current_lon, candidate_stations, max_range)
+            osrm_metrics.record_fallback("table_error")
+            return self._direct_distance_calculation(current_lat, current_lon, candidates, max_range, reverse)
     
     def find_nearest_station(
         self,
         lat: float,
         lon: float,
         filter_charging_type: str = None,
-        filter_min_power: float = None
+        filter_min_power: float = None,
+        need_geometry: bool = True
     ) -> Tuple[Station, float, Dict]:
         """
         Find the nearest available charging station using spatial indexing
@@ -265,6 +656,7 @@ class OSRMRouteOptimizer:
             lon: Longitude of the position
             filter_charging_type: Optional filter for charging type (e.g., 'DC', 'AC')
             filter_min_power: Optional minimum power output in kW
+            need_geometry: Fetch the geometry of the returned leg too
             
         Returns:
             Tuple of (station, distance, route_info)
@@ -272,65 +664,62 @@ class OSRMRouteOptimizer:
         Raises:
             ValueError: If no station meets the criteria
         """
-        # First filter stations by availability
-        available_stations = [s for s in self.stations if s.is_available and not s.is_maintenance]
+        position, road_distance, route_info = self._find_nearest(
+            lat, lon, filter_charging_type, filter_min_power, need_geometry
+        )
+        return self.snapshot.station(position), road_distance, route_info
+
+    def _find_nearest(
+        self,
+        lat: float,
+        lon: float,
+        filter_charging_type: str = None,
+        filter_min_power: float = None,
+        need_geometry: bool = True
+    ) -> Tuple[int, float, Dict]:
+        """find_nearest_station with the station as a position in the snapshot arrays"""
+        top_candidates = self._nearest_candidates(lat, lon, filter_charging_type, filter_min_power)
         
-        if not available_stations:
+        # Get road distances for top candidates
+        result = []
+        for position, _ in top_candidates:
+            road_distance, route_info = self.get_road_distance(
+                lat, lon, *self._point(position),
+                need_geometry=False
+            )
+            result.append((position, road_distance, route_info))
+        
+        # Return the station with the shortest road distance
+        position, road_distance, route_info = min(result, key=lambda x: x[1])
+        if need_geometry:
+            self.load_geometry(route_info)
+        return position, road_distance, route_info
+
+    def _nearest_candidates(
+        self,
+        lat: float,
+        lon: float,
+        filter_charging_type: str = None,
+        filter_min_power: float = None
+    ) -> List[Tuple[int, float]]:
+        """Up to 5 matching stations closest by great-circle distance, to be checked by road"""
+        if not self.snapshot.routable_stations:
             raise ValueError("No available stations found")
         
-        # Then filter by charging configurations if specified
-        if filter_charging_type is not None or filter_min_power is not None:
-            filtered_stations = []
-            
-            for station in available_stations:
-                # Check if any charging config meets the criteria
-                matching_configs = [
-                    config for config in station.charging_configs
-                    if (filter_charging_type is None or config.charging_type == filter_charging_type) and
-                       (filter_min_power is None or config.power_output >= filter_min_power)
-                ]
-                
-                if matching_configs:
-                    filtered_stations.append(station)
-        else:
-            filtered_stations = available_stations
-            
-        if not filtered_stations:
+        # The snapshot keeps a prebuilt tree per charging type and power tier
+        positions, distances = self.snapshot.nearest_positions(
+            lat, lon, k=5,
+            charging_type=filter_charging_type,
+            min_power=filter_min_power
+        )
+        
+        if not len(positions):
             raise ValueError(
                 f"No available stations match the criteria: "
                 f"charging_type={filter_charging_type}, min_power={filter_min_power}"
             )
-            
-        # Build a temporary spatial index for the filtered stations
-        if len(filtered_stations) > 1:
-            station_coords = np.radians(
-                np.array([[s.latitude, s.longitude] for s in filtered_stations])
-            )
-            
-            tree = BallTree(station_coords, metric='haversine')
-            
-            # Find nearest station by haversine distance
-            query_point = np.radians([[lat, lon]])
-            distances, indices = tree.query(query_point, k=min(5, len(filtered_stations)))
-            
-            # Get the top 5 (or fewer) stations to check road distance
-            top_candidates = [(filtered_stations[i], d * 6371.0) for i, d in zip(indices[0], distances[0])]
-        else:
-            # Only one station, no need for spatial index
-            station = filtered_stations[0]
-            distance = self.haversine_distance(lat, lon, station.latitude, station.longitude)
-            top_candidates = [(station, distance)]
         
-        # Get road distances for top candidates
-        result = []
-        for station, _ in top_candidates:
-            road_distance, route_info = self.get_road_distance(
-                lat, lon, station.latitude, station.longitude
-            )
-            result.append((station, road_distance, route_info))
-        
-        # Return the station with the shortest road distance
-        return min(result, key=lambda x: x[1])
+        return list(zip(positions.tolist(), distances.tolist()))
 
     # def _find_nearby_stations_fallback(
     #     self,
@@ -424,7 +813,8 @@ class OSRMRouteOptimizer:
     def dijkstra_route(
         self, 
         start_coords: Tuple[float, float], 
-        end_coords: Tuple[float, float]
+        end_coords: Tuple[float, float],
+        algorithm: str = "dijkstra"
     ) -> List[Tuple[Station, Dict]]:
         """
         Find optimal route using Dijkstra's algorithm with actual road distances
@@ -432,6 +822,9 @@ class OSRMRouteOptimizer:
         Args:
             start_coords: (latitude, longitude) of starting point
             end_coords: (latitude, longitude) of destination
+            algorithm: "dijkstra", "astar" to steer the search towards the
+                destination with a great-circle heuristic, or "bidirectional"
+                to search from both ends and meet in the middle
         
         Returns:
             List of tuples containing (station, route_info) forming the optimal route
@@ -439,73 +832,421 @@ class OSRMRouteOptimizer:
         Raises:
             ValueError: If no valid route can be found
         """
-        available_stations = [s for s in self.stations if s.is_available]
-        
-        if not available_stations:
+        return self._as_stations(self._drive(self._route_search(start_coords, end_coords, algorithm)))
+
+    def plan_route(
+        self,
+        start_coords: Tuple[float, float],
+        end_coords: Tuple[float, float],
+        algorithm: str = "dijkstra"
+    ) -> RoutePlan:
+        """
+        Search a route with dijkstra_route and load every leg it drives
+
+        Returns:
+            RoutePlan whose legs carry distance, duration and geometry, ready
+            for get_route_summary; it has no stops if start and end share
+            their nearest station
+        """
+        route = self.dijkstra_route(start_coords, end_coords, algorithm)
+        plan = RoutePlan.from_route(route, start_coords, end_coords)
+        return self.load_plan(plan) if plan.stops else plan
+
+    def load_plan(self, plan: RoutePlan) -> RoutePlan:
+        """
+        Fill in the legs of a plan the search did not measure and every missing
+        geometry: from the cache where possible, otherwise with one Route call
+        through all of the plan's waypoints instead of one call per leg
+        """
+        missing = self._uncached_plan_legs(plan)
+        if missing and len(plan.legs) > 1 and self._osrm_available():
+            try:
+                data = self.osrm_client.route(plan.points, timeout=self._osrm_timeout(), **self._route_params())
+                self._store_legs(self._apply_plan_route(plan, data))
+            except Exception as e:
+                print(f"OSRM API error: {e}. Loading the route legs one at a time.")
+                osrm_metrics.record_fallback("plan_route_error")
+
+        for leg in plan.incomplete_legs(self.include_steps):
+            self._fill_leg(leg, self.get_road_distance(*leg.start, *leg.end))
+        return plan
+
+    def _uncached_plan_legs(self, plan: RoutePlan) -> List[Leg]:
+        """Complete plan legs from the distance cache and return the ones still incomplete"""
+        for leg in plan.incomplete_legs(self.include_steps):
+            cached = self._cached_leg(*leg.start, *leg.end)
+            if cached is not None:
+                leg.fill(*cached)
+        return plan.incomplete_legs(self.include_steps)
+
+    def _apply_plan_route(self, plan: RoutePlan, data: Dict[str, Any]) -> List[tuple]:
+        """Split a multi-waypoint Route response into the plan's legs; returns the legs to cache"""
+        if data.get("code") != "Ok":
+            raise ValueError(f"OSRM Route API returned {data.get('code')}")
+
+        route = data["routes"][0]
+        geometries = self._leg_geometries(route, data.get("waypoints"))
+        writes = []
+        for leg, osrm_leg, geometry in zip(plan.legs, route["legs"], geometries):
+            distance = osrm_leg["distance"] / 1000
+            route_info = {
+                "geometry": geometry,
+                "duration": osrm_leg["duration"] / 60,
+                "steps": osrm_leg.get("steps") or None
+            }
+            if route_info["geometry"] is not None:
+                writes.append((*leg.start, *leg.end, distance, route_info))
+            self._fill_leg(leg, (distance, route_info))
+        return writes
+
+    @classmethod
+    def _leg_geometries(cls, route: Dict[str, Any], waypoints: Optional[List[Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        """GeoJSON line of every leg of a multi-waypoint route"""
+        legs = route["legs"]
+        if all(osrm_leg.get("steps") for osrm_leg in legs):
+            return [cls._leg_geometry(osrm_leg) for osrm_leg in legs]
+
+        # Without steps, cut the overview line at the snapped waypoints, which are vertices of it
+        coordinates = (route.get("geometry") or {}).get("coordinates") or []
+        if not coordinates or not waypoints or len(waypoints) != len(legs) + 1:
+            return [None] * len(legs)
+
+        line = np.asarray(coordinates, dtype=float)
+        cuts = [0]
+        for waypoint in waypoints[1:-1]:
+            gaps = np.sum((line[cuts[-1]:] - waypoint["location"]) ** 2, axis=1)
+            # The first vertex at the waypoint, in case the route passes it again later
+            cuts.append(cuts[-1] + int(np.flatnonzero(gaps <= gaps.min() + 1e-12)[0]))
+        cuts.append(len(coordinates) - 1)
+
+        return [
+            {"type": "LineString", "coordinates": coordinates[cuts[i]:cuts[i + 1] + 1]}
+            if cuts[i + 1] > cuts[i] else None
+            for i in range(len(legs))
+        ]
+
+    @staticmethod
+    def _leg_geometry(osrm_leg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """GeoJSON line of one leg of a multi-waypoint route, joined from its step geometries"""
+        coordinates = []
+        for step in osrm_leg.get("steps") or []:
+            line = (step.get("geometry") or {}).get("coordinates") or []
+            # Consecutive steps share their joining point
+            coordinates.extend(line[1:] if coordinates and line and line[0] == coordinates[-1] else line)
+        if len(coordinates) < 2:
+            return None
+        return {"type": "LineString", "coordinates": coordinates}
+
+    @staticmethod
+    def _fill_leg(leg: Leg, measured: Tuple[float, Dict[str, Any]]):
+        """Take a measured leg, unless it is only an estimate of a leg the search already measured"""
+        distance, route_info = measured
+        if leg.measured and route_info.get("estimated"):
+            return
+        leg.fill(distance, route_info)
+
+    def _route_search(
+        self,
+        start_coords: Tuple[float, float],
+        end_coords: Tuple[float, float],
+        algorithm: str = "dijkstra"
+    ) -> Generator[tuple, list, List[Tuple[int, Dict]]]:
+        """
+        Dijkstra's algorithm (or A*) written without any I/O of its own.
+
+        The generator yields OSRM lookups it needs as ("nearest", points),
+        ("nearby", points, max_range) or ("reaching", points, max_range) and
+        is sent back one result per point, so the same search runs under the
+        blocking driver here and the concurrent one in AsyncOSRMRouteOptimizer.
+        Stations are positions in the snapshot arrays throughout, and the
+        route is returned as (position, route_info) pairs.
+
+        A* orders the queue by distance so far plus the great-circle distance
+        to end_station. Road distance is never shorter than great-circle
+        distance, so the heuristic is admissible and consistent and the route
+        found is the same one Dijkstra would find.
+        """
+        if algorithm not in self.SEARCH_ALGORITHMS:
+            raise ValueError(f"Unknown search algorithm: {algorithm}")
+        if not self.available_stations:
             raise ValueError("No available charging stations")
         
+        stats = self.search_stats = {"algorithm": algorithm, "nodes_expanded": 0, "osrm_calls": 0}
+        
         # Find closest stations to start and end points
-        start_station, start_distance, _ = self.find_nearest_station(
-            start_coords[0], start_coords[1]
+        (start_station, start_distance, _), (end_station, end_distance, _) = yield (
+            "nearest", [start_coords, end_coords]
         )
         
-        end_station, end_distance, _ = self.find_nearest_station(
-            end_coords[0], end_coords[1]
-        )
+        if algorithm == "bidirectional":
+            return (yield from self._bidirectional_search(start_station, end_station, stats))
+        
+        if algorithm == "astar":
+            end_lat, end_lon = self._point(end_station)
+
+            def heuristic(station: int) -> float:
+                return self.haversine_distance(*self._point(station), end_lat, end_lon)
+        else:
+            def heuristic(station: int) -> float:
+                return 0
             
-        # Initialize Dijkstra's algorithm data structures
-        distances = {station: float('inf') for station in self.stations}
-        distances[start_station] = 0
-        previous = {station: None for station in self.stations}
-        route_info = {station: None for station in self.stations}
+        # Initialize Dijkstra's algorithm data structures lazily so the
+        # per-request cost does not grow with the size of the catalog
+        distances = {start_station: 0}
+        previous = {start_station: None}
+        route_info = {}
         
-        # Priority queue of (distance, station)
-        pq = [(0, start_station)]
+        # Priority queue of (priority, tie-breaker, distance, station)
+        counter = itertools.count()
+        pq = [(heuristic(start_station), next(counter), 0, start_station)]
+        prefetched = {}
         
         while pq:
-            current_distance, current = heapq.heappop(pq)
+            _, _, current_distance, current = heapq.heappop(pq)
             
             if current == end_station:
                 break
                 
-            if current_distance > distances[current]:
+            if current_distance > distances.get(current, float('inf')):
                 continue
             
+            stats["nodes_expanded"] += 1
+            
             # Check all possible next stations within range
-            nearby = self.find_nearby_stations(
-                current.latitude,
-                current.longitude,
-                self.battery_range
-            )
+            nearby = yield from self._expand(current, queue=pq, labels=distances, prefetched=prefetched)
             
             for next_station, distance, info in nearby:
                 new_distance = current_distance + distance
                 
-                if new_distance < distances[next_station]:
+                if new_distance < distances.get(next_station, float('inf')):
                     distances[next_station] = new_distance
                     previous[next_station] = current
                     route_info[next_station] = info
-                    heapq.heappush(pq, (new_distance, next_station))
+                    heapq.heappush(pq, (new_distance + heuristic(next_station), next(counter), new_distance, next_station))
         
-        if distances[end_station] == float('inf'):
+        if distances.get(end_station, float('inf')) == float('inf'):
             raise ValueError("No valid route found between start and end points")
             
         # Reconstruct path with route information
         path = []
         current = end_station
-        while current:
+        while current is not None:
             if current != start_station:  # Skip adding route info for the starting point
-                path.append((current, route_info[current]))
-            current = previous[current]
+                path.append((current, route_info.get(current)))
+            current = previous.get(current)
             
         # Reverse to get path from start to end
         path.reverse()
         
         return path
 
+    def _bidirectional_search(
+        self,
+        start_station: int,
+        end_station: int,
+        stats: Dict[str, Any]
+    ) -> Generator[tuple, list, List[Tuple[int, Dict]]]:
+        """
+        Grow a forward frontier from start_station and a backward one from
+        end_station, always expanding the side whose queue head is closer.
+
+        Every relaxed edge that touches a node already labelled by the other
+        side offers a candidate route. The search stops once the two queue
+        heads together are no shorter than the best candidate, because any
+        route still undiscovered would have to be at least that long.
+        """
+        if start_station == end_station:
+            return []
+
+        # Per direction: distance labels, predecessor (or successor backwards),
+        # the leg that led to each label, and a priority queue of
+        # (priority, tie-breaker, distance, station) as in _route_search
+        distances = ({start_station: 0}, {end_station: 0})
+        parents = ({start_station: None}, {end_station: None})
+        legs = ({}, {})
+        counter = itertools.count()
+        queues = ([(0, next(counter), 0, start_station)], [(0, next(counter), 0, end_station)])
+        prefetched = ({}, {})
+
+        best, meeting = float('inf'), None
+
+        while queues[0] and queues[1]:
+            if queues[0][0][0] + queues[1][0][0] >= best:
+                break
+
+            side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+            _, _, current_distance, current = heapq.heappop(queues[side])
+            if current_distance > distances[side].get(current, float('inf')):
+                continue
+
+            stats["nodes_expanded"] += 1
+
+            # Forward expansions follow legs out of a station, backward ones legs into it
+            nearby = yield from self._expand(
+                current, reverse=bool(side),
+                queue=queues[side], labels=distances[side], prefetched=prefetched[side]
+            )
+
+            for next_station, distance, info in nearby:
+                new_distance = current_distance + distance
+                if new_distance >= distances[side].get(next_station, float('inf')):
+                    continue
+
+                distances[side][next_station] = new_distance
+                parents[side][next_station] = current
+                legs[side][next_station] = info
+                heapq.heappush(queues[side], (new_distance, next(counter), new_distance, next_station))
+
+                other = distances[1 - side].get(next_station)
+                if other is not None and new_distance + other < best:
+                    best, meeting = new_distance + other, next_station
+
+        if meeting is None:
+            raise ValueError("No valid route found between start and end points")
+
+        # Forward half: stations from the meeting point back to the start, each
+        # with the leg arriving at it
+        path = []
+        current = meeting
+        while current != start_station:
+            path.append((current, legs[0][current]))
+            current = parents[0][current]
+        path.reverse()
+
+        # Backward half: a station's stored leg leaves it towards its successor,
+        # so that leg belongs to the successor in the path
+        current = meeting
+        while current != end_station:
+            successor = parents[1][current]
+            path.append((successor, legs[1][current]))
+            current = successor
+
+        return path
+
+    def _expand(
+        self,
+        station: int,
+        reverse: bool = False,
+        queue: list = (),
+        labels: Dict[int, float] = None,
+        prefetched: Dict[int, list] = None
+    ) -> Generator[tuple, list, List[Tuple[int, float, Dict]]]:
+        """
+        Stations within battery range of a station (or that can reach it when
+        reversed), from the precomputed graph if it can answer, else from OSRM.
+
+        An OSRM lookup also measures the next stations waiting in the queue, so
+        a whole slice of the frontier costs one Table round-trip. Their rows are
+        kept in prefetched until the search pops them.
+        """
+        nearby = self._graph_neighbours(station, reverse)
+        if nearby is not None:
+            return nearby
+        if prefetched is not None and station in prefetched:
+            return prefetched.pop(station)
+
+        batch = [station]
+        if prefetched is not None:
+            batch += self._frontier(queue, labels, prefetched, exclude=station)
+
+        results = yield (
+            "reaching" if reverse else "nearby",
+            self._points(batch),
+            self.battery_range
+        )
+        for queued, rows in zip(batch[1:], results[1:]):
+            prefetched[queued] = rows
+        return results[0]
+
+    def _frontier(
+        self,
+        queue: list,
+        labels: Dict[int, float],
+        prefetched: Dict[int, list],
+        exclude: int
+    ) -> List[int]:
+        """Up to frontier_batch_size - 1 stations the search will expand next that still need OSRM"""
+        batch = []
+        limit = self.frontier_batch_size - 1
+        if limit <= 0:
+            return batch
+
+        # Queue entries end with (distance, station); stale and already
+        # prefetched ones are skipped, so look far enough past them
+        for entry in heapq.nsmallest(len(prefetched) + limit * 4, queue):
+            distance, station = entry[-2], entry[-1]
+            if (station == exclude or station in prefetched or station in batch
+                    or distance > labels.get(station, float('inf'))
+                    or self._graph_covers(station)):
+                continue
+            batch.append(station)
+            if len(batch) == limit:
+                break
+        return batch
+
+    def _graph_covers(self, station: int) -> bool:
+        """Whether the precomputed graph can answer expansions of a station at this battery range"""
+        graph = self.station_graph
+        return (
+            graph is not None and self.battery_range <= graph.max_range
+            and int(self.snapshot.arrays.ids[station]) in graph
+        )
+
+    def _graph_neighbours(self, station: int, reverse: bool = False) -> Optional[List[Tuple[int, float, Dict]]]:
+        """
+        Stations within battery range of a station according to the precomputed
+        graph, or None if the graph is missing, too short-ranged or lacks the station
+        """
+        if not self._graph_covers(station):
+            return None
+
+        graph = self.station_graph
+        station_id = int(self.snapshot.arrays.ids[station])
+        edges = graph.incoming(station_id) if reverse else graph.neighbours(station_id)
+        if not edges:
+            return []
+
+        point = self._point(station)
+        neighbours = self.snapshot.positions_of([neighbour_id for neighbour_id, _, _ in edges]).tolist()
+        nearby = []
+        for neighbour, (_, distance, duration) in zip(neighbours, edges):
+            if neighbour < 0 or distance > self.battery_range:
+                continue
+            leg = (self._point(neighbour), point) if reverse else (point, self._point(neighbour))
+            nearby.append((neighbour, *self._mark_leg(
+                (distance, {"geometry": None, "duration": duration, "steps": None}),
+                *leg[0], *leg[1]
+            )))
+        return nearby
+
+    def _drive(self, search: Generator):
+        """Run a search generator to completion, answering its lookups with blocking calls"""
+        osrm_calls, estimated_legs = self.osrm_calls, self.estimated_legs
+        try:
+            request = next(search)
+            while True:
+                request = search.send(self._resolve(request))
+        except StopIteration as done:
+            return done.value
+        finally:
+            self.search_stats["osrm_calls"] = self.osrm_calls - osrm_calls
+            self.search_stats["estimated_legs"] = self.estimated_legs - estimated_legs
+            osrm_metrics.record_search(self.search_stats.get("nodes_expanded", 0))
+
+    def _resolve(self, request: tuple) -> list:
+        """Answer one lookup yielded by a search generator"""
+        kind, points, *args = request
+        if kind == "nearest":
+            return [self._find_nearest(lat, lon, need_geometry=False) for lat, lon in points]
+        if kind == "nearby":
+            return self._find_nearby_batch(points, args[0])
+        if kind == "reaching":
+            return self._find_nearby_batch(points, args[0], reverse=True)
+        raise ValueError(f"Unknown search request: {kind}")
+
     def get_route_summary(
         self, 
-        route: List[Tuple[Station, Dict]], 
+        route: Union[RoutePlan, List[Tuple[Station, Dict]]], 
         start_coords: Tuple[float, float],
         end_coords: Tuple[float, float]
     ) -> dict:
@@ -513,23 +1254,44 @@ class OSRMRouteOptimizer:
         Generate a summary of the route including real road distances and charging details
         
         Args:
-            route: List of (station, route_info) tuples in the route
+            route: RoutePlan from plan_route, or the (station, route_info)
+                list from dijkstra_route, which is loaded into a plan first
             start_coords: (latitude, longitude) of starting point
             end_coords: (latitude, longitude) of destination
             
         Returns:
             Dictionary containing route summary information
         """
+        plan = route if isinstance(route, RoutePlan) else self.load_plan(
+            RoutePlan.from_route(route, start_coords, end_coords)
+        )
+        # The direct route is only compared against, so its geometry is not needed
+        direct = self.get_road_distance(*start_coords, *end_coords, need_geometry=False)
+        return self._assemble_summary(plan.route, start_coords, end_coords, self._summary_legs(plan, direct))
+
+    @staticmethod
+    def _summary_legs(plan: RoutePlan, direct: Tuple[float, Dict[str, Any]]) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        (distance, route_info) of every leg a summary needs: start to first station,
+        each station to the next, last station to destination, then start to destination
+        """
+        return [(leg.distance, leg.route_info()) for leg in plan.legs] + [direct]
+
+    def _assemble_summary(
+        self,
+        route: List[Tuple[Station, Dict]],
+        start_coords: Tuple[float, float],
+        end_coords: Tuple[float, float],
+        legs: List[Tuple[float, Dict[str, Any]]]
+    ) -> dict:
+        """Build the summary from the (distance, route_info) of every leg in _summary_legs order"""
         segments = []
         total_distance = 0
         total_time = 0
         
         # Add segment from start point to first station
         first_station, first_route_info = route[0]
-        initial_distance, initial_route_info = self.get_road_distance(
-            start_coords[0], start_coords[1],
-            first_station.latitude, first_station.longitude
-        )
+        initial_distance, initial_route_info = legs[0]
         
         total_distance += initial_distance
         total_time += initial_route_info["duration"]
@@ -563,10 +1325,7 @@ class OSRMRouteOptimizer:
             current_station, _ = route[i]
             next_station, next_route_info = route[i + 1]
             
-            distance, route_info = self.get_road_distance(
-                current_station.latitude, current_station.longitude,
-                next_station.latitude, next_station.longitude
-            )
+            distance, route_info = legs[i + 1]
             
             total_distance += distance
             total_time += route_info["duration"]
@@ -606,10 +1365,7 @@ class OSRMRouteOptimizer:
         
         # Add final segment from last station to destination
         last_station, _ = route[-1]
-        final_distance, final_route_info = self.get_road_distance(
-            last_station.latitude, last_station.longitude,
-            end_coords[0], end_coords[1]
-        )
+        final_distance, final_route_info = legs[-2]
         
         total_distance += final_distance
         total_time += final_route_info["duration"]
@@ -638,11 +1394,13 @@ class OSRMRouteOptimizer:
             'route_geometry': final_route_info["geometry"]
         })
         
+        # Turn-by-turn steps are only returned when asked for
+        if self.include_steps:
+            for segment, (_, route_info) in zip(segments, legs):
+                segment['steps'] = route_info.get("steps")
+        
         # Get direct distance and time between start and end for comparison
-        direct_distance, direct_route_info = self.get_road_distance(
-            start_coords[0], start_coords[1],
-            end_coords[0], end_coords[1]
-        )
+        direct_distance, direct_route_info = legs[-1]
         
         charging_time_estimate = 0
         for station, _ in route:
@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.stations import Station
+
+Point = Tuple[float, float]
+
+
+@dataclass
+class Leg:
+    """One drive of a route plan; distance in km, duration in minutes"""
+    start: Point
+    end: Point
+    distance: Optional[float] = None
+    duration: Optional[float] = None
+    geometry: Optional[Dict[str, Any]] = None
+    steps: Optional[List[Dict[str, Any]]] = None
+    estimated: bool = False
+
+    @property
+    def measured(self) -> bool:
+        return self.distance is not None and self.duration is not None
+
+    @property
+    def complete(self) -> bool:
+        return self.measured and self.geometry is not None
+
+    def fill(self, distance: float, route_info: Dict[str, Any]):
+        """Take the distance, duration and (if present) geometry of a measured leg"""
+        self.distance = distance
+        self.duration = route_info["duration"]
+        if route_info.get("geometry") is not None:
+            self.geometry = route_info["geometry"]
+            self.steps = route_info.get("steps")
+        self.estimated = bool(route_info.get("estimated"))
+
+    def route_info(self) -> Dict[str, Any]:
+        """The leg in the (distance, route_info) shape the optimizer passes around"""
+        return {
+            "geometry": self.geometry,
+            "duration": self.duration,
+            "steps": self.steps,
+            "from": self.start,
+            "to": self.end,
+            "distance": self.distance,
+            "estimated": self.estimated
+        }
+
+
+@dataclass
+class RoutePlan:
+    """
+    A searched route with every leg it drives: start to the first stop, stop
+    to stop, and the last stop to the destination, so legs[i] arrives at
+    stops[i] and legs[-1] reaches the destination.
+
+    Legs measured during the search are carried over as they are; the rest,
+    and all geometries, are filled in once by the optimizer's load_plan.
+    """
+    start: Point
+    end: Point
+    stops: List[Station]
+    legs: List[Leg] = field(default_factory=list)
+
+    @classmethod
+    def from_route(cls, route: List[Tuple[Station, Dict]], start: Point, end: Point) -> "RoutePlan":
+        """Build a plan from dijkstra_route output, reusing the station-to-station legs it measured"""
+        start, end = tuple(start), tuple(end)
+        stops = [station for station, _ in route]
+        points = [start] + [(station.latitude, station.longitude) for station in stops] + [end]
+        legs = [Leg(points[i], points[i + 1]) for i in range(len(points) - 1)]
+
+        # The first station's route_info is the leg from the search's start
+        # station, which is not a stop, so only later legs can be reused
+        for leg, (_, route_info) in zip(legs[1:-1], route[1:]):
+            if route_info and route_info.get("distance") is not None:
+                leg.fill(route_info["distance"], route_info)
+
+        return cls(start=start, end=end, stops=stops, legs=legs)
+
+    @property
+    def points(self) -> List[Point]:
+        return [self.start] + [leg.end for leg in self.legs]
+
+    @property
+    def route(self) -> List[Tuple[Station, Dict[str, Any]]]:
+        """(station, route_info of the leg arriving at it) pairs, like dijkstra_route returns"""
+        return [(station, leg.route_info()) for station, leg in zip(self.stops, self.legs)]
+
+    def incomplete_legs(self, need_steps: bool = False) -> List[Leg]:
+        return [leg for leg in self.legs if not leg.complete or (need_steps and leg.steps is None)]
@@ -0,0 +1,337 @@
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.services.distance_cache import METERS_PER_DEGREE
+from app.services.osrm_metrics import osrm_metrics
+
+logger = logging.getLogger(__name__)
+
+FLIGHT_KEY_PREFIX = "osrm:flight:"
+
+
+class _LeaderCancelled(Exception):
+    """Handed to the followers of a flight whose leader was cancelled, so one of them takes over"""
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent OSRM lookups into one request.
+
+    Lookups are keyed on the service, the coordinates snapped to the road
+    distance cache grid and the query parameters. Within a process, callers
+    that arrive while the same lookup is in flight wait for its result
+    instead of sending their own. With OSRM_SINGLE_FLIGHT_ACROSS_WORKERS,
+    which is off by default because every OSRM call then pays a few Redis
+    round trips first, lookups are also coalesced across workers: the
+    first caller takes a short Redis lock and publishes its response under
+    the key for OSRM_SINGLE_FLIGHT_RESULT_SECONDS; callers in other workers
+    that find the lock mark the key as awaited and poll for that response,
+    and only call OSRM themselves if the holder gives up without one. The
+    response is only published when someone is waiting for it. The async
+    path talks to Redis through redis.asyncio, one client per event loop.
+
+    Waiting counts against the caller's timeout: a follower that runs out
+    of it raises TimeoutError instead of calling OSRM itself, and one that
+    has to call after all only gets the time it has left.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = None,
+        grid_meters: float = None,
+        across_workers: bool = None
+    ):
+        self.redis_url = redis_url if redis_url is not None else settings.REDIS_URL
+        self.grid_degrees = (grid_meters if grid_meters is not None else settings.OSRM_CACHE_GRID_METERS) / METERS_PER_DEGREE
+        self.across_workers = across_workers if across_workers is not None else settings.OSRM_SINGLE_FLIGHT_ACROSS_WORKERS
+        self.lock_ms = int(settings.OSRM_SINGLE_FLIGHT_LOCK_SECONDS * 1000)
+        self.result_ms = int(settings.OSRM_SINGLE_FLIGHT_RESULT_SECONDS * 1000)
+        self.poll_seconds = settings.OSRM_SINGLE_FLIGHT_POLL_SECONDS
+        # Followers in other workers wait about as long as the lock holder's
+        # OSRM call may take, or until their own timeout runs out
+        self.wait_seconds = settings.OSRM_TIMEOUT_SECONDS + 1
+
+        self._flights: Dict[str, Future] = {}
+        self._async_flights: Dict[Tuple[int, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._redis = None
+        self._async_redis: Dict[int, Tuple[asyncio.AbstractEventLoop, Any]] = {}
+        self._redis_retry_at = 0.0
+        self.coalesced = 0
+
+    def key(self, service: str, coordinates: Sequence[Tuple[float, float]], params: Dict[str, Any]) -> str:
+        """Quantize a lookup so requests for practically the same points share a key"""
+        cells = ";".join(
+            f"{round(lat / self.grid_degrees)},{round(lon / self.grid_degrees)}"
+            for lat, lon in coordinates
+        )
+        query = "&".join(f"{name}={value}" for name, value in sorted(params.items()))
+        return hashlib.sha1(f"{service}/{cells}?{query}".encode("utf-8")).hexdigest()
+
+    def do(self, key: str, call: Callable[[Optional[float]], Dict[str, Any]], timeout: float = None) -> Dict[str, Any]:
+        """
+        Run call(seconds left) for key, or wait for the identical call already
+        in flight, all within timeout seconds (None for no limit)
+        """
+        deadline = self._deadline(timeout)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            osrm_metrics.record_coalesced()
+            return flight.result(timeout=self._time_left(deadline))
+
+        try:
+            result = self._across_workers(key, call, deadline)
+            flight.set_result(result)
+            return result
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    async def do_async(self, key: str, call: Callable[[Optional[float]], Awaitable[Dict[str, Any]]],
+                       timeout: float = None) -> Dict[str, Any]:
+        """Async version of do for callers on an event loop"""
+        deadline = self._deadline(timeout)
+        # Futures belong to the loop that created them
+        flight_key = (id(asyncio.get_running_loop()), key)
+        counted = False
+        while True:
+            flight = self._async_flights.get(flight_key)
+            if flight is None:
+                break
+            if not counted:
+                counted = True
+                self.coalesced += 1
+                osrm_metrics.record_coalesced()
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight), self._time_left(deadline))
+            except _LeaderCancelled:
+                # The leader's caller went away; the first follower to get here leads instead
+                continue
+
+        flight = self._async_flights[flight_key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._across_workers_async(key, call, deadline)
+            flight.set_result(result)
+            return result
+        except BaseException as e:
+            flight.set_exception(_LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            # Followers see the failure; nobody else needs to retrieve it
+            flight.exception()
+            raise
+        finally:
+            if self._async_flights.get(flight_key) is flight:
+                del self._async_flights[flight_key]
+
+    @staticmethod
+    def _deadline(timeout: Optional[float]) -> Optional[float]:
+        return time.monotonic() + timeout if timeout is not None else None
+
+    @staticmethod
+    def _time_left(deadline: Optional[float]) -> Optional[float]:
+        """Seconds left until deadline (None for no limit), raising TimeoutError once it has passed"""
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Timed out waiting for an identical OSRM lookup")
+        return remaining
+
+    def _across_workers(self, key: str, call: Callable[[Optional[float]], Dict[str, Any]],
+                        deadline: Optional[float]) -> Dict[str, Any]:
+        client = self._client()
+        acquired = self._acquire(client, key)
+        if acquired is False:
+            published = self._wait_for(client, key, deadline)
+            return published if published is not None else call(self._time_left(deadline))
+
+        result = None
+        try:
+            result = call(self._time_left(deadline))
+            return result
+        finally:
+            if acquired:
+                self._release(client, key, result)
+
+    async def _across_workers_async(self, key: str, call: Callable[[Optional[float]], Awaitable[Dict[str, Any]]],
+                                    deadline: Optional[float]) -> Dict[str, Any]:
+        client = self._async_client()
+        acquired = await self._acquire_async(client, key)
+        if acquired is False:
+            published = await self._wait_for_async(client, key, deadline)
+            return published if published is not None else await call(self._time_left(deadline))
+
+        result = None
+        try:
+            result = await call(self._time_left(deadline))
+            return result
+        finally:
+            if acquired:
+                await self._release_async(client, key, result)
+
+    def _acquire(self, client, key: str) -> Optional[bool]:
+        """Take the cross-worker lock: True if taken, False if another worker holds it, None without Redis"""
+        if client is None:
+            return None
+        try:
+            if client.set(FLIGHT_KEY_PREFIX + key, self._token, nx=True, px=self.lock_ms):
+                return True
+            # Ask the holder to publish its response
+            client.set(FLIGHT_KEY_PREFIX + key + ":waiters", 1, px=self.lock_ms)
+            return False
+        except Exception as e:
+            self._disable_redis(e)
+            return None
+
+    async def _acquire_async(self, client, key: str) -> Optional[bool]:
+        if client is None:
+            return None
+        try:
+            if await client.set(FLIGHT_KEY_PREFIX + key, self._token, nx=True, px=self.lock_ms):
+                return True
+            await client.set(FLIGHT_KEY_PREFIX + key + ":waiters", 1, px=self.lock_ms)
+            return False
+        except Exception as e:
+            self._disable_redis(e)
+            return None
+
+    def _release(self, client, key: str, result: Dict[str, Any]):
+        """Drop the lock, publishing the response first if another worker waits for it"""
+        try:
+            awaited = result is not None and client.exists(FLIGHT_KEY_PREFIX + key + ":waiters")
+            pipe = client.pipeline(transaction=False)
+            if awaited:
+                pipe.set(FLIGHT_KEY_PREFIX + key + ":result", json.dumps(result), px=self.result_ms)
+            pipe.delete(FLIGHT_KEY_PREFIX + key, FLIGHT_KEY_PREFIX + key + ":waiters")
+            pipe.execute()
+        except Exception as e:
+            self._disable_redis(e)
+
+    async def _release_async(self, client, key: str, result: Dict[str, Any]):
+        try:
+            awaited = result is not None and await client.exists(FLIGHT_KEY_PREFIX + key + ":waiters")
+            pipe = client.pipeline(transaction=False)
+            if awaited:
+                pipe.set(FLIGHT_KEY_PREFIX + key + ":result", json.dumps(result), px=self.result_ms)
+            pipe.delete(FLIGHT_KEY_PREFIX + key, FLIGHT_KEY_PREFIX + key + ":waiters")
+            await pipe.execute()
+        except Exception as e:
+            self._disable_redis(e)
+
+    def _poll(self, client, key: str) -> Tuple[bool, Any]:
+        """(finished, published result) of another worker's flight"""
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.get(FLIGHT_KEY_PREFIX + key + ":result")
+            pipe.exists(FLIGHT_KEY_PREFIX + key)
+            value, running = pipe.execute()
+        except Exception as e:
+            self._disable_redis(e)
+            return True, None
+        return self._polled(value, running)
+
+    async def _poll_async(self, client, key: str) -> Tuple[bool, Any]:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.get(FLIGHT_KEY_PREFIX + key + ":result")
+            pipe.exists(FLIGHT_KEY_PREFIX + key)
+            value, running = await pipe.execute()
+        except Exception as e:
+            self._disable_redis(e)
+            return True, None
+        return self._polled(value, running)
+
+    def _polled(self, value: Optional[bytes], running: int) -> Tuple[bool, Any]:
+        if value is not None:
+            self.coalesced += 1
+            osrm_metrics.record_coalesced()
+            return True, json.loads(value)
+        return not running, None
+
+    def _wait_end(self, deadline: Optional[float]) -> float:
+        """When a follower stops polling another worker's flight"""
+        end = time.monotonic() + self.wait_seconds
+        return min(end, deadline) if deadline is not None else end
+
+    def _wait_for(self, client, key: str, deadline: Optional[float]):
+        end = self._wait_end(deadline)
+        while time.monotonic() < end:
+            finished, result = self._poll(client, key)
+            if finished:
+                return result
+            time.sleep(self.poll_seconds)
+        return None
+
+    async def _wait_for_async(self, client, key: str, deadline: Optional[float]):
+        end = self._wait_end(deadline)
+        while time.monotonic() < end:
+            finished, result = await self._poll_async(client, key)
+            if finished:
+                return result
+            await asyncio.sleep(self.poll_seconds)
+        return None
+
+    def _client(self):
+        """Lazily connect to Redis, backing off for a while after a failure"""
+        if not self.across_workers:
+            return None
+        if self._redis is not None:
+            return self._redis
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+
+        try:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        except Exception as e:
+            self._disable_redis(e)
+        return self._redis
+
+    def _async_client(self):
+        """redis.asyncio client of the running event loop, whose connections cannot be shared with other loops"""
+        if not self.across_workers:
+            return None
+        loop = asyncio.get_running_loop()
+        owner, client = self._async_redis.get(id(loop), (None, None))
+        if owner is loop:
+            return client
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+
+        try:
+            import redis.asyncio
+            client = redis.asyncio.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        except Exception as e:
+            self._disable_redis(e)
+            return None
+        self._async_redis = {
+            loop_id: entry for loop_id, entry in self._async_redis.items() if not entry[0].is_closed()
+        }
+        self._async_redis[id(loop)] = (loop, client)
+        return client
+
+    def _disable_redis(self, error: Exception):
+        logger.warning(f"OSRM request coalescing falling back to this worker only: {error}")
+        self._redis = None
+        self._async_redis = {}
+        self._redis_retry_at = time.monotonic() + 30
+
+
+single_flight = SingleFlight()
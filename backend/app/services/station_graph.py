@@ -0,0 +1,283 @@
+import io
+import time
+import logging
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.services.osrm_client import OSRMClient
+from app.services.station_index import _haversine_km
+
+logger = logging.getLogger(__name__)
+
+STATION_GRAPH_KEY = "stations:graph"
+STATION_GRAPH_VERSION_KEY = "stations:graph:version"
+STATION_GRAPH_LOCK_KEY = "stations:graph:lock"
+
+# OSRM's default --max-table-size is 100 coordinates per request
+TABLE_MAX_COORDINATES = 100
+
+# (neighbour station id, road distance in km, duration in minutes)
+Edge = Tuple[int, float, float]
+
+
+class StationGraph:
+    """
+    Sparse station-to-station road graph in CSR form.
+
+    Row i holds every station reachable by road from station_ids[i] within
+    max_range km: indices[indptr[i]:indptr[i + 1]] are positions into
+    station_ids, with matching distances (km) and durations (minutes).
+    """
+
+    def __init__(
+        self,
+        station_ids: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        distances: np.ndarray,
+        durations: np.ndarray,
+        max_range: float,
+        version: int = 0
+    ):
+        self.station_ids = station_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.distances = distances
+        self.durations = durations
+        self.max_range = max_range
+        self.version = version
+        self._positions = {int(station_id): i for i, station_id in enumerate(station_ids)}
+        self._transposed: Optional["StationGraph"] = None
+
+    @classmethod
+    def from_rows(cls, rows: Dict[int, Iterable[Edge]], max_range: float, version: int = 0) -> "StationGraph":
+        """Pack {station_id: [(neighbour_id, distance, duration), ...]} into CSR arrays"""
+        station_ids = np.array(sorted(rows), dtype=np.int64)
+        positions = {int(station_id): i for i, station_id in enumerate(station_ids)}
+
+        indptr = [0]
+        indices, distances, durations = [], [], []
+        for station_id in station_ids:
+            for neighbour_id, distance, duration in sorted(rows[int(station_id)]):
+                # Edges into stations that left the graph are dropped
+                if neighbour_id in positions:
+                    indices.append(positions[neighbour_id])
+                    distances.append(distance)
+                    durations.append(duration)
+            indptr.append(len(indices))
+
+        return cls(
+            station_ids=station_ids,
+            indptr=np.array(indptr, dtype=np.int64),
+            indices=np.array(indices, dtype=np.int32),
+            distances=np.array(distances, dtype=np.float32),
+            durations=np.array(durations, dtype=np.float32),
+            max_range=max_range,
+            version=version
+        )
+
+    def to_rows(self) -> Dict[int, List[Edge]]:
+        """Unpack the CSR arrays into mutable per-station rows"""
+        return {
+            int(station_id): self.neighbours(int(station_id))
+            for station_id in self.station_ids
+        }
+
+    def __contains__(self, station_id: int) -> bool:
+        return station_id in self._positions
+
+    def __len__(self) -> int:
+        return len(self.station_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    def neighbours(self, station_id: int) -> List[Edge]:
+        """Outgoing edges of a station, or an empty list if it is not in the graph"""
+        position = self._positions.get(station_id)
+        if position is None:
+            return []
+
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return [
+            (int(self.station_ids[j]), float(d), float(t))
+            for j, d, t in zip(self.indices[start:end], self.distances[start:end], self.durations[start:end])
+        ]
+
+    def incoming(self, station_id: int) -> List[Edge]:
+        """Edges into a station, as (source id, distance, duration)"""
+        if self._transposed is None:
+            self._transposed = self.transposed()
+        return self._transposed.neighbours(station_id)
+
+    def transposed(self) -> "StationGraph":
+        """The same graph with every edge reversed"""
+        count = len(self.station_ids)
+        sources = np.repeat(np.arange(count, dtype=np.int32), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind="stable")
+
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=count), out=indptr[1:])
+
+        return StationGraph(
+            station_ids=self.station_ids,
+            indptr=indptr,
+            indices=sources[order],
+            distances=self.distances[order],
+            durations=self.durations[order],
+            max_range=self.max_range,
+            version=self.version
+        )
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            station_ids=self.station_ids,
+            indptr=self.indptr,
+            indices=self.indices,
+            distances=self.distances,
+            durations=self.durations,
+            max_range=np.array(self.max_range, dtype=np.float64),
+            version=np.array(self.version, dtype=np.int64)
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, value: bytes) -> "StationGraph":
+        with np.load(io.BytesIO(value)) as data:
+            return cls(
+                station_ids=data["station_ids"],
+                indptr=data["indptr"],
+                indices=data["indices"],
+                distances=data["distances"],
+                durations=data["durations"],
+                max_range=float(data["max_range"]),
+                version=int(data["version"])
+            )
+
+
+def measure_edges(
+    osrm_client: OSRMClient,
+    sources: Sequence[Tuple[int, float, float]],
+    destinations: Sequence[Tuple[int, float, float]]
+) -> List[Tuple[int, int, float, float]]:
+    """
+    Road distance and duration for every (source, destination) pair of
+    (station_id, latitude, longitude) points, using as few Table calls as
+    OSRM's table size limit allows. Unroutable pairs are left out.
+    """
+    edges = []
+    half = TABLE_MAX_COORDINATES // 2
+
+    for i in range(0, len(sources), half):
+        source_chunk = sources[i:i + half]
+        for j in range(0, len(destinations), TABLE_MAX_COORDINATES - len(source_chunk)):
+            destination_chunk = destinations[j:j + TABLE_MAX_COORDINATES - len(source_chunk)]
+            points = list(source_chunk) + list(destination_chunk)
+
+            data = osrm_client.table(
+                [(lat, lon) for _, lat, lon in points],
+                sources=list(range(len(source_chunk))),
+                destinations=list(range(len(source_chunk), len(points))),
+                annotations="distance,duration"
+            )
+            if data.get("code") != "Ok":
+                raise ValueError(f"OSRM Table API returned {data.get('code')}")
+
+            for si, (source_id, _, _) in enumerate(source_chunk):
+                for di, (destination_id, _, _) in enumerate(destination_chunk):
+                    distance = data["distances"][si][di]
+                    duration = data["durations"][si][di]
+                    if source_id != destination_id and distance is not None and duration is not None:
+                        edges.append((source_id, destination_id, distance / 1000, duration / 60))
+
+    return edges
+
+
+def stations_within(
+    points: Sequence[Tuple[int, float, float]],
+    lat: float,
+    lon: float,
+    max_range: float
+) -> List[Tuple[int, float, float]]:
+    """(station_id, latitude, longitude) points within max_range km great-circle distance"""
+    if not points:
+        return []
+    coords = np.radians(np.array([[p_lat, p_lon] for _, p_lat, p_lon in points]))
+    distances = _haversine_km(lat, lon, coords)
+    return [point for point, distance in zip(points, distances) if distance <= max_range]
+
+
+class StationGraphStore:
+    """
+    Per-process access to the station graph persisted in Redis by the Celery
+    graph tasks. The graph is reloaded only when its version key changes, and
+    the version is checked at most every STATION_GRAPH_REFRESH_SECONDS.
+    """
+
+    def __init__(self, redis_url: str = None, refresh_seconds: float = None):
+        self.redis_url = redis_url if redis_url is not None else settings.REDIS_URL
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else settings.STATION_GRAPH_REFRESH_SECONDS
+        )
+        self._graph: Optional[StationGraph] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self._client = None
+
+    def get(self) -> Optional[StationGraph]:
+        """Return the latest persisted graph, or None if none has been built yet"""
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self._graph
+
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.refresh_seconds:
+                self._checked_at = time.monotonic()
+                self._refresh()
+        return self._graph
+
+    def save(self, graph: StationGraph):
+        """Persist a graph for every worker and bump its version"""
+        client = self._redis()
+        pipe = client.pipeline()
+        pipe.set(STATION_GRAPH_KEY, graph.to_bytes())
+        pipe.set(STATION_GRAPH_VERSION_KEY, graph.version)
+        pipe.execute()
+
+    def load(self) -> Optional[StationGraph]:
+        """Read the persisted graph straight from Redis"""
+        value = self._redis().get(STATION_GRAPH_KEY)
+        return StationGraph.from_bytes(value) if value is not None else None
+
+    def lock(self, blocking_timeout: float = None):
+        """
+        Redis lock held by the graph tasks while they read, patch and write
+        the graph, so concurrent updates and rebuilds do not drop each other's edges
+        """
+        return self._redis().lock(
+            STATION_GRAPH_LOCK_KEY,
+            timeout=settings.STATION_GRAPH_LOCK_SECONDS,
+            blocking_timeout=blocking_timeout
+        )
+
+    def _refresh(self):
+        try:
+            version = self._redis().get(STATION_GRAPH_VERSION_KEY)
+            if version is None:
+                self._graph = None
+            elif self._graph is None or int(version) != self._graph.version:
+                self._graph = self.load()
+        except Exception as e:
+            logger.warning(f"Could not refresh the station graph: {e}")
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.redis_url, socket_timeout=2, socket_connect_timeout=0.5)
+        return self._client
+
+
+station_graph_store = StationGraphStore()
@@ -0,0 +1,169 @@
+from app.celery_app import celery_app
+from app.database.session import SessionLocal
+from app.models.stations import Station
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.osrm_client import get_osrm_client
+from app.services.station_graph import (
+    StationGraph,
+    measure_edges,
+    station_graph_store,
+    stations_within
+)
+from app.core.config import settings
+from redis.exceptions import LockError
+import requests
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _load_station_points():
+    """(id, latitude, longitude) of every available station"""
+    db = SessionLocal()
+    try:
+        return [
+            (station_id, latitude, longitude)
+            for station_id, latitude, longitude in db.query(
+                Station.id, Station.latitude, Station.longitude
+            ).filter(Station.is_available == True).all()
+        ]
+    finally:
+        db.close()
+
+
+def _new_version() -> int:
+    return int(time.time() * 1000)
+
+
+def _source_batches(points, max_range: float):
+    """
+    Split the stations into batches of STATION_GRAPH_SOURCES_PER_CALL nearby
+    ones, so each batch shares most of its neighbours in one Table call
+    """
+    cell = max_range / 111.0
+    ordered = sorted(points, key=lambda point: (int(point[1] // cell), point[2]))
+    size = max(1, settings.STATION_GRAPH_SOURCES_PER_CALL)
+    return [ordered[start:start + size] for start in range(0, len(ordered), size)]
+
+
+def _measure_with_backoff(osrm_client, sources, destinations, lock):
+    """
+    measure_edges that waits out OSRM failures and an open circuit breaker
+    instead of failing, keeping the graph lock alive while it waits
+    """
+    delay = max(settings.STATION_GRAPH_BACKOFF_SECONDS, osrm_client.breaker.open_seconds)
+    for attempt in range(settings.STATION_GRAPH_MAX_RETRIES + 1):
+        try:
+            return measure_edges(osrm_client, sources, destinations)
+        except (CircuitOpenError, requests.RequestException) as e:
+            if attempt == settings.STATION_GRAPH_MAX_RETRIES:
+                raise
+            wait = min(delay, settings.STATION_GRAPH_MAX_BACKOFF_SECONDS)
+            logger.warning(f"Station graph build backing off for {wait:.0f}s: {e}")
+            lock.reacquire()
+            time.sleep(wait)
+            lock.reacquire()
+            delay *= 2
+
+
+def _build_graph(lock) -> StationGraph:
+    max_range = settings.MAX_SEARCH_RADIUS
+    points = _load_station_points()
+    osrm_client = get_osrm_client(settings.OSRM_SERVER_URL)
+
+    rows = {station_id: [] for station_id, _, _ in points}
+    for batch in _source_batches(points, max_range):
+        neighbours = {}
+        for _, lat, lon in batch:
+            for point in stations_within(points, lat, lon, max_range):
+                neighbours.setdefault(point[0], point)
+
+        edges = _measure_with_backoff(osrm_client, batch, list(neighbours.values()), lock)
+        for source_id, destination_id, distance, duration in edges:
+            if distance <= max_range:
+                rows[source_id].append((destination_id, distance, duration))
+        lock.reacquire()
+
+    graph = StationGraph.from_rows(rows, max_range=max_range, version=_new_version())
+    station_graph_store.save(graph)
+
+    logger.info(f"Built station graph with {len(graph)} stations and {graph.edge_count} edges")
+    return graph
+
+
+def _release(lock):
+    try:
+        lock.release()
+    except LockError:
+        logger.warning("Station graph lock expired before it was released")
+
+
+@celery_app.task
+def build_station_graph():
+    """
+    Rebuild the whole station graph: road distance and duration from every
+    available station to every other one within MAX_SEARCH_RADIUS
+    """
+    lock = station_graph_store.lock()
+    lock.acquire()
+    try:
+        graph = _build_graph(lock)
+    finally:
+        _release(lock)
+    return {"status": "success", "stations": len(graph), "edges": graph.edge_count}
+
+
+@celery_app.task(bind=True, max_retries=120, default_retry_delay=30)
+def update_station_graph(self, station_id: int):
+    """
+    Patch the station graph after one station was added, edited or removed.
+
+    Only the edges touching that station are measured again: one Table call
+    from it to its neighbours and one from its neighbours back to it. The
+    patch runs under the graph lock; while a rebuild or another update holds
+    it, or OSRM is unavailable, the task is retried later.
+    """
+    lock = station_graph_store.lock(blocking_timeout=10)
+    if not lock.acquire():
+        raise self.retry()
+
+    try:
+        graph = station_graph_store.load()
+        if graph is None:
+            logger.info("No station graph yet, building it from scratch")
+            graph = _build_graph(lock)
+            return {"status": "success", "stations": len(graph), "edges": graph.edge_count}
+
+        max_range = graph.max_range
+        points = _load_station_points()
+        station = next((point for point in points if point[0] == station_id), None)
+
+        rows = graph.to_rows()
+        rows.pop(station_id, None)
+        for station_edges in rows.values():
+            station_edges[:] = [edge for edge in station_edges if edge[0] != station_id]
+
+        if station is not None:
+            _, lat, lon = station
+            neighbours = [point for point in stations_within(points, lat, lon, max_range) if point[0] != station_id]
+            osrm_client = get_osrm_client(settings.OSRM_SERVER_URL)
+
+            try:
+                edges = measure_edges(osrm_client, [station], neighbours) + measure_edges(osrm_client, neighbours, [station])
+            except (CircuitOpenError, requests.RequestException) as e:
+                logger.warning(f"Could not measure station {station_id} for the graph, retrying: {e}")
+                raise self.retry(countdown=osrm_client.breaker.open_seconds)
+
+            rows[station_id] = []
+            for source_id, destination_id, distance, duration in edges:
+                if distance <= max_range and source_id in rows:
+                    rows[source_id].append((destination_id, distance, duration))
+
+        graph = StationGraph.from_rows(rows, max_range=max_range, version=_new_version())
+        station_graph_store.save(graph)
+    finally:
+        _release(lock)
+
+    logger.info(f"Updated station graph for station {station_id}: {graph.edge_count} edges")
+    return {"status": "success", "stations": len(graph), "edges": graph.edge_count}
@@ -0,0 +1,735 @@
+import copy
+import json
+import time
+import uuid
+import logging
+import threading
+import numpy as np
+from typing import Iterable, List, Optional, Sequence, Tuple
+from sklearn.neighbors import BallTree
+from sqlalchemy.orm import joinedload
+from app.core.config import settings
+from app.database.session import SessionLocal
+from app.models.stations import Station
+from app.utils.polyline import simplify
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+STATION_CHANGES_CHANNEL = "stations:changes"
+STATION_CATALOG_VERSION_KEY = "stations:catalog:version"
+
+# Minimum charger power (kW) of each pre-partitioned nearest-station index
+POWER_TIERS = (7, 22, 50, 150)
+
+# Corridor lines are simplified to this share of the corridor radius
+CORRIDOR_SIMPLIFY_SHARE = 0.05
+# Largest (stations, segments) matrix measured at once by query_corridor
+CORRIDOR_CHUNK_CELLS = 1_000_000
+
+
+def _haversine_km(lat: float, lon: float, coords_rad: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from a point to an array of (lat, lon) radians"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    dlat = coords_rad[:, 0] - lat1
+    dlon = coords_rad[:, 1] - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(coords_rad[:, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _haversine_pairs_km(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km between matching rows of two (lat, lon) degree arrays"""
+    starts, ends = np.radians(starts), np.radians(ends)
+    dlat = ends[:, 0] - starts[:, 0]
+    dlon = ends[:, 1] - starts[:, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(starts[:, 0]) * np.cos(ends[:, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _locate_on_line(points: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                    lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Project (lat, lon) points onto the polyline made of the given segments;
+    returns each point's km along the line and km off it. Every segment is
+    projected flat around its own latitude, which is accurate at corridor
+    scale on lines of any length.
+    """
+    km_per_degree = EARTH_RADIUS_KM * np.pi / 180
+    scale = np.cos(np.radians((starts[:, 0] + ends[:, 0]) / 2))
+
+    # (points, segments) offsets from each segment start, in km
+    px = (points[:, None, 1] - starts[None, :, 1]) * scale * km_per_degree
+    py = (points[:, None, 0] - starts[None, :, 0]) * km_per_degree
+    ux = (ends[:, 1] - starts[:, 1]) * scale * km_per_degree
+    uy = (ends[:, 0] - starts[:, 0]) * km_per_degree
+    squared = ux ** 2 + uy ** 2
+
+    t = np.clip((px * ux + py * uy) / np.where(squared > 0, squared, 1), 0, 1)
+    distances = np.hypot(px - t * ux, py - t * uy)
+    nearest = np.argmin(distances, axis=1)
+    rows = np.arange(len(points))
+
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+    along = cumulative[nearest] + t[rows, nearest] * lengths[nearest]
+    return along, distances[rows, nearest]
+
+
+# Bits of StationArrays.flags
+STATION_AVAILABLE = 1
+STATION_MAINTENANCE = 2
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+class StationArrays:
+    """
+    Struct-of-arrays copy of a station sequence, one NumPy array per
+    attribute indexed by the station's position in the sequence.
+
+    Charging configs are laid out back to back: the configs of the station
+    at position i are config_start[i]:config_start[i + 1] of the config
+    arrays, and config_type holds indexes into charging_types (-1 for
+    none). The arrays are read-only, so one copy can be shared by every
+    request without touching the ORM rows it was built from.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        flags: np.ndarray,
+        config_start: np.ndarray,
+        config_type: np.ndarray,
+        config_power: np.ndarray,
+        config_cost: np.ndarray,
+        charging_types: Tuple[str, ...]
+    ):
+        self.ids = _frozen(ids.astype(np.int64, copy=False))
+        self.latitudes = _frozen(latitudes.astype(np.float64, copy=False))
+        self.longitudes = _frozen(longitudes.astype(np.float64, copy=False))
+        self.flags = _frozen(flags.astype(np.uint8, copy=False))
+        self.config_start = _frozen(config_start.astype(np.int64, copy=False))
+        self.config_type = _frozen(config_type.astype(np.int16, copy=False))
+        self.config_power = _frozen(config_power.astype(np.float32, copy=False))
+        self.config_cost = _frozen(config_cost.astype(np.float32, copy=False))
+        self.charging_types = tuple(charging_types)
+
+    @classmethod
+    def from_stations(cls, stations: Sequence[Station]) -> "StationArrays":
+        """Read every attribute the searches need off the ORM rows, once"""
+        charging_types = tuple(sorted({
+            config.charging_type
+            for station in stations
+            for config in station.charging_configs
+            if config.charging_type
+        }))
+        codes = {charging_type: i for i, charging_type in enumerate(charging_types)}
+        configs = [config for station in stations for config in station.charging_configs]
+        count = len(stations)
+
+        return cls(
+            ids=np.fromiter((s.id for s in stations), dtype=np.int64, count=count),
+            latitudes=np.fromiter((s.latitude for s in stations), dtype=np.float64, count=count),
+            longitudes=np.fromiter((s.longitude for s in stations), dtype=np.float64, count=count),
+            flags=np.fromiter(
+                ((STATION_AVAILABLE if s.is_available else 0) | (STATION_MAINTENANCE if s.is_maintenance else 0)
+                 for s in stations),
+                dtype=np.uint8, count=count
+            ),
+            config_start=np.concatenate((
+                [0], np.cumsum(np.fromiter((len(s.charging_configs) for s in stations), dtype=np.int64, count=count))
+            )),
+            config_type=np.fromiter((codes.get(c.charging_type, -1) for c in configs), dtype=np.int16, count=len(configs)),
+            config_power=np.fromiter((c.power_output or 0 for c in configs), dtype=np.float32, count=len(configs)),
+            config_cost=np.fromiter(
+                (c.cost_per_kwh if c.cost_per_kwh is not None else np.nan for c in configs),
+                dtype=np.float32, count=len(configs)
+            ),
+            charging_types=charging_types
+        )
+
+    @classmethod
+    def concatenate(cls, first: "StationArrays", second: "StationArrays") -> "StationArrays":
+        """The stations of first followed by those of second"""
+        charging_types = tuple(sorted(set(first.charging_types) | set(second.charging_types)))
+
+        def recoded(arrays):
+            lookup = np.array([charging_types.index(t) for t in arrays.charging_types] + [-1], dtype=np.int16)
+            return lookup[arrays.config_type]
+
+        return cls(
+            ids=np.concatenate((first.ids, second.ids)),
+            latitudes=np.concatenate((first.latitudes, second.latitudes)),
+            longitudes=np.concatenate((first.longitudes, second.longitudes)),
+            flags=np.concatenate((first.flags, second.flags)),
+            config_start=np.concatenate((first.config_start, second.config_start[1:] + first.config_start[-1])),
+            config_type=np.concatenate((recoded(first), recoded(second))),
+            config_power=np.concatenate((first.config_power, second.config_power)),
+            config_cost=np.concatenate((first.config_cost, second.config_cost)),
+            charging_types=charging_types
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def in_maintenance(self) -> np.ndarray:
+        return (self.flags & STATION_MAINTENANCE) != 0
+
+    def coordinates(self, positions: np.ndarray = None) -> np.ndarray:
+        """(lat, lon) radians of the stations at positions, or of all of them"""
+        if positions is None:
+            return np.radians(np.column_stack((self.latitudes, self.longitudes)))
+        return np.radians(np.column_stack((self.latitudes[positions], self.longitudes[positions])))
+
+    def point(self, position: int) -> Tuple[float, float]:
+        """(lat, lon) degrees of the station at a position"""
+        return float(self.latitudes[position]), float(self.longitudes[position])
+
+    def matches(self, positions: np.ndarray, charging_type: str = None, min_power: float = None) -> np.ndarray:
+        """Which of the stations at positions have a charger of charging_type with at least min_power"""
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.config_start[positions]
+        counts = self.config_start[positions + 1] - starts
+        # Gather the configs of every station, tagged with its row in positions
+        owners = np.repeat(np.arange(len(positions)), counts)
+        configs = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+        ok = np.ones(len(configs), dtype=bool)
+        if charging_type is not None:
+            if charging_type not in self.charging_types:
+                return np.zeros(len(positions), dtype=bool)
+            ok &= self.config_type[configs] == self.charging_types.index(charging_type)
+        if min_power is not None:
+            ok &= self.config_power[configs] >= min_power
+        return np.bincount(owners[ok], minlength=len(positions)) > 0
+
+
+class StationSnapshot:
+    """
+    Immutable view of the station catalog with prebuilt spatial indexes.
+
+    A snapshot is built once and then shared by every request in the worker,
+    so requests only pay for tree lookups, never for tree construction.
+    Station changes are layered on top of the base trees as a small delta
+    (added stations plus tombstoned ids) until the snapshot is compacted.
+
+    Available stations are copied into StationArrays, base stations first
+    and added ones after them, and the searches work on their positions in
+    it; station(position) turns a position back into its ORM row. Routable
+    stations are also partitioned by charging type and by the POWER_TIERS
+    their chargers reach, with one tree per (type, tier) pair, so filtered
+    nearest-station queries are a single tree lookup too.
+
+    With indexed=False no trees are built: the snapshot only holds the
+    arrays of a few rows prefiltered elsewhere, such as a database radius
+    search, for an optimizer to measure.
+    """
+
+    def __init__(self, stations: Sequence[Station], version: int = 0, indexed: bool = True):
+        self.version = version
+        self._index_base(stations, indexed)
+        self._set_delta((), frozenset())
+
+    @staticmethod
+    def _build_tree(coords: np.ndarray) -> Optional[BallTree]:
+        """Build a haversine BallTree over (lat, lon) radians"""
+        return BallTree(coords, metric='haversine') if len(coords) else None
+
+    def _index_base(self, stations: Sequence[Station], indexed: bool = True):
+        self._base_stations = tuple(stations)
+        self._base_available = tuple(s for s in self._base_stations if s.is_available)
+        self._base_arrays = StationArrays.from_stations(self._base_available)
+
+        # Tree indexes of the base trees are positions in the arrays
+        self.station_coords_array = self._base_arrays.coordinates()
+        self.spatial_index = None
+        self.routable_index = None
+        self._partitions = {}
+        if not indexed:
+            return
+
+        self.spatial_index = self._build_tree(self.station_coords_array)
+        routable = np.flatnonzero(~self._base_arrays.in_maintenance)
+        for charging_type in (None, *self._base_arrays.charging_types):
+            for tier in (None, *POWER_TIERS):
+                members = routable
+                if charging_type is not None or tier is not None:
+                    members = routable[self._base_arrays.matches(routable, charging_type, tier)]
+                self._partitions[(charging_type, tier)] = (
+                    members, self._build_tree(self.station_coords_array[members])
+                )
+        self.routable_index = self._partitions[(None, None)][1]
+
+    @staticmethod
+    def _tier(min_power: float = None) -> Optional[float]:
+        """The highest power tier not above min_power"""
+        if min_power is None:
+            return None
+        return max((tier for tier in POWER_TIERS if tier <= min_power), default=None)
+
+    def _set_delta(self, added: Iterable[Station], removed_ids: frozenset):
+        self.added = tuple(added)
+        self.removed_ids = removed_ids
+
+        added_available = tuple(s for s in self.added if s.is_available)
+        self._rows = self._base_available + added_available
+        self.arrays = StationArrays.concatenate(self._base_arrays, StationArrays.from_stations(added_available))
+
+        base_size = len(self._base_available)
+        live = np.ones(len(self.arrays), dtype=bool)
+        if removed_ids:
+            live[:base_size] = ~np.isin(self.arrays.ids[:base_size], np.fromiter(removed_ids, dtype=np.int64))
+        self.live = _frozen(live)
+        self.routable = _frozen(live & ~self.arrays.in_maintenance)
+        self._added_positions = np.arange(base_size, len(self.arrays))
+        self._added_routable_positions = self._added_positions[self.routable[base_size:]]
+
+        # Live positions sorted by station id, for positions_of
+        live_positions = np.flatnonzero(live)
+        order = np.argsort(self.arrays.ids[live_positions], kind="stable")
+        self._positions_by_id = live_positions[order]
+        self._sorted_ids = self.arrays.ids[self._positions_by_id]
+
+        self.stations = tuple(s for s in self._base_stations if s.id not in removed_ids) + self.added
+        self.available_stations = self.stations_at(live_positions)
+        self.routable_stations = self.stations_at(np.flatnonzero(self.routable))
+
+    @property
+    def delta_size(self) -> int:
+        """Number of changes layered over the base trees"""
+        return len(self.added) + len(self.removed_ids)
+
+    def station(self, position: int) -> Station:
+        """The ORM row of the station at a position in the arrays"""
+        return self._rows[position]
+
+    def stations_at(self, positions: Iterable[int]) -> Tuple[Station, ...]:
+        return tuple(self._rows[i] for i in positions)
+
+    def positions_of(self, station_ids: Sequence[int]) -> np.ndarray:
+        """Positions of available stations by id, -1 for ids that are not"""
+        station_ids = np.asarray(station_ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return np.full(len(station_ids), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self._sorted_ids, station_ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[found] == station_ids, self._positions_by_id[found], -1)
+
+    def apply_changes(
+        self,
+        upserts: Sequence[Station] = (),
+        removed_ids: Iterable[int] = (),
+        version: int = None
+    ) -> "StationSnapshot":
+        """
+        Return a new snapshot with stations inserted, replaced or removed.
+
+        The base trees are shared with this snapshot; only the delta is new.
+        Upserted stations that are no longer available are treated as removals.
+        """
+        changed = {s.id for s in upserts} | set(removed_ids)
+
+        snapshot = copy.copy(self)
+        snapshot.version = version if version is not None else self.version + 1
+        snapshot._set_delta(
+            [s for s in self.added if s.id not in changed] + [s for s in upserts if s.is_available],
+            self.removed_ids | changed
+        )
+        return snapshot
+
+    def compacted(self, version: int = None) -> "StationSnapshot":
+        """Fold the delta back into freshly built base trees"""
+        return StationSnapshot(
+            self.stations,
+            version=version if version is not None else self.version + 1
+        )
+
+    def radius_positions(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Positions of available stations within radius_km (great-circle) of a point"""
+        positions = np.array([], dtype=np.int64)
+
+        if self.spatial_index is not None:
+            point = np.radians([[lat, lon]])
+            positions = self.spatial_index.query_radius(point, radius_km / EARTH_RADIUS_KM)[0].astype(np.int64)
+            positions = positions[self.live[positions]]
+
+        if len(self._added_positions):
+            distances = _haversine_km(lat, lon, self.arrays.coordinates(self._added_positions))
+            positions = np.concatenate((positions, self._added_positions[distances <= radius_km]))
+
+        return positions
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> List[Station]:
+        """Return available stations within radius_km (great-circle) of a point"""
+        return list(self.stations_at(self.radius_positions(lat, lon, radius_km)))
+
+    def nearest_positions(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 5,
+        charging_type: str = None,
+        min_power: float = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions of up to k routable stations closest to a point and their
+        great-circle distances in km, optionally only those with a charger of
+        charging_type delivering at least min_power kW
+        """
+        positions = np.array([], dtype=np.int64)
+        distances = np.array([], dtype=float)
+        tier = self._tier(min_power)
+        filtered = charging_type is not None or min_power is not None
+        # Partitions only exist for charging types present in the base trees
+        members, tree = self._partitions.get((charging_type, tier), ((), None))
+        # Powers between two tiers still need checking against min_power
+        exact = tier == min_power
+
+        if tree is not None:
+            point = np.radians([[lat, lon]])
+            # Ask for extra neighbours so tombstoned (or, between tiers,
+            # underpowered) stations cannot crowd out k matching ones
+            k_base = min(k + len(self.removed_ids), len(members))
+            while True:
+                tree_distances, indices = tree.query(point, k=k_base)
+                positions, distances = members[indices[0]], tree_distances[0] * EARTH_RADIUS_KM
+                keep = self.live[positions]
+                if not exact:
+                    keep &= self.arrays.matches(positions, charging_type, min_power)
+                positions, distances = positions[keep], distances[keep]
+                if len(positions) >= k or k_base == len(members):
+                    break
+                k_base = min(k_base * 4, len(members))
+
+        added = self._added_routable_positions
+        if filtered and len(added):
+            added = added[self.arrays.matches(added, charging_type, min_power)]
+        if len(added):
+            positions = np.concatenate((positions, added))
+            distances = np.concatenate((distances, _haversine_km(lat, lon, self.arrays.coordinates(added))))
+
+        order = np.argsort(distances, kind="stable")[:k]
+        return positions[order], distances[order]
+
+    def query_nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 5,
+        charging_type: str = None,
+        min_power: float = None
+    ) -> List[Tuple[Station, float]]:
+        """
+        Return up to k routable stations closest to a point with great-circle
+        distance in km, optionally only those with a charger of charging_type
+        delivering at least min_power kW
+        """
+        positions, distances = self.nearest_positions(lat, lon, k, charging_type, min_power)
+        return list(zip(self.stations_at(positions), distances.tolist()))
+
+    def query_corridor(
+        self,
+        line: Sequence[Tuple[float, float]],
+        radius_km: float,
+        charging_type: str = None,
+        min_power: float = None
+    ) -> List[Tuple[Station, float, float]]:
+        """
+        Return available stations within radius_km of a (lat, lon) polyline as
+        (station, km along the line, km off the line), in driving order,
+        optionally only those with a charger of charging_type delivering at
+        least min_power kW.
+
+        The line is cut into pieces no longer than radius_km and the tree is
+        queried once for all piece midpoints, each with a radius wide enough
+        to cover its whole piece. The candidates are then measured against
+        every segment at once and kept if their nearest one is within range.
+        """
+        # Road geometries have far more vertices than a corridor needs
+        line = np.asarray(line, dtype=float).reshape(-1, 2)
+        line = np.asarray(simplify(line[:, ::-1], radius_km * 1000 * CORRIDOR_SIMPLIFY_SHARE))[:, ::-1]
+        if len(line) == 1:
+            line = np.vstack((line, line))
+        starts, ends = line[:-1], line[1:]
+        lengths = _haversine_pairs_km(starts, ends)
+
+        pieces = np.maximum(np.ceil(lengths / radius_km), 1).astype(int)
+        segment_of_piece = np.repeat(np.arange(len(starts)), pieces)
+        offsets = np.arange(len(segment_of_piece)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        fractions = ((offsets + 0.5) / pieces[segment_of_piece])[:, None]
+        midpoints = starts[segment_of_piece] + (ends - starts)[segment_of_piece] * fractions
+        piece_radius = np.hypot(radius_km, lengths[segment_of_piece] / pieces[segment_of_piece] / 2)
+
+        candidates = np.array([], dtype=np.int64)
+        if self.spatial_index is not None:
+            hits = self.spatial_index.query_radius(np.radians(midpoints), piece_radius / EARTH_RADIUS_KM)
+            if len(hits):
+                candidates = np.unique(np.concatenate(hits)).astype(np.int64)
+            candidates = candidates[self.live[candidates]]
+        candidates = np.concatenate((candidates, self._added_positions))
+        if (charging_type is not None or min_power is not None) and len(candidates):
+            candidates = candidates[self.arrays.matches(candidates, charging_type, min_power)]
+        if not len(candidates):
+            return []
+
+        # Measure in chunks so the (stations, segments) matrices stay small
+        points = np.column_stack((self.arrays.latitudes[candidates], self.arrays.longitudes[candidates]))
+        chunk = max(1, CORRIDOR_CHUNK_CELLS // len(starts))
+        located = [_locate_on_line(points[i:i + chunk], starts, ends, lengths) for i in range(0, len(points), chunk)]
+        along = np.concatenate([a for a, _ in located])
+        off = np.concatenate([o for _, o in located])
+        order = np.argsort(along, kind="stable")
+        return [
+            (self.station(candidates[i]), float(along[i]), float(off[i]))
+            for i in order
+            if off[i] <= radius_km
+        ]
+
+
+class StationIndexService:
+    """
+    Process-wide holder of the current StationSnapshot.
+
+    Each uvicorn worker builds the snapshot lazily on first use and then
+    hands the same immutable object to every request. Station changes are
+    applied as deltas, broadcast to the other workers over Redis, and
+    folded into new trees by a background compaction thread. A full reload
+    from the database only happens after STATION_INDEX_TTL_SECONDS.
+
+    Every change also bumps a cluster-wide catalog version in Redis, which
+    caches of station-dependent results (finished routes) use in their keys.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = None,
+        compact_seconds: float = None,
+        max_delta: int = None
+    ):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.STATION_INDEX_TTL_SECONDS
+        self.compact_seconds = (
+            compact_seconds if compact_seconds is not None else settings.STATION_INDEX_COMPACT_SECONDS
+        )
+        self.max_delta = max_delta if max_delta is not None else settings.STATION_INDEX_MAX_DELTA
+        self._lock = threading.Lock()
+        self._snapshot: Optional[StationSnapshot] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._catalog_version: Optional[int] = None
+        self._catalog_retry_at = 0.0
+        self._origin = uuid.uuid4().hex
+        self._background_started = False
+        self._redis_client = None
+
+    def get_snapshot(self) -> StationSnapshot:
+        """Borrow the current snapshot, building it if missing or expired"""
+        self._start_background()
+
+        snapshot = self._snapshot
+        if snapshot is not None and not self._expired():
+            return snapshot
+
+        with self._lock:
+            # Another thread may have rebuilt it while we waited
+            if self._snapshot is None or self._expired():
+                self._snapshot = self._load()
+            return self._snapshot
+
+    def reload(self) -> StationSnapshot:
+        """Force a rebuild of the snapshot from the database"""
+        with self._lock:
+            self._snapshot = self._load()
+            return self._snapshot
+
+    def invalidate(self):
+        """Drop the current snapshot; the next request rebuilds it"""
+        with self._lock:
+            self._snapshot = None
+
+    def station_changed(self, station_id: int):
+        """Apply an inserted or updated station (including availability and maintenance flips)"""
+        self._station_event("upsert", station_id)
+
+    def station_removed(self, station_id: int):
+        """Apply a deleted station"""
+        self._station_event("remove", station_id)
+
+    def _station_event(self, action: str, station_id: int):
+        # Called after the change is committed, so failures are logged rather than raised
+        try:
+            self._apply_local(action, station_id)
+        except Exception as e:
+            # Rebuild from the database on the next request rather than serve a stale snapshot
+            logger.warning(f"Could not apply station {station_id} to the index, dropping the snapshot: {e}")
+            self.invalidate()
+        try:
+            self._publish(action, station_id, self._bump_catalog_version())
+            self._schedule_graph_update(station_id)
+        except Exception as e:
+            logger.warning(f"Could not broadcast the change of station {station_id}: {e}")
+
+    def catalog_version(self) -> Optional[int]:
+        """Cluster-wide station catalog version, or None if Redis cannot be reached"""
+        if self._catalog_version is None and time.monotonic() >= self._catalog_retry_at:
+            try:
+                self._catalog_version = int(self._redis().get(STATION_CATALOG_VERSION_KEY) or 0)
+            except Exception as e:
+                # Back off so an unreachable Redis does not cost every request a connection attempt
+                self._catalog_retry_at = time.monotonic() + 30
+                logger.warning(f"Could not read the station catalog version: {e}")
+        return self._catalog_version
+
+    def compact(self):
+        """Rebuild the base trees from the current snapshot if it carries a delta"""
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.delta_size:
+            return
+
+        # The trees are built without the lock, which is only held for the swap
+        compacted = snapshot.compacted()
+        with self._lock:
+            # A change applied meanwhile is kept; the next compaction folds it in
+            if self._snapshot is snapshot:
+                compacted.version = self._next_version()
+                self._snapshot = compacted
+
+    def _apply_local(self, action: str, station_id: int):
+        # Nothing to patch until the first request builds a snapshot
+        if self._snapshot is None:
+            return
+
+        station = self._load_station(station_id) if action == "upsert" else None
+
+        with self._lock:
+            if self._snapshot is None:
+                return
+
+            if station is not None:
+                snapshot = self._snapshot.apply_changes(upserts=[station], version=self._next_version())
+            else:
+                snapshot = self._snapshot.apply_changes(removed_ids=[station_id], version=self._next_version())
+
+            self._snapshot = snapshot
+
+        if snapshot.delta_size > self.max_delta:
+            self.compact()
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    def _bump_catalog_version(self) -> Optional[int]:
+        try:
+            self._catalog_version = int(self._redis().incr(STATION_CATALOG_VERSION_KEY))
+        except Exception as e:
+            # Unknown until Redis is back, which keeps result caches from serving stale entries
+            self._catalog_version = None
+            logger.warning(f"Could not bump the station catalog version: {e}")
+        return self._catalog_version
+
+    def _expired(self) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    def _load(self) -> StationSnapshot:
+        db = SessionLocal()
+        try:
+            stations = db.query(Station).options(
+                joinedload(Station.charging_configs)
+            ).filter(Station.is_available == True).all()
+        finally:
+            # Closing without a commit keeps the loaded attributes readable
+            db.close()
+
+        self._loaded_at = time.monotonic()
+        # Re-read the catalog version too in case a change broadcast was missed
+        self._catalog_version = None
+        return StationSnapshot(stations, version=self._next_version())
+
+    def _load_station(self, station_id: int) -> Optional[Station]:
+        db = SessionLocal()
+        try:
+            return db.query(Station).options(
+                joinedload(Station.charging_configs)
+            ).filter(Station.id == station_id).first()
+        finally:
+            db.close()
+
+    def _redis(self):
+        if self._redis_client is None:
+            import redis
+            self._redis_client = redis.Redis.from_url(
+                settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+            )
+        return self._redis_client
+
+    def _publish(self, action: str, station_id: int, catalog_version: Optional[int] = None):
+        """Tell the other workers about a station change"""
+        try:
+            self._redis().publish(STATION_CHANGES_CHANNEL, json.dumps({
+                "origin": self._origin,
+                "action": action,
+                "station_id": station_id,
+                "catalog_version": catalog_version
+            }))
+        except Exception as e:
+            logger.warning(f"Could not broadcast station change {station_id}: {e}")
+
+    def _schedule_graph_update(self, station_id: int):
+        """Queue an incremental rebuild of the precomputed station graph off the request thread"""
+        threading.Thread(
+            target=self._queue_graph_update, args=(station_id,), name="station-graph-update", daemon=True
+        ).start()
+
+    def _queue_graph_update(self, station_id: int):
+        # Imported here because the graph tasks build on this module
+        from app.services.station_graph_tasks import update_station_graph
+        try:
+            # Fail fast instead of retrying the publish while the broker is down
+            update_station_graph.apply_async((station_id,), retry=False)
+        except Exception as e:
+            logger.warning(f"Could not queue station graph update for {station_id}: {e}")
+
+    def _start_background(self):
+        if self._background_started:
+            return
+
+        with self._lock:
+            if self._background_started:
+                return
+            self._background_started = True
+
+        threading.Thread(target=self._compaction_loop, name="station-index-compaction", daemon=True).start()
+        threading.Thread(target=self._listen_loop, name="station-index-listener", daemon=True).start()
+
+    def _compaction_loop(self):
+        while True:
+            time.sleep(self.compact_seconds)
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Station index compaction failed: {e}")
+
+    def _listen_loop(self):
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(STATION_CHANGES_CHANNEL)
+                while True:
+                    # Poll rather than block so reads stay within the socket timeout
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    change = json.loads(message["data"])
+                    if change.get("origin") != self._origin:
+                        self._apply_local(change["action"], change["station_id"])
+                        self._catalog_version = change.get("catalog_version")
+            except Exception as e:
+                logger.warning(f"Station change listener disconnected: {e}")
+                time.sleep(5)
+
+
+station_index = StationIndexService()
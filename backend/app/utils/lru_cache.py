@@ -0,0 +1,96 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class BoundedLRUCache:
+    """
+    Thread-safe LRU cache bounded by an approximate byte budget.
+
+    Every entry is charged the size reported by `sizeof`; the least recently
+    used entries are evicted until the total fits `max_bytes` again. Entries
+    older than `ttl_seconds` are dropped on access. Hit, miss, eviction and
+    expiration counts are kept for monitoring.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float = None,
+        sizeof: Callable[[Any], int] = None
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof or (lambda value: 64)
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value or None, refreshing its recency on a hit"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Insert or replace an entry, evicting old ones to stay within budget"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            # Never let one oversized value flush the whole cache
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, time.monotonic())
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
@@ -0,0 +1,93 @@
+import math
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+
+# Roughly how many meters one degree of latitude spans
+METERS_PER_DEGREE = 111320.0
+
+# Ground resolution of one web-mercator pixel at zoom 0 on the equator
+METERS_PER_PIXEL_ZOOM_0 = 156543.03392
+
+
+def tolerance_for_zoom(zoom: int, latitude: float) -> float:
+    """Simplification tolerance in meters: the size of one map pixel at this zoom and latitude"""
+    return METERS_PER_PIXEL_ZOOM_0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+
+def simplify(coordinates: Sequence[Sequence[float]], tolerance: float) -> List[List[float]]:
+    """
+    Douglas-Peucker simplification of a [lon, lat] line.
+
+    Points are projected to meters around the line's mean latitude, and
+    every point that deviates less than tolerance meters from the simplified
+    line is dropped. The first and last points are always kept.
+    """
+    points = np.asarray(coordinates, dtype=float)
+    if len(points) < 3 or tolerance <= 0:
+        return points.tolist()
+
+    scale = math.cos(math.radians(points[:, 1].mean()))
+    xy = np.column_stack((points[:, 0] * scale, points[:, 1])) * METERS_PER_DEGREE
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        dx, dy = xy[last] - xy[first]
+        offsets = xy[first + 1:last] - xy[first]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            deviation = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            deviation = np.abs(dx * offsets[:, 1] - dy * offsets[:, 0]) / length
+
+        farthest = int(np.argmax(deviation))
+        if deviation[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return points[keep].tolist()
+
+
+def _encode_value(value: int) -> str:
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def encode(coordinates: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """Google encoded polyline of a [lon, lat] line (the format stores lat, lon pairs)"""
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lon = 0
+    for lon, lat in coordinates:
+        lat_value, lon_value = int(round(lat * factor)), int(round(lon * factor))
+        encoded.append(_encode_value(lat_value - previous_lat))
+        encoded.append(_encode_value(lon_value - previous_lon))
+        previous_lat, previous_lon = lat_value, lon_value
+    return "".join(encoded)
+
+
+def geojson_to_polyline(geometry: Optional[Dict[str, Any]], precision: int = 5, zoom: int = None) -> Optional[str]:
+    """
+    Encode a GeoJSON LineString as a polyline, first simplified to one map
+    pixel at the given zoom level if one is given
+    """
+    if not geometry or not geometry.get("coordinates"):
+        return None
+
+    coordinates = geometry["coordinates"]
+    if zoom is not None:
+        latitude = sum(lat for _, lat in coordinates) / len(coordinates)
+        coordinates = simplify(coordinates, tolerance_for_zoom(zoom, latitude))
+    return encode(coordinates, precision)
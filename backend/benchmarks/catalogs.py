@@ -0,0 +1,163 @@
+import re
+import json
+import numpy as np
+from pathlib import Path
+from typing import List, Sequence, Tuple
+from app.models.stations import Station
+from app.models.chargingCosts import ChargingConfig
+from app.utils.distance_calculator import haversine_distance
+
+# The scraped station list at the repository root
+DATA_FILE = Path(__file__).resolve().parents[2] / "data.txt"
+
+# Catalogs are spread over roughly 220 x 220 km around Hyderabad
+REGION = ((16.4, 18.4), (77.4, 79.6))
+KM_PER_DEGREE = 111.32
+
+# Clustered catalogs: one city cluster per CLUSTER_SIZE stations, each with a
+# spread of CLUSTER_SPREAD_KM, plus a share of stations on highways that run
+# from every city to the data.txt one, within HIGHWAY_SPREAD_KM of the road
+CLUSTER_SIZE = 250
+CLUSTER_SPREAD_KM = 4.0
+HIGHWAY_SHARE = 0.15
+HIGHWAY_SPREAD_KM = 1.0
+
+# Charger mix used when data.txt is not available: (type, power kW, weight)
+DEFAULT_CHARGER_MIX = (("DC", 60.0, 11), ("DC", 15.0, 3), ("DC", 90.0, 1), ("AC", 9.9, 1))
+
+
+def charger_mix() -> List[Tuple[str, float, float]]:
+    """(charging type, power kW, weight) of the chargers listed in data.txt"""
+    try:
+        records = json.loads(DATA_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return list(DEFAULT_CHARGER_MIX)
+
+    counts = {}
+    for record in records:
+        match = re.match(r"\s*(AC|DC)\s*([\d.]+)", record.get("type_of_charging", ""), re.IGNORECASE)
+        if match:
+            charger = (match.group(1).upper(), float(match.group(2)))
+            counts[charger] = counts.get(charger, 0) + 1
+    return [(kind, power, count) for (kind, power), count in sorted(counts.items())] or list(DEFAULT_CHARGER_MIX)
+
+
+def seed_points() -> np.ndarray:
+    """(lat, lon) of the stations in data.txt, the densest cluster of clustered catalogs"""
+    try:
+        records = json.loads(DATA_FILE.read_text(encoding="utf-8"))
+        return np.array([[r["latitude"], r["longitude"]] for r in records], dtype=float)
+    except (OSError, ValueError, KeyError):
+        return np.array([[17.3850, 78.4867]])
+
+
+def _uniform_points(rng: np.random.Generator, count: int) -> np.ndarray:
+    (min_lat, max_lat), (min_lon, max_lon) = REGION
+    return np.column_stack((rng.uniform(min_lat, max_lat, count), rng.uniform(min_lon, max_lon, count)))
+
+
+def _clustered_points(rng: np.random.Generator, count: int) -> np.ndarray:
+    """
+    City clusters with Zipf-distributed sizes around uniformly placed
+    centres, the largest one seeded from the data.txt stations, joined to
+    it by highways
+    """
+    seeds = seed_points()
+    clusters = max(4, count // CLUSTER_SIZE)
+    centres = np.vstack((seeds.mean(axis=0), _uniform_points(rng, clusters - 1)))
+    weights = 1.0 / np.arange(1, clusters + 1)
+
+    highway = int(count * HIGHWAY_SHARE)
+    members = rng.choice(clusters, size=count - highway, p=weights / weights.sum())
+    points = centres[members] + _spread(rng, centres[members, 0], CLUSTER_SPREAD_KM)
+
+    # Keep the real stations themselves in the first cluster
+    first = np.flatnonzero(members == 0)[:len(seeds)]
+    points[first] = seeds[:len(first)]
+
+    roads = rng.integers(1, clusters, size=highway)
+    along = rng.random((highway, 1))
+    on_road = centres[0] + (centres[roads] - centres[0]) * along
+    return np.vstack((points, on_road + _spread(rng, on_road[:, 0], HIGHWAY_SPREAD_KM)))
+
+
+def _spread(rng: np.random.Generator, latitudes: np.ndarray, km: float) -> np.ndarray:
+    """Normally distributed (lat, lon) offsets of about km"""
+    offsets = rng.normal(0.0, km / KM_PER_DEGREE, size=(len(latitudes), 2))
+    offsets[:, 1] /= np.cos(np.radians(latitudes))
+    return offsets
+
+
+def generate_catalog(size: int, layout: str = "clustered", seed: int = 0) -> List[Station]:
+    """
+    A synthetic, detached station catalog; the same arguments always give
+    the same catalog.
+
+    Args:
+        size: Number of stations
+        layout: "clustered" for city clusters like data.txt, "uniform" for
+            stations spread evenly over the region
+        seed: Random seed
+
+    Returns:
+        Station models with charging configs, ids 1..size; about 3% are
+        unavailable and 2% under maintenance
+    """
+    if layout not in ("clustered", "uniform"):
+        raise ValueError(f"Unknown catalog layout: {layout}")
+
+    rng = np.random.default_rng(seed)
+    points = _clustered_points(rng, size) if layout == "clustered" else _uniform_points(rng, size)
+
+    mix = charger_mix()
+    mix_weights = np.array([weight for _, _, weight in mix], dtype=float)
+    chargers = rng.choice(len(mix), size=size, p=mix_weights / mix_weights.sum())
+    states = rng.random(size)
+
+    stations = []
+    for i, ((lat, lon), charger, state) in enumerate(zip(points.tolist(), chargers.tolist(), states.tolist()), start=1):
+        charging_type, power, _ = mix[charger]
+        station = Station(
+            id=i,
+            name=f"Benchmark station {i}",
+            latitude=lat,
+            longitude=lon,
+            is_available=state >= 0.03,
+            is_maintenance=0.03 <= state < 0.05
+        )
+        station.charging_configs = [
+            ChargingConfig(
+                id=i,
+                station_id=i,
+                charging_type=charging_type,
+                connector_type="CCS-2" if charging_type == "DC" else "Type 2",
+                power_output=power,
+                cost_per_kwh=13.0 if charging_type == "DC" else 10.0
+            )
+        ]
+        stations.append(station)
+    return stations
+
+
+def query_points(stations: Sequence[Station], count: int, seed: int = 0) -> List[Tuple[float, float]]:
+    """Points to search from: near stations, within a couple of km, as drivers would be"""
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(len(stations), size=count)
+    jitter = rng.normal(0.0, 2.0 / KM_PER_DEGREE, size=(count, 2))
+    return [
+        (stations[i].latitude + dlat, stations[i].longitude + dlon)
+        for i, (dlat, dlon) in zip(picks.tolist(), jitter.tolist())
+    ]
+
+
+def trips(stations: Sequence[Station], count: int, min_km: float = 60.0, max_km: float = 160.0,
+          seed: int = 0) -> List[Tuple[Tuple[float, float], Tuple[float, float]]]:
+    """Start and end points between min_km and max_km apart, both near stations"""
+    points = query_points(stations, count * 50, seed=seed + 2)
+    pairs = []
+    for start, end in zip(points[0::2], points[1::2]):
+        if min_km <= haversine_distance(*start, *end) <= max_km:
+            pairs.append((start, end))
+            if len(pairs) == count:
+                break
+    return pairs
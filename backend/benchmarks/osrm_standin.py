@@ -0,0 +1,159 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+from app.utils.distance_calculator import haversine_distance
+
+# Road distance is the great-circle distance times DETOUR_FACTOR, driven at AVERAGE_SPEED_KMH
+DETOUR_FACTOR = 1.3
+AVERAGE_SPEED_KMH = 60.0
+# Points per km of the straight-line geometries returned by the Route service
+GEOMETRY_POINTS_PER_KM = 1.0
+
+
+class OSRMStandIn:
+    """
+    Deterministic local stand-in for the OSRM Route and Table services.
+
+    Every answer is derived from great-circle distances, so runs are
+    repeatable and need no road network. Each request sleeps `latency`
+    seconds first to model the network and routing time of a real server,
+    and is counted per service.
+
+    Use it as a context manager; `url` is the osrm_server to pass to the
+    route optimizer.
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {"route": 0, "table": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OSRMStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "OSRMStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def call_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.calls)
+
+    def _count(self, service: str):
+        with self._lock:
+            self.calls[service] = self.calls.get(service, 0) + 1
+
+    @staticmethod
+    def _leg_km(start: Tuple[float, float], end: Tuple[float, float]) -> float:
+        """Road km between two (lon, lat) points"""
+        return haversine_distance(start[1], start[0], end[1], end[0]) * DETOUR_FACTOR
+
+    @classmethod
+    def route(cls, coordinates: Sequence[Tuple[float, float]], params: Dict[str, str]) -> Dict:
+        """Route service answer for (lon, lat) waypoints"""
+        with_geometry = params.get("overview", "simplified") != "false"
+        with_steps = params.get("steps", "false") == "true"
+
+        legs, line = [], []
+        for start, end in zip(coordinates, coordinates[1:]):
+            km = cls._leg_km(start, end)
+            points = max(2, int(km * GEOMETRY_POINTS_PER_KM) + 1)
+            leg_line = [
+                [start[0] + (end[0] - start[0]) * i / (points - 1), start[1] + (end[1] - start[1]) * i / (points - 1)]
+                for i in range(points)
+            ]
+            line.extend(leg_line if not line else leg_line[1:])
+            steps = [{"geometry": {"type": "LineString", "coordinates": leg_line}}] if with_steps else []
+            legs.append({"distance": km * 1000, "duration": km / AVERAGE_SPEED_KMH * 3600, "steps": steps})
+
+        route = {
+            "distance": sum(leg["distance"] for leg in legs),
+            "duration": sum(leg["duration"] for leg in legs),
+            "legs": legs
+        }
+        if with_geometry:
+            route["geometry"] = {"type": "LineString", "coordinates": line}
+        return {
+            "code": "Ok",
+            "routes": [route],
+            "waypoints": [{"location": list(point)} for point in coordinates]
+        }
+
+    @classmethod
+    def table(cls, coordinates: Sequence[Tuple[float, float]], params: Dict[str, str]) -> Dict:
+        """Table service answer for (lon, lat) points"""
+        everything = list(range(len(coordinates)))
+        sources = [int(i) for i in params["sources"].split(";")] if "sources" in params else everything
+        destinations = [int(i) for i in params["destinations"].split(";")] if "destinations" in params else everything
+
+        distances: List[List[float]] = [
+            [cls._leg_km(coordinates[s], coordinates[d]) * 1000 for d in destinations]
+            for s in sources
+        ]
+        answer = {"code": "Ok"}
+        annotations = params.get("annotations", "duration").split(",")
+        if "distance" in annotations:
+            answer["distances"] = distances
+        if "duration" in annotations:
+            answer["durations"] = [[m / 1000 / AVERAGE_SPEED_KMH * 3600 for m in row] for row in distances]
+        return answer
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; without this every
+            # keep-alive response waits on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                # /{service}/v1/{profile}/{lon,lat;lon,lat...}
+                url = urlsplit(self.path)
+                parts = url.path.strip("/").split("/")
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                service = parts[0] if parts else ""
+
+                if len(parts) != 4 or service not in ("route", "table"):
+                    self._reply(400, {"code": "InvalidUrl"})
+                    return
+
+                standin._count(service)
+                if standin.latency:
+                    time.sleep(standin.latency)
+
+                coordinates = [tuple(float(v) for v in point.split(",")) for point in parts[3].split(";")]
+                answer = standin.route(coordinates, params) if service == "route" else standin.table(coordinates, params)
+                self._reply(200, answer)
+
+            def _reply(self, status: int, body: Dict):
+                content = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return Handler
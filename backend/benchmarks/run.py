@@ -0,0 +1,237 @@
+"""
+Route optimizer benchmarks over synthetic station catalogs.
+
+Times find_nearby_stations, find_nearest_station, dijkstra_route and
+get_route_summary of OSRMRouteOptimizer against the local OSRM stand-in and
+prints a JSON report with p50/p95 latency, OSRM calls per operation and
+peak traced memory. Run from backend/ with the app's usual environment:
+
+    python -m benchmarks.run --sizes 1000 10000 --layouts clustered --latency-ms 5 --output results.json
+
+Redis is switched off for the run, so caches and request coalescing stay
+inside this process and every measurement starts from a cold road distance
+cache unless --warm is given. Route searches over the dense 10k and 100k
+catalogs take minutes each; use --operations and --route-iterations to
+keep quick runs to the point queries.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import tracemalloc
+import numpy as np
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Benchmarks run against this process only: no shared Redis caches or locks
+os.environ["REDIS_URL"] = ""
+
+# app.core.config prints the settings it loaded; keep stdout for the JSON report
+with contextlib.redirect_stdout(sys.stderr):
+    from app.core.config import settings
+    from app.services.distance_cache import road_distance_cache
+    from app.services.route_optimizer import OSRMRouteOptimizer
+    from app.services.station_index import StationSnapshot
+    from benchmarks.catalogs import generate_catalog, query_points, trips
+    from benchmarks.osrm_standin import OSRMStandIn
+
+OPERATIONS = ("find_nearby_stations", "find_nearest_station", "dijkstra_route", "get_route_summary")
+
+
+def _log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _measure(
+    cases: Sequence[Any],
+    call: Callable[[Any], Any],
+    standin: OSRMStandIn,
+    reset: Callable[[], None],
+    prepare: Optional[Callable[[Any], Any]] = None
+) -> Dict[str, Any]:
+    """
+    Time call over every case and count the OSRM requests it made, then
+    repeat the first case under tracemalloc for its peak memory.
+
+    prepare, if given, runs untimed before each call and its result is what
+    call receives. Cases whose search finds no route count as failures and
+    are left out of the latencies and call counts.
+    """
+    latencies: List[float] = []
+    calls = {"route": 0, "table": 0}
+    failures = 0
+
+    for case in cases:
+        reset()
+        try:
+            argument = prepare(case) if prepare is not None else case
+        except ValueError:
+            failures += 1
+            continue
+
+        before = standin.call_counts()
+        started = time.perf_counter()
+        try:
+            call(argument)
+        except ValueError:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        after = standin.call_counts()
+        for service in calls:
+            calls[service] += after.get(service, 0) - before.get(service, 0)
+
+    peak_memory = None
+    for case in cases:
+        reset()
+        try:
+            argument = prepare(case) if prepare is not None else case
+        except ValueError:
+            continue
+        tracemalloc.start()
+        try:
+            call(argument)
+        except ValueError:
+            pass
+        finally:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        break
+
+    timed = np.array(latencies) * 1000
+    return {
+        "iterations": len(cases),
+        "failures": failures,
+        "p50_ms": round(float(np.percentile(timed, 50)), 3) if len(timed) else None,
+        "p95_ms": round(float(np.percentile(timed, 95)), 3) if len(timed) else None,
+        "mean_ms": round(float(timed.mean()), 3) if len(timed) else None,
+        "max_ms": round(float(timed.max()), 3) if len(timed) else None,
+        "osrm_calls": {
+            service: round(count / len(latencies), 2) if latencies else None
+            for service, count in calls.items()
+        },
+        "peak_memory_bytes": peak_memory
+    }
+
+
+def benchmark_catalog(size: int, layout: str, standin: OSRMStandIn, args: argparse.Namespace) -> Dict[str, Any]:
+    """Build one synthetic catalog and run the selected operations against it"""
+    stations = generate_catalog(size, layout, seed=args.seed)
+
+    started = time.perf_counter()
+    snapshot = StationSnapshot(stations)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    tracemalloc.start()
+    StationSnapshot(stations)
+    index_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    def optimizer() -> OSRMRouteOptimizer:
+        return OSRMRouteOptimizer.from_snapshot(
+            snapshot,
+            battery_range=args.battery_range,
+            osrm_server=standin.url,
+            latency_budget=args.budget
+        )
+
+    def reset():
+        if not args.warm:
+            road_distance_cache.clear_local()
+
+    points = query_points(stations, args.iterations, seed=args.seed)
+    route_cases = trips(stations, args.route_iterations, seed=args.seed)
+
+    def searched(case):
+        start, end = case
+        route_optimizer = optimizer()
+        return route_optimizer, route_optimizer.dijkstra_route(start, end, args.algorithm), start, end
+
+    measurements = {
+        "find_nearby_stations": lambda: _measure(
+            points, lambda point: optimizer().find_nearby_stations(point[0], point[1], args.radius), standin, reset
+        ),
+        "find_nearest_station": lambda: _measure(
+            points, lambda point: optimizer().find_nearest_station(point[0], point[1]), standin, reset
+        ),
+        "dijkstra_route": lambda: _measure(
+            route_cases, lambda case: optimizer().dijkstra_route(case[0], case[1], args.algorithm), standin, reset
+        ),
+        # Summaries follow a search in the app, so they start from the cache it left
+        "get_route_summary": lambda: _measure(
+            route_cases,
+            lambda searched_case: searched_case[0].get_route_summary(*searched_case[1:]),
+            standin,
+            reset,
+            prepare=searched
+        )
+    }
+
+    operations = {}
+    for name in args.operations:
+        _log(f"{layout} {size}: {name}")
+        operations[name] = measurements[name]()
+
+    return {
+        "layout": layout,
+        "size": size,
+        "available_stations": len(snapshot.available_stations),
+        "index": {"build_ms": round(build_ms, 3), "peak_memory_bytes": index_memory},
+        "operations": operations
+    }
+
+
+def parse_args(argv: Sequence[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--layouts", nargs="+", choices=("clustered", "uniform"), default=["clustered", "uniform"])
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--iterations", type=int, default=20, help="searches per point query operation")
+    parser.add_argument("--route-iterations", type=int, default=5, help="trips per route operation")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="OSRM stand-in latency per request")
+    parser.add_argument("--battery-range", type=float, default=settings.MAX_SEARCH_RADIUS,
+                        help="km, by default the range the API searches with")
+    parser.add_argument("--radius", type=float, default=settings.MAX_SEARCH_RADIUS, help="find_nearby_stations radius in km")
+    parser.add_argument("--algorithm", choices=("dijkstra", "astar", "bidirectional"), default="dijkstra")
+    parser.add_argument("--budget", type=float, default=0.0,
+                        help="OSRM latency budget per optimizer in seconds (0 for none, so results do not depend on timing)")
+    parser.add_argument("--warm", action="store_true", help="keep the road distance cache between iterations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="report file, or - for stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] = None):
+    args = parse_args(argv)
+
+    with OSRMStandIn(latency=args.latency_ms / 1000) as standin:
+        results = [
+            benchmark_catalog(size, layout, standin, args)
+            for layout in args.layouts
+            for size in args.sizes
+        ]
+
+    report = {
+        "benchmark": "route_optimizer",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("sizes", "layouts", "operations", "output")
+        },
+        "results": results
+    }
+
+    content = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(content)
+    else:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(content + "\n")
+
+
+if __name__ == "__main__":
+    main()